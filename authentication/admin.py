@@ -1,7 +1,7 @@
 from django.contrib import admin
 from .models import (
     User, UserDetail, Role, UserRole, UserMoreInfoKey, UserMoreInfo, 
-    UserMoreInfoKeyRole, SecurityEvent, OTP
+    UserMoreInfoKeyRole, SecurityEvent, OTP, UserIdentifier
 )
 from django.utils.translation import gettext_lazy as _
 
@@ -56,6 +56,12 @@ class OTPAdmin(admin.ModelAdmin):
     search_fields = ('user__username', 'value')
     list_filter = ('is_active', 'created_at')
 
+class UserIdentifierAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'kind', 'value')
+    search_fields = ('value', 'user__username')
+    list_filter = ('kind',)
+    readonly_fields = ('user', 'kind', 'value')  # از روی email/phone_number کاربر ساخته می‌شود
+
 # Register models in admin site
 admin.site.register(User, UserAdmin)
 admin.site.register(UserDetail, UserDetailAdmin)
@@ -66,3 +72,4 @@ admin.site.register(UserMoreInfo, UserMoreInfoAdmin)
 admin.site.register(UserMoreInfoKeyRole, UserMoreInfoKeyRoleAdmin)
 admin.site.register(SecurityEvent, SecurityEventAdmin)
 admin.site.register(OTP, OTPAdmin)
+admin.site.register(UserIdentifier, UserIdentifierAdmin)
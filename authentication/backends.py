@@ -0,0 +1,54 @@
+from django.core.exceptions import ValidationError
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from .models import User
+from .revocation import revocations
+from .tokens import ROLES_CLAIM, USER_CLAIMS
+
+
+def role_names(user):
+    """
+    نام نقش‌های کاربر؛ برای کاربر ساخته‌شده از توکن بدون کوئری
+    """
+    roles = getattr(user, 'token_roles', None)
+    if roles is None:
+        roles = frozenset(user.roles.values_list('role__name', flat=True))
+    return roles
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    احراز هویت بدون کوئری با claimهای امضاشده‌ی توکن (authentication.tokens.ClaimsRefreshToken)
+
+    کاربر با from_db فقط با id و فیلدهای USER_CLAIMS ساخته می‌شود؛ بقیه‌ی فیلدها deferred هستند و
+    با اولین دسترسی همه با هم خوانده می‌شوند. توکن‌های قدیمی بدون این claimها مثل قبل از دیتابیس خوانده می‌شوند.
+    refresh کاربر را دوباره از دیتابیس می‌خواند (authentication.tokens.refresh_tokens)، پس اعتماد به is_active،
+    is_staff و نقش‌های داخل توکن حداکثر به اندازه‌ی ACCESS_TOKEN_LIFETIME است: کاربر غیرفعال‌شده refresh نمی‌گیرد
+    و تغییر نقش با اولین refresh دیده می‌شود. توکن‌های باطل‌شده (خروج کاربر) با authentication.revocation رد می‌شوند.
+    """
+
+    def get_validated_token(self, raw_token):
+        token = super().get_validated_token(raw_token)
+        # حالت معمول (توکن باطل‌نشده) فقط bloom filter محلی را می‌بیند
+        if revocations.is_revoked(token):
+            raise InvalidToken(_("Token is blacklisted"))
+        return token
+
+    def get_user(self, validated_token):
+        if ROLES_CLAIM not in validated_token or any(claim not in validated_token for claim in USER_CLAIMS):
+            return super().get_user(validated_token)
+        try:
+            user_id = User._meta.pk.to_python(validated_token[api_settings.USER_ID_CLAIM])
+        except (KeyError, ValidationError):
+            raise AuthenticationFailed(_("Token contained no recognizable user identification"), code="token_not_valid")
+        if not validated_token['is_active']:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        values = {api_settings.USER_ID_FIELD: user_id, **{claim: validated_token[claim] for claim in USER_CLAIMS}}
+        field_names = [field.attname for field in User._meta.concrete_fields if field.attname in values]
+        user = User.from_db('default', field_names, [values[name] for name in field_names])
+        user.loaded_from_token = True
+        user.token_roles = frozenset(validated_token[ROLES_CLAIM])
+        return user
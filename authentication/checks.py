@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core.checks import Error, Warning, register
+from django.utils.module_loading import import_string
+
+# backendهایی که داده‌شان فقط در همان process دیده می‌شود
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def cache_is_local():
+    return settings.CACHES['default']['BACKEND'] in LOCAL_CACHE_BACKENDS
+
+
+@register()
+def check_otp_store(app_configs, **kwargs):
+    """
+    کدی که CacheOTPStore در یک process می‌سازد در process دیگر (worker وب یا Celery) پیدا نمی‌شود
+    """
+    from .stores import CacheOTPStore
+    if not cache_is_local() or not issubclass(import_string(settings.OTP_STORE), CacheOTPStore):
+        return []
+    return [Error(
+        "CacheOTPStore needs a cache shared by every process, but the default cache is local to each process.",
+        hint="Set REDIS_URL, or set OTP_STORE to 'authentication.stores.DatabaseOTPStore'.",
+        id='authentication.E001',
+    )]
+
+
+@register(deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    سطل‌های AuthRateThrottle و لیست توکن‌های باطل‌شده در cache هستند
+    """
+    if not cache_is_local():
+        return []
+    return [Warning(
+        "Auth rate limits and revoked tokens are kept in the default cache, which is local to each process: "
+        "limits are counted per worker and a logout in one worker is not seen by the others.",
+        hint="Set REDIS_URL so that every worker uses the same cache.",
+        id='authentication.W001',
+    )]
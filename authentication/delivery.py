@@ -0,0 +1,56 @@
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.utils.module_loading import import_string
+
+EMAIL_SUBJECT = "Your verification code"
+
+
+class OTPDeliveryError(Exception):
+    """
+    خطای موقت درگاه؛ کار ارسال با backoff دوباره اجرا می‌شود
+    """
+
+
+class OTPBackend:
+    """
+    رابط درگاه‌های ارسال OTP
+
+    send_batch حداکثر batch_size رکورد OTP می‌گیرد و آن‌هایی را که ارسال نشدند برمی‌گرداند؛
+    اگر کل دسته شکست بخورد OTPDeliveryError می‌دهد.
+    """
+    batch_size = 100
+
+    def send_batch(self, otps):
+        raise NotImplementedError
+
+
+class ConsoleBackend(OTPBackend):
+    """
+    محیط توسعه - فقط لاگ می‌کند
+    """
+
+    def send_batch(self, otps):
+        for otp in otps:
+            print(f"[TEST MODE] Sending OTP to {otp.recipient}: {otp.value}")
+        return []
+
+
+class EmailBackend(OTPBackend):
+    """
+    ارسال با EMAIL_BACKEND جنگو؛ کل دسته روی یک اتصال فرستاده می‌شود
+    """
+
+    def send_batch(self, otps):
+        messages = [
+            EmailMessage(EMAIL_SUBJECT, f"Your verification code is {otp.value}", to=[otp.recipient])
+            for otp in otps
+        ]
+        try:
+            get_connection(fail_silently=False).send_messages(messages)
+        except OSError as exc:
+            raise OTPDeliveryError(str(exc)) from exc
+        return []
+
+
+def get_backend(channel):
+    return import_string(settings.OTP_BACKENDS[channel])()
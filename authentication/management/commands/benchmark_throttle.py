@@ -0,0 +1,60 @@
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from rest_framework.parsers import JSONParser
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from authentication.throttling import AuthRateThrottle
+
+
+class ScopedView:
+    throttle_scope = 'benchmark'
+
+
+class Command(BaseCommand):
+    help = ("Measure the per-request cost of AuthRateThrottle on the configured cache, using the bucket "
+            "configuration of one auth route. Bucket keys created by the run are deleted afterwards.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scope', default='send_otp', choices=sorted(settings.AUTH_THROTTLE_RATES))
+        parser.add_argument('--requests', type=int, default=20000)
+        parser.add_argument('--identifiers', type=int, default=500,
+                            help="Distinct identifiers the requests are spread over.")
+
+    def handle(self, *args, **options):
+        factory = APIRequestFactory()
+        requests = []
+        for i in range(options['requests']):
+            number = f"+98912{i % options['identifiers']:07d}"
+            request = factory.post('/auth/send-otp/', {'identifier': number}, format='json',
+                                   REMOTE_ADDR=f"10.0.{i % 250}.{i % 200}")
+            request = Request(request, parsers=[JSONParser()])
+            request.data  # پارس بدنه جزو زمان throttle حساب نشود
+            requests.append(request)
+
+        rates = {'benchmark': settings.AUTH_THROTTLE_RATES[options['scope']]}
+        view = ScopedView()
+        throttle = AuthRateThrottle()
+        with override_settings(AUTH_THROTTLE_RATES=rates):
+            keys = {bucket.key for request in requests for bucket in throttle.buckets(request, 'benchmark')}
+            cache.delete_many(keys)
+            timings, denied = [], 0
+            for request in requests:
+                start = time.perf_counter()
+                allowed = throttle.allow_request(request, view)
+                timings.append(time.perf_counter() - start)
+                denied += not allowed
+            cache.delete_many(keys)
+
+        timings.sort()
+        micros = [value * 1e6 for value in timings]
+        backend = settings.CACHES['default']['BACKEND'].rsplit('.', 1)[-1]
+        self.stdout.write(f"{len(requests)} requests on {backend}, buckets {rates['benchmark']}")
+        self.stdout.write(f"allowed {len(requests) - denied}, throttled {denied}")
+        self.stdout.write(
+            f"per request: mean {sum(micros) / len(micros):.1f} us, p50 {micros[len(micros) // 2]:.1f} us, "
+            f"p99 {micros[int(len(micros) * 0.99)]:.1f} us"
+        )
+
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils.timezone import now
+from authentication.models import OTP, OTP_LIFETIME
+
+
+class Command(BaseCommand):
+    help = ("Delete OTP rows that can no longer be used (consumed, superseded or expired). With the cache OTP "
+            "store the table only holds legacy rows, which --all removes entirely.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Delete every OTP row, including usable ones.")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--dry-run', action='store_true', help="Only report how many rows would be deleted.")
+
+    def handle(self, *args, **options):
+        rows = OTP.objects.all()
+        if not options['all']:
+            rows = rows.filter(Q(is_active=False) | Q(created_at__lt=now() - OTP_LIFETIME))
+        if options['dry_run']:
+            self.stdout.write(f"{rows.count()} OTP rows would be deleted.")
+            return
+
+        # حذف دسته‌ای تا جدول بزرگ مدت طولانی قفل نماند
+        deleted = 0
+        while True:
+            ids = list(rows.values_list('pk', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            deleted += OTP.objects.filter(pk__in=ids).delete()[0]
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} OTP rows."))
@@ -0,0 +1,42 @@
+# Generated by Django 5.0.7 on 2026-10-18 12:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0002_alter_user_email_alter_user_phone_number'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='otp',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='otp',
+            name='channel',
+            field=models.CharField(blank=True, choices=[('sms', 'SMS'), ('email', 'Email')], max_length=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='otp',
+            name='queued_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='otp',
+            name='recipient',
+            field=models.CharField(blank=True, max_length=254, null=True),
+        ),
+        migrations.AddField(
+            model_name='otp',
+            name='sent_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='otp',
+            index=models.Index(fields=['channel', 'sent_at', 'queued_at'], name='otp_delivery_idx'),
+        ),
+    ]
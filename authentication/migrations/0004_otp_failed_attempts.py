@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-18 12:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0003_otp_delivery_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='otp',
+            name='failed_attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.0.7 on 2026-10-18 12:43
+
+import re
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+# نسخه‌ی ثابت نرمال‌سازی authentication.models در زمان این migration
+def normalize_email_identifier(value):
+    return value.strip().lower()
+
+
+def normalize_phone_identifier(value):
+    digits = re.sub(r'[\s\-().]', '', value)
+    if digits.startswith('00'):
+        digits = '+' + digits[2:]
+    elif digits.startswith('0'):
+        digits = f'+{settings.PHONE_DEFAULT_COUNTRY_CODE}{digits[1:]}'
+    elif not digits.startswith('+'):
+        digits = '+' + digits
+    return digits if re.fullmatch(r'\+\d{8,15}', digits) else None
+
+
+def backfill_identifiers(apps, schema_editor):
+    User = apps.get_model('authentication', 'User')
+    UserIdentifier = apps.get_model('authentication', 'UserIdentifier')
+    batch = []
+    # به ترتیب id تا در مقدارهای تکراری کاربر قدیمی‌تر مالک identifier بماند
+    for user_id, email, phone_number in User.objects.order_by('id').values_list(
+            'id', 'email', 'phone_number').iterator(chunk_size=2000):
+        if email:
+            batch.append(UserIdentifier(user_id=user_id, kind='email', value=normalize_email_identifier(email)))
+        if phone_number and (phone := normalize_phone_identifier(phone_number)):
+            batch.append(UserIdentifier(user_id=user_id, kind='phone', value=phone))
+        if len(batch) >= 2000:
+            UserIdentifier.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        UserIdentifier.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0004_otp_failed_attempts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserIdentifier',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('email', 'Email'), ('phone', 'Phone')], max_length=5)),
+                ('value', models.CharField(max_length=254, unique=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='identifiers', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(backfill_identifiers, migrations.RunPython.noop),
+    ]
@@ -2,8 +2,42 @@ from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, Permis
 from django.db import models
 from django.core.validators import RegexValidator, EmailValidator
 from django.utils.translation import gettext_lazy as _
+from django.conf import settings
 from django.utils.timezone import now
+from datetime import timedelta
 import random
+import re
+
+OTP_LIFETIME = timedelta(minutes=5)
+
+
+def normalize_email_identifier(value):
+    return value.strip().lower()
+
+
+def normalize_phone_identifier(value):
+    """
+    شماره به فرمت E.164؛ شماره‌ی داخلی (با صفر اول) با PHONE_DEFAULT_COUNTRY_CODE کامل می‌شود
+    """
+    digits = re.sub(r'[\s\-().]', '', value)
+    if digits.startswith('00'):
+        digits = '+' + digits[2:]
+    elif digits.startswith('0'):
+        digits = f'+{settings.PHONE_DEFAULT_COUNTRY_CODE}{digits[1:]}'
+    elif not digits.startswith('+'):
+        digits = '+' + digits
+    return digits if re.fullmatch(r'\+\d{8,15}', digits) else None
+
+
+def normalize_identifier(value):
+    """
+    (نوع، مقدار نرمال‌شده) برای ایمیل یا شماره تلفن؛ برای ورودی نامعتبر مقدار None
+    """
+    value = (value or '').strip()
+    if '@' in value:
+        return 'email', normalize_email_identifier(value)
+    return 'phone', (normalize_phone_identifier(value) if value else None)
+
 
 class UserManager(BaseUserManager):
     def create_user(self, username=None, email=None, phone_number=None, password=None, **extra_fields):
@@ -64,6 +98,37 @@ class User(AbstractBaseUser, PermissionsMixin):
     def __str__(self):
         return self.username or self.email or self.phone_number
 
+    def refresh_from_db(self, using=None, fields=None):
+        # کاربری که از claimهای توکن ساخته شده (authentication.backends) با اولین دسترسی به یک فیلد
+        # همه‌ی فیلدهای deferred را یک‌جا می‌خواند، نه هر فیلد با یک کوئری
+        if fields is not None and self.__dict__.pop('loaded_from_token', False):
+            fields = list({*fields, *self.get_deferred_fields()})
+        super().refresh_from_db(using=using, fields=fields)
+
+class UserIdentifier(models.Model):
+    """
+    ایمیل و شماره‌ی نرمال‌شده‌ی کاربر؛ ورود و ارسال OTP کاربر را با یک جست‌وجوی برابری روی value پیدا می‌کنند
+    با سیگنال post_save کاربر همگام می‌ماند (authentication.signals)
+    """
+    KIND_CHOICES = [('email', 'Email'), ('phone', 'Phone')]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='identifiers')
+    kind = models.CharField(max_length=5, choices=KIND_CHOICES)
+    value = models.CharField(max_length=254, unique=True)
+
+    def __str__(self):
+        return self.value
+
+    @staticmethod
+    def values_for(user):
+        values = {}
+        if user.email:
+            values[normalize_email_identifier(user.email)] = 'email'
+        if user.phone_number and (phone := normalize_phone_identifier(user.phone_number)):
+            values[phone] = 'phone'
+        return values
+
+
 class UserDetail(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='details')
     firstname = models.CharField(max_length=50, null=True, blank=True)
@@ -120,11 +185,34 @@ class SecurityEvent(models.Model):
     def __str__(self):
         return f"SecurityEvent: {self.user.username}"
     
+class OTPQuerySet(models.QuerySet):
+    def pending(self, channel=None):
+        """
+        OTPهای در صف ارسال که هنوز منقضی نشده‌اند
+        """
+        otps = self.filter(queued_at__gte=now() - OTP_LIFETIME, sent_at__isnull=True)
+        return otps.filter(channel=channel) if channel else otps
+
+
 class OTP(models.Model):
+    CHANNEL_CHOICES = [('sms', 'SMS'), ('email', 'Email')]
+
     user = models.ForeignKey('User', on_delete=models.CASCADE, related_name='otps')
     value = models.CharField(max_length=6)
     created_at = models.DateTimeField(auto_now_add=True)
     is_active = models.BooleanField(default=True)
+    failed_attempts = models.PositiveSmallIntegerField(default=0)
+    # وضعیت ارسال در صف (authentication.tasks.deliver_otps)
+    channel = models.CharField(max_length=10, choices=CHANNEL_CHOICES, null=True, blank=True)
+    recipient = models.CharField(max_length=254, null=True, blank=True)
+    queued_at = models.DateTimeField(null=True, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+
+    objects = OTPQuerySet.as_manager()
+
+    class Meta:
+        indexes = [models.Index(fields=['channel', 'sent_at', 'queued_at'], name='otp_delivery_idx')]
 
     def generate_otp(self):
         """
@@ -138,7 +226,7 @@ class OTP(models.Model):
         """
         اعتبارسنجی مدت اعتبار OTP (۵ دقیقه)
         """
-        return self.is_active and (now() - self.created_at).seconds < 300
+        return self.is_active and now() - self.created_at < OTP_LIFETIME
 
     def __str__(self):
-        return f"OTP for {self.user}: {self.value}"
\ No newline at end of file
+        return f"OTP for {self.user}: {self.value}"
@@ -0,0 +1,132 @@
+import hashlib
+import math
+import threading
+import time
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework_simplejwt.settings import api_settings
+
+SYNC_CHUNK = 1000
+
+
+class BloomFilter:
+    """
+    Bloom filter ساده روی bytearray؛ پاسخ منفی قطعی است و پاسخ مثبت باید در cache تأیید شود
+    """
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class RevocationStore:
+    """
+    jti توکن‌های باطل‌شده در cache مشترک با TTL برابر عمر باقی‌مانده‌ی توکن
+
+    هر process یک bloom filter محلی دارد، پس بررسی توکن باطل‌نشده (حالت معمول) به cache نمی‌رود.
+    ابطال‌ها در یک لاگ شماره‌دار در cache هم ثبت می‌شوند و filter حداکثر هر JWT_REVOCATION_SYNC_INTERVAL
+    ثانیه یک بار لاگ را می‌خواند؛ ابطال در process دیگر حداکثر با همین تأخیر دیده می‌شود.
+    """
+    prefix = 'jwt:revoked'
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.filter = BloomFilter(settings.JWT_REVOCATION_FILTER_CAPACITY, settings.JWT_REVOCATION_FILTER_ERROR_RATE)
+        self.synced = self.low = 0
+        self.missing = []
+        self.next_sync = 0
+
+    def _key(self, *parts):
+        return ':'.join((self.prefix, *map(str, parts)))
+
+    def revoke(self, token):
+        """
+        True اگر همین فراخوانی توکن را باطل کرد (برای مصرف یک‌باره‌ی refresh token در rotation)
+        """
+        jti = token[api_settings.JTI_CLAIM]
+        timeout = int(token['exp'] - time.time()) + 1
+        if timeout <= 0:
+            return False
+        if not cache.add(self._key(jti), 1, timeout):
+            return False
+        sequence = self._key('log', 'seq')
+        cache.add(sequence, 0, None)
+        cache.set(self._key('log', cache.incr(sequence)), jti, timeout)
+        with self.lock:
+            self.filter.add(jti)
+        return True
+
+    def is_revoked(self, token):
+        jti = token.get(api_settings.JTI_CLAIM)
+        if jti is None:
+            return False
+        self.sync()
+        if jti not in self.filter:
+            return False
+        return cache.get(self._key(jti)) is not None
+
+    def sync(self, force=False):
+        now = time.monotonic()
+        if not force and now < self.next_sync:
+            return
+        with self.lock:
+            self.next_sync = now + settings.JWT_REVOCATION_SYNC_INTERVAL
+            last = cache.get(self._key('log', 'seq'), 0)
+            if last < self.synced:
+                # cache پاک شده است
+                self.reset()
+                self.next_sync = now + settings.JWT_REVOCATION_SYNC_INTERVAL
+            # شماره‌هایی که دور قبل هنوز نوشته نشده بودند یک بار دیگر خوانده می‌شوند
+            sequences = self.missing + list(range(self.synced + 1, last + 1))
+            found = self._read(sequences)
+            self.missing = [sequence for sequence in sequences[len(self.missing):] if sequence not in found]
+            self.synced = max(self.synced, last)
+            if self.filter.count > self.filter.capacity:
+                self._rebuild(last)
+
+    def _read(self, sequences):
+        found = {}
+        for start in range(0, len(sequences), SYNC_CHUNK):
+            chunk = sequences[start:start + SYNC_CHUNK]
+            values = cache.get_many([self._key('log', sequence) for sequence in chunk])
+            for sequence in chunk:
+                jti = values.get(self._key('log', sequence))
+                if jti is not None:
+                    found[sequence] = jti
+                    self.filter.add(jti)
+        return found
+
+    def _rebuild(self, last):
+        """
+        ساخت filter تازه فقط با ابطال‌هایی که هنوز منقضی نشده‌اند؛ اگر باز پر بود ظرفیت دو برابر می‌شود
+        """
+        capacity = self.filter.capacity
+        while True:
+            self.filter = BloomFilter(capacity, settings.JWT_REVOCATION_FILTER_ERROR_RATE)
+            found = self._read(list(range(self.low + 1, last + 1)))
+            if self.filter.count <= capacity:
+                break
+            capacity *= 2
+        self.low = min(found, default=last + 1) - 1
+
+
+revocations = RevocationStore()
@@ -1,5 +1,8 @@
 from rest_framework import serializers
-from .models import User, OTP, UserDetail, Role, UserRole, UserMoreInfo, UserMoreInfoKey, UserMoreInfoKeyRole
+from .models import (
+    User, OTP, UserDetail, Role, UserRole, UserMoreInfo, UserMoreInfoKey, UserMoreInfoKeyRole, UserIdentifier,
+    normalize_email_identifier, normalize_phone_identifier,
+)
 from django.contrib.auth import authenticate
 from django.core.exceptions import ValidationError
 
@@ -15,7 +18,7 @@ class UserSerializer(serializers.ModelSerializer):
         """
         بررسی یکتا بودن ایمیل
         """
-        if value and User.objects.filter(email=value).exists():
+        if value and UserIdentifier.objects.filter(value=normalize_email_identifier(value)).exists():
             raise serializers.ValidationError("This email is already in use.")
         return value
 
@@ -23,7 +26,7 @@ class UserSerializer(serializers.ModelSerializer):
         """
         بررسی یکتا بودن شماره تلفن
         """
-        if value and User.objects.filter(phone_number=value).exists():
+        if value and UserIdentifier.objects.filter(value=normalize_phone_identifier(value)).exists():
             raise serializers.ValidationError("This phone number is already in use.")
         return value
     
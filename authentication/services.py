@@ -1,26 +1,84 @@
-from django.core.mail import send_mail
+import hashlib
+import logging
+from datetime import timedelta
 from django.conf import settings
-from rest_framework_simplejwt.tokens import RefreshToken
+from django.core.cache import cache
+from django.db import transaction
+from kombu.exceptions import OperationalError
+from .models import UserIdentifier, normalize_identifier
+from .stores import get_otp_store
+from .tasks import deliver_otps
 
-def generate_tokens_for_user(user):
+logger = logging.getLogger(__name__)
+
+OTP_STATS_WINDOW = timedelta(hours=1)
+
+
+def _unknown_identifier_key(value):
+    return 'auth:unknown_identifier:' + hashlib.sha256(value.encode()).hexdigest()
+
+
+def resolve_identifier(identifier):
+    """
+    پیدا کردن UserIdentifier (و کاربرش) برای ایمیل یا شماره با یک جست‌وجوی برابری روی index یکتا
+    نتیجه‌ی «پیدا نشد» برای IDENTIFIER_NEGATIVE_CACHE_TIMEOUT ثانیه در cache می‌ماند.
+    """
+    _, value = normalize_identifier(identifier)
+    if not value:
+        return None
+    key = _unknown_identifier_key(value)
+    if cache.get(key):
+        return None
+    try:
+        return UserIdentifier.objects.select_related('user').get(value=value)
+    except UserIdentifier.DoesNotExist:
+        cache.set(key, True, settings.IDENTIFIER_NEGATIVE_CACHE_TIMEOUT)
+        return None
+
+
+def sync_identifiers(user):
+    """
+    همگام کردن UserIdentifierهای کاربر با email و phone_number فعلی
+    اگر مقدار نرمال‌شده متعلق به کاربر دیگری باشد، همان مالک قبلی می‌ماند.
+    """
+    wanted = UserIdentifier.values_for(user)
+    user.identifiers.exclude(value__in=wanted).delete()
+    existing = set(user.identifiers.values_list('value', flat=True))
+    missing = {value: kind for value, kind in wanted.items() if value not in existing}
+    if missing:
+        UserIdentifier.objects.bulk_create(
+            [UserIdentifier(user=user, kind=kind, value=value) for value, kind in missing.items()],
+            ignore_conflicts=True,
+        )
+        cache.delete_many([_unknown_identifier_key(value) for value in missing])
+
+
+def issue_otp(user, channel):
     """
-    این تابع توکن‌های دسترسی و رفرش را برای کاربر تولید می‌کند
+    ساخت OTP و گذاشتن آن در صف ارسال؛ درخواست منتظر درگاه SMS/ایمیل نمی‌ماند
     """
-    refresh = RefreshToken.for_user(user)
-    return {
-        'access': str(refresh.access_token),
-        'refresh': str(refresh),
-    }
+    message = get_otp_store().issue(user, channel)
+    transaction.on_commit(lambda: enqueue_otp_delivery(channel, message.seq))
+    return message
+
 
-def send_otp_email(user, otp):
+def verify_otp(user, code):
     """
-    ارسال OTP به ایمیل - در محیط توسعه فقط لاگ می‌کند
+    مصرف یک‌باره‌ی کد؛ برای کد اشتباه، منقضی یا مصرف‌شده False
     """
-    print(f"[TEST MODE] Sending OTP to {user.email}: {otp}")
+    return bool(code) and get_otp_store().verify(user, code)
+
+
+def enqueue_otp_delivery(channel, start=None):
+    try:
+        deliver_otps.delay(channel, start)
+    except OperationalError:
+        # پیام در صف store می‌ماند و کار بعدی همین کانال آن را می‌فرستد
+        logger.exception("Cannot enqueue OTP delivery for channel %s", channel)
 
 
-def send_otp_sms(phone_number, otp):
+def otp_delivery_stats(window=OTP_STATS_WINDOW):
     """
-    ارسال OTP به شماره تلفن - در محیط توسعه فقط لاگ می‌کند
+    عمق صف و تأخیر ارسال (از صف تا تحویل به درگاه) به ازای کانال در بازه‌ی window اخیر
     """
-    print(f"[TEST MODE] Sending OTP to {phone_number}: {otp}")
\ No newline at end of file
+    return {'window_seconds': int(window.total_seconds()), 'channels': get_otp_store().stats(window)}
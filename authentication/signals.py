@@ -0,0 +1,13 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from .models import User
+from .services import sync_identifiers
+
+
+@receiver(post_save, sender=User)
+def update_user_identifiers(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if update_fields is not None and not {'email', 'phone_number'} & set(update_fields):
+        return
+    sync_identifiers(instance)
@@ -0,0 +1,267 @@
+import hashlib
+import hmac
+import secrets
+import time
+from collections import namedtuple
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils.module_loading import import_string
+from django.utils.timezone import now
+from .delivery import OTPDeliveryError
+from .models import OTP, OTP_LIFETIME
+
+# یک پیام در صف ارسال؛ ردیف‌های OTP هم همین ویژگی‌ها (recipient/value/queued_at) را دارند
+OTPMessage = namedtuple('OTPMessage', 'seq recipient value queued_at')
+
+LATENCY_SAMPLES = 1000
+CLAIM_TIMEOUT = 60
+PENDING_SCAN = 5000
+
+
+def generate_code():
+    return f"{secrets.randbelow(900000) + 100000}"
+
+
+def recipient_for(user, channel):
+    return user.phone_number if channel == 'sms' else user.email
+
+
+def _percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def _channel_stats(pending, expired, latencies):
+    latencies = sorted(latencies)
+    return {
+        'pending': pending,
+        'expired_undelivered': expired,
+        'delivered': len(latencies),
+        'latency_ms': {
+            'avg': round(sum(latencies) / len(latencies), 1),
+            'p95': round(_percentile(latencies, 0.95), 1),
+            'max': round(latencies[-1], 1),
+        } if latencies else None,
+    }
+
+
+class OTPStore:
+    """
+    نگهداری، مصرف و صف ارسال OTPها
+
+    issue کد را ثبت و پیام ارسال را در صف می‌گذارد، deliver (از authentication.tasks) صف یک کانال را
+    دسته‌ای به درگاه می‌دهد و verify کد را یک‌بار مصرف می‌کند؛ بعد از OTP_MAX_FAILED_ATTEMPTS
+    تلاش اشتباه کد باطل می‌شود.
+    """
+
+    @property
+    def max_failures(self):
+        return settings.OTP_MAX_FAILED_ATTEMPTS
+
+    def issue(self, user, channel):
+        raise NotImplementedError
+
+    def verify(self, user, code):
+        raise NotImplementedError
+
+    def deliver(self, channel, backend, start=None, claimer=None):
+        raise NotImplementedError
+
+    def stats(self, window):
+        raise NotImplementedError
+
+    def send(self, backend, batch):
+        """
+        خروجی: (ارسال‌شده‌ها، ارسال‌نشده‌ها، خطای کل دسته)
+        """
+        error = None
+        try:
+            failed = {id(message) for message in backend.send_batch(batch)}
+        except OTPDeliveryError as exc:
+            failed, error = {id(message) for message in batch}, exc
+        return (
+            [message for message in batch if id(message) not in failed],
+            [message for message in batch if id(message) in failed],
+            error,
+        )
+
+    def raise_for_failures(self, batch, failed, error):
+        if error is not None:
+            raise error
+        if failed:
+            raise OTPDeliveryError(f"{len(failed)} of {len(batch)} OTPs were not delivered")
+
+
+class DatabaseOTPStore(OTPStore):
+    """
+    ذخیره در جدول OTP؛ ردیف‌ها خودشان صف ارسال‌اند (جایگزین در صورت نبود cache مشترک)
+    """
+
+    def issue(self, user, channel):
+        user.otps.filter(is_active=True).update(is_active=False)
+        otp = OTP(user=user, channel=channel, recipient=recipient_for(user, channel), queued_at=now())
+        otp.generate_otp()
+        return OTPMessage(None, otp.recipient, otp.value, otp.queued_at)
+
+    def verify(self, user, code):
+        # update شرطی: از دو درخواست همزمان فقط یکی کد را مصرف می‌کند
+        consumed = user.otps.filter(
+            value=code, is_active=True, created_at__gte=now() - OTP_LIFETIME,
+            failed_attempts__lt=self.max_failures,
+        ).update(is_active=False)
+        if consumed:
+            return True
+        user.otps.filter(is_active=True).update(failed_attempts=F('failed_attempts') + 1)
+        return False
+
+    def deliver(self, channel, backend, start=None, claimer=None):
+        # ردیف‌ها با skip_locked برداشته می‌شوند تا workerهای همزمان یک OTP را دو بار نفرستند
+        sent = 0
+        while True:
+            with transaction.atomic():
+                batch = list(
+                    OTP.objects.pending(channel).select_for_update(skip_locked=True)
+                    .order_by('queued_at')[:backend.batch_size]
+                )
+                if not batch:
+                    return sent
+                OTP.objects.filter(pk__in=[otp.pk for otp in batch]).update(attempts=F('attempts') + 1)
+                delivered, failed, error = self.send(backend, batch)
+                OTP.objects.filter(pk__in=[otp.pk for otp in delivered]).update(sent_at=now())
+            self.raise_for_failures(batch, failed, error)
+            sent += len(delivered)
+
+    def stats(self, window):
+        current = now()
+        pending = dict(OTP.objects.pending().values_list('channel').annotate(count=Count('id')))
+        expired = dict(
+            OTP.objects.filter(
+                queued_at__gte=current - window, queued_at__lt=current - OTP_LIFETIME, sent_at__isnull=True,
+            ).values_list('channel').annotate(count=Count('id'))
+        )
+        latencies = {channel: [] for channel, _ in OTP.CHANNEL_CHOICES}
+        for channel, queued_at, sent_at in OTP.objects.filter(sent_at__gte=current - window).values_list(
+                'channel', 'queued_at', 'sent_at'):
+            latencies[channel].append((sent_at - queued_at).total_seconds() * 1000)
+        return {
+            channel: _channel_stats(pending.get(channel, 0), expired.get(channel, 0), values)
+            for channel, values in latencies.items()
+        }
+
+
+class CacheOTPStore(OTPStore):
+    """
+    ذخیره‌ی hash کد در cache با TTL برابر عمر OTP؛ برای هر کد هیچ نوشتنی در دیتابیس انجام نمی‌شود
+
+    برای هر کاربر فقط آخرین کد معتبر است. صف ارسال هم در cache است: هر پیام یک شماره‌ی ترتیبی
+    (seq) دارد و با همان TTL نگه داشته می‌شود؛ کار ارسال هر پیام از seq خودش به بعد را دسته‌ای
+    برمی‌دارد و برداشتن هر پیام با cache.add اتمیک است. متن کد فقط تا ارسال در صف می‌ماند.
+    """
+    prefix = 'otp'
+
+    def _key(self, *parts):
+        return ':'.join((self.prefix, *map(str, parts)))
+
+    def hash_code(self, user, code):
+        return hmac.new(settings.SECRET_KEY.encode(), f'{user.pk}:{code}'.encode(), hashlib.sha256).hexdigest()
+
+    def issue(self, user, channel):
+        timeout = int(OTP_LIFETIME.total_seconds())
+        code = generate_code()
+        cache.set(self._key('code', user.pk), self.hash_code(user, code), timeout)
+        cache.delete(self._key('failures', user.pk))
+
+        tail = self._key('outbox', channel, 'tail')
+        cache.add(tail, 0, None)
+        seq = cache.incr(tail)
+        message = OTPMessage(seq, recipient_for(user, channel), code, time.time())
+        cache.set(self._key('outbox', channel, seq), tuple(message[1:]), timeout)
+        return message
+
+    def verify(self, user, code):
+        key = self._key('code', user.pk)
+        stored = cache.get(key)
+        if stored is None:
+            return False
+        if hmac.compare_digest(stored, self.hash_code(user, code)):
+            # delete فقط برای یکی از درخواست‌های همزمان True برمی‌گرداند
+            return bool(cache.delete(key))
+        failures = self._key('failures', user.pk)
+        cache.add(failures, 0, int(OTP_LIFETIME.total_seconds()))
+        if cache.incr(failures) >= self.max_failures:
+            cache.delete(key)
+        return False
+
+    def _claim(self, channel, seq, claimer):
+        key = self._key('outbox', channel, seq)
+        claim = f'{key}:claim'
+        if not cache.add(claim, claimer or 1, CLAIM_TIMEOUT) and cache.get(claim) != claimer:
+            return None
+        data = cache.get(key)
+        if data is None:
+            # ارسال یا منقضی شده، یا هنوز نوشته نشده (که کار خودش آن را می‌فرستد)
+            cache.delete(claim)
+            return None
+        return OTPMessage(seq, *data)
+
+    def deliver(self, channel, backend, start=None, claimer=None):
+        sent = 0
+        # از head شروع می‌شود تا پیام‌هایی که کارشان در صف گذاشته نشد هم فرستاده شوند
+        seq = cache.get(self._key('outbox', channel, 'head'), 0) + 1
+        if start:
+            seq = min(seq, start)
+        while True:
+            tail = cache.get(self._key('outbox', channel, 'tail'), 0)
+            batch = []
+            while seq <= tail and len(batch) < backend.batch_size:
+                message = self._claim(channel, seq, claimer)
+                if message is not None:
+                    batch.append(message)
+                seq += 1
+            if not batch:
+                self._advance_head(channel)
+                return sent
+            delivered, failed, error = self.send(backend, batch)
+            done = [self._key('outbox', channel, message.seq) for message in delivered]
+            cache.delete_many(done + [f'{key}:claim' for key in done])
+            cache.delete_many([f"{self._key('outbox', channel, message.seq)}:claim" for message in failed])
+            self._record_latencies(channel, delivered)
+            self.raise_for_failures(batch, failed, error)
+            sent += len(delivered)
+
+    def _record_latencies(self, channel, delivered):
+        if not delivered:
+            return
+        key = self._key('latency', channel)
+        sent_at = time.time()
+        samples = cache.get(key, []) + [(sent_at, (sent_at - message.queued_at) * 1000) for message in delivered]
+        cache.set(key, samples[-LATENCY_SAMPLES:], None)
+
+    def _advance_head(self, channel):
+        """
+        جلو بردن head تا اولین پیام باقی‌مانده؛ خروجی تعداد پیام‌های منقضی‌نشده‌ی صف
+        """
+        head_key = self._key('outbox', channel, 'head')
+        head = cache.get(head_key, 0)
+        tail = cache.get(self._key('outbox', channel, 'tail'), 0)
+        end = min(tail, head + PENDING_SCAN)
+        keys = [self._key('outbox', channel, seq) for seq in range(head + 1, end + 1)]
+        present = cache.get_many(keys)
+        first = next((seq for seq, key in enumerate(keys, head + 1) if key in present), end + 1)
+        cache.set(head_key, first - 1, None)
+        return len(present)
+
+    def stats(self, window):
+        since = time.time() - window.total_seconds()
+        return {
+            channel: _channel_stats(
+                self._advance_head(channel), None,
+                [latency for sent_at, latency in cache.get(self._key('latency', channel), []) if sent_at >= since],
+            )
+            for channel, _ in OTP.CHANNEL_CHOICES
+        }
+
+
+def get_otp_store():
+    return import_string(settings.OTP_STORE)()
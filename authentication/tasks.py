@@ -0,0 +1,13 @@
+from celery import shared_task
+from .delivery import OTPDeliveryError, get_backend
+from .stores import get_otp_store
+
+
+@shared_task(bind=True, autoretry_for=(OTPDeliveryError,), retry_backoff=True, retry_backoff_max=60, max_retries=5)
+def deliver_otps(self, channel, start=None):
+    """
+    ارسال دسته‌ای OTPهای در صف یک کانال (از پیام start به بعد) تا خالی شدن صف
+
+    OTPهای ارسال‌نشده در صف می‌مانند و کار با backoff دوباره اجرا می‌شود.
+    """
+    return get_otp_store().deliver(channel, get_backend(channel), start=start, claimer=self.request.id)
@@ -1,3 +1,432 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from django.core.cache import cache
+from django.core.management import call_command
+from django.utils.timezone import now
+from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIRequestFactory, APITestCase
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from .delivery import OTPBackend, OTPDeliveryError
+from .backends import ClaimsJWTAuthentication, role_names
+from .checks import check_otp_store, check_shared_cache
+from .models import OTP, Role, User, UserIdentifier, UserRole
+from .revocation import BloomFilter, RevocationStore, revocations
+from .services import resolve_identifier
+from .tasks import deliver_otps
+from .throttling import TokenBucket
+from .tokens import generate_tokens_for_user
 
-# Create your tests here.
+
+class RecordingBackend(OTPBackend):
+    batch_size = 2
+    batches = []
+    failures = 0
+
+    def send_batch(self, otps):
+        if RecordingBackend.failures:
+            RecordingBackend.failures -= 1
+            raise OTPDeliveryError("gateway timeout")
+        RecordingBackend.batches.append([(otp.recipient, otp.value) for otp in otps])
+        return []
+
+
+class OTPDeliveryTests(APITestCase):
+    store = 'authentication.stores.DatabaseOTPStore'
+
+    def setUp(self):
+        cache.clear()
+        RecordingBackend.batches = []
+        RecordingBackend.failures = 0
+        override = self.settings(OTP_STORE=self.store, OTP_BACKENDS={
+            'sms': 'authentication.tests.RecordingBackend',
+            'email': 'authentication.tests.RecordingBackend',
+        })
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_sign_up_persists_otp_and_delivers_it_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post('/auth/sign-up/', {
+                'email': 'new@example.com', 'phone_number': '+989121234567',
+            })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        otp = OTP.objects.get()
+        self.assertEqual((otp.channel, otp.recipient, otp.sent_at), ('sms', '+989121234567', None))
+        self.assertEqual(len(otp.value), 6)
+        self.assertEqual(RecordingBackend.batches, [])
+
+        callbacks[0]()
+        otp.refresh_from_db()
+        self.assertEqual(RecordingBackend.batches, [[('+989121234567', otp.value)]])
+        self.assertIsNotNone(otp.sent_at)
+        self.assertEqual(otp.attempts, 1)
+
+    def test_send_otp_uses_the_matching_channel(self):
+        user = User.objects.create_user(email='a@example.com', phone_number='+989121111111')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/auth/send-otp/', {'identifier': 'a@example.com'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        otp = user.otps.get()
+        self.assertEqual(RecordingBackend.batches, [[('a@example.com', otp.value)]])
+
+    def test_pending_otps_are_sent_in_batches_and_expired_ones_skipped(self):
+        user = User.objects.create_user(email='b@example.com', phone_number='+989122222222')
+        for _ in range(3):
+            OTP(user=user, channel='sms', recipient=user.phone_number, queued_at=now()).generate_otp()
+        OTP(user=user, channel='sms', recipient=user.phone_number, queued_at=now() - timedelta(minutes=10)).generate_otp()
+
+        self.assertEqual(deliver_otps('sms'), 3)
+        self.assertEqual([len(batch) for batch in RecordingBackend.batches], [2, 1])
+        self.assertEqual(OTP.objects.pending().count(), 0)
+        self.assertEqual(OTP.objects.filter(sent_at__isnull=True).count(), 1)
+
+    def test_failed_batches_are_retried(self):
+        RecordingBackend.failures = 2
+        user = User.objects.create_user(email='c@example.com', phone_number='+989123333333')
+        otp = OTP(user=user, channel='sms', recipient=user.phone_number, queued_at=now())
+        otp.generate_otp()
+
+        deliver_otps.delay('sms')
+        otp.refresh_from_db()
+        self.assertIsNotNone(otp.sent_at)
+        self.assertEqual(otp.attempts, 3)
+        self.assertEqual(len(RecordingBackend.batches), 1)
+
+    def test_stats_report_queue_depth_and_latency(self):
+        user = User.objects.create_user(email='d@example.com', phone_number='+989124444444')
+        queued = now() - timedelta(seconds=2)
+        OTP.objects.create(user=user, value='111111', channel='sms', recipient=user.phone_number,
+                           queued_at=queued, sent_at=queued + timedelta(milliseconds=250))
+        OTP.objects.create(user=user, value='222222', channel='email', recipient=user.email, queued_at=now())
+
+        self.assertEqual(self.client.get('/auth/otp-stats/').status_code, status.HTTP_401_UNAUTHORIZED)
+        self.client.force_authenticate(User.objects.create_superuser(username='admin', email='admin@example.com'))
+        channels = self.client.get('/auth/otp-stats/').data['channels']
+        self.assertEqual(channels['sms']['delivered'], 1)
+        self.assertEqual(channels['sms']['latency_ms']['p95'], 250.0)
+        self.assertEqual(channels['email']['pending'], 1)
+        self.assertIsNone(channels['email']['latency_ms'])
+
+    def test_codes_are_single_use_and_locked_after_failed_attempts(self):
+        user = User.objects.create_user(email='e@example.com', phone_number='+989125555555')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/auth/send-otp/', {'identifier': user.phone_number})
+        code = RecordingBackend.batches[-1][0][1]
+        otp = user.otps.get()
+        self.assertEqual(otp.value, code)
+
+        self.assertEqual(self.client.post('/auth/verify-otp/', {
+            'identifier': user.phone_number, 'otp': code}).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.post('/auth/verify-otp/', {
+            'identifier': user.phone_number, 'otp': code}).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/auth/send-otp/', {'identifier': user.phone_number})
+        code = RecordingBackend.batches[-1][0][1]
+        wrong = '000000' if code != '000000' else '111111'
+        for _ in range(5):
+            self.client.post('/auth/login/', {'identifier': user.phone_number, 'otp': wrong})
+        self.assertEqual(self.client.post('/auth/login/', {
+            'identifier': user.phone_number, 'otp': code}).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_purge_command_removes_unusable_rows(self):
+        user = User.objects.create_user(email='f@example.com', phone_number='+989126666666')
+        OTP.objects.create(user=user, value='111111', is_active=False)
+        old = OTP.objects.create(user=user, value='222222')
+        OTP.objects.filter(pk=old.pk).update(created_at=now() - timedelta(minutes=6))
+        OTP.objects.create(user=user, value='333333')
+
+        call_command('purge_otps', batch_size=1, stdout=StringIO())
+        self.assertEqual(list(OTP.objects.values_list('value', flat=True)), ['333333'])
+        call_command('purge_otps', '--all', stdout=StringIO())
+        self.assertFalse(OTP.objects.exists())
+
+
+class CacheOTPStoreTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        RecordingBackend.batches = []
+        RecordingBackend.failures = 0
+        override = self.settings(OTP_STORE='authentication.stores.CacheOTPStore', OTP_BACKENDS={
+            'sms': 'authentication.tests.RecordingBackend',
+            'email': 'authentication.tests.RecordingBackend',
+        })
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = User.objects.create_user(email='g@example.com', phone_number='+989127777777')
+
+    def send_otp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/auth/send-otp/', {'identifier': self.user.phone_number})
+        return RecordingBackend.batches[-1][-1][1]
+
+    def verify(self, code):
+        return self.client.post('/auth/verify-otp/', {'identifier': self.user.phone_number, 'otp': code})
+
+    def test_codes_are_hashed_in_the_cache_without_db_rows(self):
+        code = self.send_otp()
+        self.assertFalse(OTP.objects.exists())
+        stored = cache.get(f'otp:code:{self.user.pk}')
+        self.assertEqual(len(stored), 64)
+        self.assertNotIn(code, stored)
+
+        self.assertEqual(self.verify(code).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.verify(code).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_new_code_replaces_previous_and_failures_lock_it(self):
+        first = self.send_otp()
+        second = self.send_otp()
+        if first != second:
+            self.assertEqual(self.verify(first).status_code, status.HTTP_401_UNAUTHORIZED)
+        wrong = '000000' if second != '000000' else '111111'
+        for _ in range(4):
+            self.verify(wrong)
+        self.assertEqual(self.verify(wrong).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.verify(second).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_outbox_is_batched_and_retried(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            for number in ('+989120000001', '+989120000002', '+989120000003'):
+                user = User.objects.create_user(email=f'{number}@example.com', phone_number=number)
+                self.client.post('/auth/send-otp/', {'identifier': number})
+        self.assertEqual(RecordingBackend.batches, [])
+
+        RecordingBackend.failures = 1
+        for callback in callbacks:
+            callback()
+        self.assertEqual([len(batch) for batch in RecordingBackend.batches], [2, 1])
+        self.assertEqual(self.client.post('/auth/verify-otp/', {
+            'identifier': user.phone_number, 'otp': RecordingBackend.batches[1][0][1],
+        }).status_code, status.HTTP_200_OK)
+
+        self.client.force_authenticate(User.objects.create_superuser(username='admin', email='admin@example.com'))
+        sms = self.client.get('/auth/otp-stats/').data['channels']['sms']
+        self.assertEqual((sms['pending'], sms['delivered']), (0, 3))
+
+    def test_process_local_cache_is_reported(self):
+        self.assertEqual([message.id for message in check_otp_store(None)], ['authentication.E001'])
+        self.assertEqual([message.id for message in check_shared_cache(None)], ['authentication.W001'])
+        with self.settings(OTP_STORE='authentication.stores.DatabaseOTPStore'):
+            self.assertEqual(check_otp_store(None), [])
+        redis = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache'}}
+        with self.settings(CACHES=redis):
+            self.assertEqual(check_otp_store(None) + check_shared_cache(None), [])
+
+
+class IdentifierLookupTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_identifiers_are_normalized_and_follow_user_changes(self):
+        user = User.objects.create_user(email='Ali@Example.COM', phone_number='09121234567')
+        self.assertEqual(
+            dict(user.identifiers.values_list('value', 'kind')),
+            {'ali@example.com': 'email', '+989121234567': 'phone'},
+        )
+        for identifier in ('ali@example.com', ' ALI@example.com', '+98 912 123 4567', '00989121234567', '09121234567'):
+            self.assertEqual(resolve_identifier(identifier).user, user, identifier)
+        self.assertEqual(resolve_identifier('09121234567').kind, 'phone')
+
+        user.email = 'new@example.com'
+        user.save(update_fields=['email'])
+        self.assertIsNone(resolve_identifier('ali@example.com'))
+        self.assertEqual(resolve_identifier('NEW@example.com').user, user)
+
+    def test_unknown_identifiers_are_negatively_cached_until_a_user_claims_them(self):
+        self.assertIsNone(resolve_identifier('later@example.com'))
+        with self.assertNumQueries(0):
+            self.assertIsNone(resolve_identifier('Later@example.com'))
+            self.assertEqual(self.client.post('/auth/send-otp/', {
+                'identifier': 'later@example.com'}).status_code, status.HTTP_404_NOT_FOUND)
+
+        user = User.objects.create_user(email='later@example.com')
+        self.assertEqual(resolve_identifier('later@example.com').user, user)
+
+    def test_sign_up_rejects_identifiers_taken_in_another_form(self):
+        User.objects.create_user(email='taken@example.com', phone_number='+989121111111')
+        response = self.client.post('/auth/sign-up/', {'email': 'Taken@Example.com', 'phone_number': '09121111111'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(set(response.data), {'email', 'phone_number'})
+        self.assertEqual(UserIdentifier.objects.count(), 2)
+
+
+class ThrottleTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        RecordingBackend.batches = []
+        override = self.settings(OTP_BACKENDS={'sms': 'authentication.tests.RecordingBackend'})
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_token_bucket_refills_without_banking_idle_time(self):
+        bucket = TokenBucket('throttle:test', capacity=3, period=3)
+        self.assertEqual([bucket.consume(now_ms=0) for _ in range(3)], [0, 0, 0])
+        self.assertEqual(bucket.consume(now_ms=0), 1.0)
+        self.assertEqual(bucket.consume(now_ms=500), 0.5)
+        self.assertEqual(bucket.consume(now_ms=1000), 0)
+        self.assertEqual(bucket.consume(now_ms=1000), 1.0)
+
+        # بعد از بیکاری طولانی فقط به اندازه‌ی ظرفیت اعتبار هست
+        self.assertEqual([bucket.consume(now_ms=60000) for _ in range(4)], [0, 0, 0, 1.0])
+
+    def test_busy_bucket_outlives_its_first_expiry(self):
+        bucket = TokenBucket('throttle:busy', capacity=10, period=3600)
+        allowed = []
+        for seconds in (0, 1800, 3601):
+            with mock.patch('time.time', return_value=seconds):
+                allowed.append(sum(not bucket.consume(now_ms=seconds * 1000) for _ in range(10)))
+        # کلید در 3600 منقضی نمی‌شود چون TAT هنوز در آینده است
+        self.assertEqual(allowed, [10, 5, 5])
+
+    def test_send_otp_is_throttled_per_normalized_identifier(self):
+        User.objects.create_user(email='h@example.com', phone_number='+989128888888')
+        for identifier in ('+989128888888', '09128888888', '0912 888 8888'):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(self.client.post('/auth/send-otp/', {
+                    'identifier': identifier}).status_code, status.HTTP_200_OK)
+
+        response = self.client.post('/auth/send-otp/', {'identifier': '+989128888888'})
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '100')
+
+        self.assertEqual(self.client.post('/auth/send-otp/', {
+            'identifier': 'h@example.com'}).status_code, status.HTTP_200_OK)
+
+    def test_ip_bucket_limits_all_identifiers(self):
+        with self.settings(AUTH_THROTTLE_RATES={'login': {'ip': (2, 60)}}):
+            for number in ('+989120000011', '+989120000012'):
+                self.assertEqual(self.client.post('/auth/login/', {
+                    'identifier': number}).status_code, status.HTTP_404_NOT_FOUND)
+            response = self.client.post('/auth/login/', {'identifier': '+989120000013'})
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', response)
+
+    def test_rejected_request_does_not_charge_earlier_buckets(self):
+        rates = {'login': {'identifier': (2, 60), 'ip': (2, 60)}}
+        with self.settings(AUTH_THROTTLE_RATES=rates):
+            for number in ('+989120000021', '+989120000022'):
+                self.client.post('/auth/login/', {'identifier': number})
+            for _ in range(3):
+                response = self.client.post('/auth/login/', {'identifier': '+989120000023'})
+                self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+            # همان identifier از IP دیگر هنوز دو توکن کامل دارد
+            for _ in range(2):
+                self.assertEqual(self.client.post('/auth/login/', {'identifier': '+989120000023'},
+                                                  REMOTE_ADDR='10.0.0.2').status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_non_object_body_is_left_to_the_view(self):
+        response = self.client.post('/auth/sign-up/', ['a@example.com'], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ClaimsAuthenticationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_superuser(username='staff', email='staff@example.com', password='secret')
+        UserRole.objects.create(user=self.user, role=Role.objects.create(name='operator'))
+
+    def authenticate(self, token):
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        return ClaimsJWTAuthentication().authenticate(request)[0]
+
+    def test_login_tokens_authenticate_without_queries(self):
+        access = self.client.post('/auth/login/', {'identifier': 'staff@example.com', 'password': 'secret'}).data['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        with self.assertNumQueries(0):
+            response = self.client.get('/service/cache-stats/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_user_loads_lazily_in_one_query(self):
+        access = generate_tokens_for_user(self.user)['access']
+        with self.assertNumQueries(0):
+            user = self.authenticate(access)
+            self.assertEqual((user.pk, user.is_staff, user.is_superuser), (self.user.pk, True, True))
+            self.assertEqual(role_names(user), {'operator'})
+        with self.assertNumQueries(1):
+            self.assertEqual((user.email, user.username, user.date_joined),
+                             (self.user.email, 'staff', self.user.date_joined))
+        self.assertIsInstance(user, User)
+
+    def test_inactive_claim_is_rejected_and_plain_tokens_fall_back_to_the_database(self):
+        self.user.is_active = False
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(generate_tokens_for_user(self.user)['access'])
+
+        self.user.is_active = True
+        self.user.save()
+        plain = RefreshToken.for_user(self.user).access_token
+        with self.assertNumQueries(1):
+            user = self.authenticate(str(plain))
+        self.assertEqual(user.email, 'staff@example.com')
+
+
+class RevocationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_superuser(username='admin', email='admin@example.com')
+        self.tokens = generate_tokens_for_user(self.user)
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        bloom = BloomFilter(1000, 0.01)
+        for i in range(1000):
+            bloom.add(f'revoked-{i}')
+        self.assertTrue(all(f'revoked-{i}' in bloom for i in range(1000)))
+        false_positives = sum(f'live-{i}' in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+    def test_rotation_makes_refresh_tokens_single_use(self):
+        response = self.client.post('/auth/token/refresh/', {'refresh': self.tokens['refresh']})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response.data['refresh'], self.tokens['refresh'])
+
+        replay = self.client.post('/auth/token/refresh/', {'refresh': self.tokens['refresh']})
+        self.assertEqual(replay.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.client.post('/auth/token/refresh/', {
+            'refresh': response.data['refresh']}).status_code, status.HTTP_200_OK)
+
+    def test_refresh_reads_the_current_user(self):
+        UserRole.objects.create(user=self.user, role=Role.objects.create(name='operator'))
+        self.user.is_staff = False
+        self.user.save()
+        response = self.client.post('/auth/token/refresh/', {'refresh': self.tokens['refresh']})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        for token in (RefreshToken(response.data['refresh']), AccessToken(response.data['access'])):
+            self.assertEqual((token['is_staff'], token['roles']), (False, ['operator']))
+
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.post('/auth/token/refresh/', {'refresh': response.data['refresh']})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.user.is_active = True
+        self.user.save()
+        refresh = generate_tokens_for_user(self.user)['refresh']
+        self.user.delete()
+        response = self.client.post('/auth/token/refresh/', {'refresh': refresh})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_logout_revokes_access_and_refresh_tokens(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.tokens['access']}")
+        self.assertEqual(self.client.get('/service/cache-stats/').status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.post('/auth/logout/', {
+            'refresh': self.tokens['refresh']}).status_code, status.HTTP_200_OK)
+
+        self.assertEqual(self.client.get('/service/cache-stats/').status_code, status.HTTP_401_UNAUTHORIZED)
+        self.client.credentials()
+        self.assertEqual(self.client.post('/auth/token/refresh/', {
+            'refresh': self.tokens['refresh']}).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_live_tokens_are_checked_locally_and_other_processes_catch_up(self):
+        token = RefreshToken(self.tokens['refresh'])
+        revocations.sync(force=True)
+        with mock.patch.object(cache, 'get', side_effect=AssertionError("cache was queried")):
+            self.assertFalse(revocations.is_revoked(token))
+
+        other_process = RevocationStore()
+        other_process.sync(force=True)
+        self.assertTrue(revocations.revoke(token))
+        self.assertFalse(revocations.revoke(token))
+        other_process.sync(force=True)
+        self.assertTrue(other_process.is_revoked(token))
@@ -0,0 +1,113 @@
+import hashlib
+import math
+import time
+from collections.abc import Mapping
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle
+from .models import normalize_identifier
+
+# عمر کلید سطل‌ها؛ سطلی که این مدت درخواستی نداشته پر است و کلیدش لازم نیست
+BUCKET_TIMEOUT = 3600
+
+
+class TokenBucket:
+    """
+    سطل توکن به روش GCRA روی cache مشترک
+
+    وضعیت هر سطل یک عدد است: زمان نظری رسیدن درخواست بعدی (میلی‌ثانیه)، که با cache.incr اتمیک
+    جلو می‌رود؛ هر درخواست مجاز فقط یک incr است و محدودیت بین همه‌ی workerها مشترک است.
+    """
+
+    def __init__(self, key, capacity, period):
+        self.key = key
+        self.period = period
+        self.interval = max(1, round(period * 1000 / capacity))
+        self.tolerance = self.interval * capacity
+
+    def timeout(self, tat, now_ms):
+        """
+        عمر کلید تا زمانی که سطل دوباره پر شود؛ کلید زودتر منقضی‌شده سطل را پیش از موعد پر می‌کند
+        """
+        return max(BUCKET_TIMEOUT, math.ceil((tat - now_ms) / 1000) + self.period)
+
+    def consume(self, now_ms=None):
+        """
+        برای درخواست مجاز 0، وگرنه ثانیه‌های انتظار تا توکن بعدی
+        """
+        if now_ms is None:
+            now_ms = int(time.time() * 1000)
+        try:
+            tat = cache.incr(self.key, self.interval)
+        except ValueError:
+            if cache.add(self.key, now_ms + self.interval, self.timeout(now_ms + self.interval, now_ms)):
+                return 0
+            tat = cache.incr(self.key, self.interval)
+        if tat < now_ms + self.interval:
+            # سطل پر بوده؛ زمان عقب‌مانده به اکنون می‌رسد تا اعتبار بیشتر از ظرفیت جمع نشود
+            cache.set(self.key, now_ms + self.interval, self.timeout(now_ms + self.interval, now_ms))
+            return 0
+        if tat - now_ms <= self.tolerance:
+            # incr عمر کلید را تمدید نمی‌کند
+            cache.touch(self.key, self.timeout(tat, now_ms))
+            return 0
+        cache.decr(self.key, self.interval)
+        return (tat - self.tolerance - now_ms) / 1000
+
+    def refund(self):
+        """
+        پس دادن توکن درخواستی که سطل دیگری ردش کرده
+        """
+        try:
+            cache.decr(self.key, self.interval)
+        except ValueError:
+            # کلید منقضی شده و سطل دوباره پر است
+            pass
+
+
+class AuthRateThrottle(BaseThrottle):
+    """
+    سطل‌های توکن AUTH_THROTTLE_RATES[view.throttle_scope]
+
+    نوع کلید route (کل مسیر)، ip یا identifier (ایمیل/شماره‌ی نرمال‌شده) است؛ پاسخ 429 با Retry-After
+    """
+
+    def get_identifier(self, request):
+        data = request.data
+        # بدنه‌ی JSON می‌تواند لیست یا مقدار ساده باشد؛ خطایش را خود view یا serializer می‌دهد
+        if not isinstance(data, Mapping):
+            return None
+        value = data.get('identifier') or data.get('phone_number') or data.get('email')
+        _, value = normalize_identifier(value if isinstance(value, str) else None)
+        return hashlib.sha256(value.encode()).hexdigest()[:32] if value else None
+
+    def buckets(self, request, scope):
+        for kind, (capacity, period) in settings.AUTH_THROTTLE_RATES.get(scope, {}).items():
+            if kind == 'route':
+                ident = 'all'
+            elif kind == 'ip':
+                ident = self.get_ident(request)
+            else:
+                ident = self.get_identifier(request)
+            if ident:
+                yield TokenBucket(f'throttle:{scope}:{kind}:{ident}', capacity, period)
+
+    def allow_request(self, request, view):
+        self.retry_after = None
+        scope = getattr(view, 'throttle_scope', None)
+        if not scope:
+            return True
+        consumed = []
+        for bucket in self.buckets(request, scope):
+            wait = bucket.consume()
+            if wait:
+                # درخواست ردشده نباید از سطل‌های قبلی (مثلاً identifier کاربر دیگر) توکن کم کند
+                for earlier in consumed:
+                    earlier.refund()
+                self.retry_after = wait
+                return False
+            consumed.append(bucket)
+        return True
+
+    def wait(self):
+        return self.retry_after
@@ -1,10 +1,64 @@
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
 from rest_framework_simplejwt.tokens import RefreshToken
+from django.core.exceptions import ValidationError
 from django.utils.translation import gettext_lazy as _
+from .models import User
+from .revocation import revocations
+
+# claimهایی که ClaimsJWTAuthentication بدون خواندن کاربر از دیتابیس به آن‌ها اعتماد می‌کند
+USER_CLAIMS = ('is_active', 'is_staff', 'is_superuser')
+ROLES_CLAIM = 'roles'
+
+
+class ClaimsRefreshToken(RefreshToken):
+    """
+    توکن رفرش با وضعیت و نقش‌های کاربر؛ access token ساخته‌شده از آن همین claimها را دارد
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        for claim in USER_CLAIMS:
+            token[claim] = getattr(user, claim)
+        token[ROLES_CLAIM] = sorted(user.roles.values_list('role__name', flat=True))
+        return token
+
 
 def generate_tokens_for_user(user):
 
-    refresh = RefreshToken.for_user(user)
+    refresh = ClaimsRefreshToken.for_user(user)
     return {
         'refresh': str(refresh),
         'access': str(refresh.access_token),
-    }
\ No newline at end of file
+    }
+
+
+def refresh_tokens(raw_refresh):
+    """
+    access token تازه از refresh token؛ با ROTATE_REFRESH_TOKENS یک refresh token تازه هم برمی‌گردد
+    و با BLACKLIST_AFTER_ROTATION توکن قبلی باطل می‌شود. ابطال اتمیک است، پس دو درخواست همزمان با یک
+    refresh token فقط یکی موفق می‌شوند.
+
+    claimهای توکن‌های تازه از کاربر فعلی در دیتابیس ساخته می‌شوند، نه از refresh token قبلی؛ کاربر حذف‌شده یا
+    غیرفعال توکن تازه نمی‌گیرد و تغییر is_staff یا نقش‌ها در اولین refresh اعمال می‌شود.
+    """
+    refresh = ClaimsRefreshToken(raw_refresh)
+    if revocations.is_revoked(refresh):
+        raise TokenError(_("Token is blacklisted"))
+    try:
+        user_id = User._meta.pk.to_python(refresh[api_settings.USER_ID_CLAIM])
+    except (KeyError, ValidationError):
+        raise TokenError(_("Token contained no recognizable user identification"))
+    user = User.objects.filter(**{api_settings.USER_ID_FIELD: user_id}).first()
+    if user is None or not user.is_active:
+        raise TokenError(_("User is inactive"))
+
+    if api_settings.ROTATE_REFRESH_TOKENS and api_settings.BLACKLIST_AFTER_ROTATION:
+        if not revocations.revoke(refresh):
+            raise TokenError(_("Token is blacklisted"))
+    fresh = ClaimsRefreshToken.for_user(user)
+    data = {'access': str(fresh.access_token)}
+    if api_settings.ROTATE_REFRESH_TOKENS:
+        data['refresh'] = str(fresh)
+    return data
@@ -1,9 +1,14 @@
 from django.urls import path
-from .views import SignUpView, LoginView, SendOTPView, VerifyOTPView
+from .views import (
+    SignUpView, LoginView, SendOTPView, VerifyOTPView, OTPDeliveryStatsView, TokenRefreshView, LogoutView,
+)
 
 urlpatterns = urlpatterns = [
     path('sign-up/', SignUpView.as_view(), name='sign_up'),       # مسیر ثبت‌نام
     path('send-otp/', SendOTPView.as_view(), name='send_otp'),    # مسیر ارسال OTP
     path('verify-otp/', VerifyOTPView.as_view(), name='verify_otp'),  # مسیر تأیید OTP
     path('login/', LoginView.as_view(), name='login'),            # مسیر ورود
+    path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),  # توکن تازه با refresh token
+    path('logout/', LogoutView.as_view(), name='logout'),          # باطل کردن توکن‌ها
+    path('otp-stats/', OTPDeliveryStatsView.as_view(), name='otp_stats'),  # آمار صف ارسال OTP
 ]
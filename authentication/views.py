@@ -1,11 +1,11 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from django.db import models
+from rest_framework.permissions import IsAdminUser
 from django.contrib.auth import authenticate
-from .models import User, OTP,UserDetail
-from rest_framework_simplejwt.tokens import RefreshToken
-from .services import send_otp_email, send_otp_sms
+from rest_framework_simplejwt.exceptions import TokenError
+from .models import User, UserDetail
+from .services import issue_otp, otp_delivery_stats, resolve_identifier, verify_otp
 from .serializers import (
     OTPRequestSerializer,
     OTPSerializer,
@@ -17,7 +17,9 @@ from .serializers import (
     UserRoleSerializer,
     UserMoreInfoSerializer
 )
-from .tokens import generate_tokens_for_user
+from .throttling import AuthRateThrottle
+from .revocation import revocations
+from .tokens import ClaimsRefreshToken, generate_tokens_for_user, refresh_tokens
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 
@@ -25,6 +27,9 @@ class SignUpView(APIView):
     """
     ثبت نام کاربر جدید
     """
+    throttle_classes = [AuthRateThrottle]
+    throttle_scope = 'sign_up'
+
     @swagger_auto_schema(
         operation_description="Register a new user with email, phone number, and password.",
         request_body=openapi.Schema(
@@ -51,6 +56,7 @@ class SignUpView(APIView):
                 }
             ),
             400: "Invalid input data.",
+            429: "Too many requests; retry after the Retry-After header.",
         },
     )
 
@@ -59,10 +65,7 @@ class SignUpView(APIView):
         if serializer.is_valid():
             user = serializer.save()
             if not request.data.get('password'):
-                otp = OTP.objects.create(user=user)
-                otp.generate_otp()
-
-                send_otp_sms(user.phone_number, otp.value)
+                issue_otp(user, 'sms' if user.phone_number else 'email')
 
                 return Response({
                     "message": "User registered successfully. OTP sent.",
@@ -81,6 +84,9 @@ class SendOTPView(APIView):
     """
     ارسال OTP به کاربر
     """
+    throttle_classes = [AuthRateThrottle]
+    throttle_scope = 'send_otp'
+
     @swagger_auto_schema(
         operation_description="Send an OTP to the user based on their email or phone number.",
         request_body=openapi.Schema(
@@ -93,22 +99,17 @@ class SendOTPView(APIView):
         responses={
             200: "OTP sent successfully!",
             404: "User not found.",
+            429: "Too many requests; retry after the Retry-After header.",
         },
     )
     def post(self, request):
         identifier = request.data.get('identifier') 
-        try:
-            user = User.objects.get(
-                models.Q(email=identifier) | models.Q(phone_number=identifier)
-            )
-        except User.DoesNotExist:
+        match = resolve_identifier(identifier)
+        if match is None:
             return Response({"error": "User not found."}, status=status.HTTP_404_NOT_FOUND)
+        user = match.user
 
-        otp_value = user.otps.create().value
-        if user.phone_number == identifier:
-            send_otp_sms(user.phone_number, otp_value)
-        elif user.email == identifier:
-            send_otp_email(user.email, otp_value)
+        issue_otp(user, 'sms' if match.kind == 'phone' else 'email')
 
         return Response({"message": "OTP sent successfully!"}, status=status.HTTP_200_OK)
 
@@ -116,6 +117,9 @@ class VerifyOTPView(APIView):
     """
     تأیید OTP
     """
+    throttle_classes = [AuthRateThrottle]
+    throttle_scope = 'verify_otp'
+
     @swagger_auto_schema(
         operation_description="Verify the OTP for a user using their email or phone number.",
         request_body=openapi.Schema(
@@ -129,42 +133,32 @@ class VerifyOTPView(APIView):
         responses={
             200: "Access and refresh tokens returned.",
             401: "Invalid or expired OTP.",
-            404: "User or OTP not found.",
+            404: "User not found.",
+            429: "Too many requests; retry after the Retry-After header.",
         },
     )
     def post(self, request):
         identifier = request.data.get('identifier')
         otp_value = request.data.get('otp')
 
-        try:
-            user = User.objects.get(
-                models.Q(email=identifier) | models.Q(phone_number=identifier)
-            )
-        except User.DoesNotExist:
+        match = resolve_identifier(identifier)
+        if match is None:
             return Response({"error": "User not found."}, status=status.HTTP_404_NOT_FOUND)
+        user = match.user
 
-        try:
-            otp = user.otps.get(value=otp_value, is_active=True)
-            if otp.is_valid():
-                otp.is_active = False
-                otp.save()
-
-                refresh = RefreshToken.for_user(user)
-                return Response({
-                    "access": str(refresh.access_token),
-                    "refresh": str(refresh)
-                }, status=status.HTTP_200_OK)
-
-            return Response({"error": "Invalid or expired OTP."}, status=status.HTTP_401_UNAUTHORIZED)
+        if verify_otp(user, otp_value):
+            return Response(generate_tokens_for_user(user), status=status.HTTP_200_OK)
 
-        except OTP.DoesNotExist:
-            return Response({"error": "OTP not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response({"error": "Invalid or expired OTP."}, status=status.HTTP_401_UNAUTHORIZED)
         
 
 class LoginView(APIView):
     """
     ورود کاربر با OTP یا پسورد
     """
+    throttle_classes = [AuthRateThrottle]
+    throttle_scope = 'login'
+
     @swagger_auto_schema(
         operation_description="Login a user with either password or OTP.",
         request_body=openapi.Schema(
@@ -181,6 +175,7 @@ class LoginView(APIView):
             400: "Invalid input.",
             401: "Authentication failed.",
             404: "User not found.",
+            429: "Too many requests; retry after the Retry-After header.",
         },
     )
     def post(self, request):
@@ -190,34 +185,84 @@ class LoginView(APIView):
         if not identifier:
             return Response({"error": "Email or phone number is required."}, status=status.HTTP_400_BAD_REQUEST)
 
-        try:
-            user = User.objects.get(
-                models.Q(email=identifier) | models.Q(phone_number=identifier)
-            )
-        except User.DoesNotExist:
+        match = resolve_identifier(identifier)
+        if match is None:
             return Response({"error": "User not found."}, status=status.HTTP_404_NOT_FOUND)
+        user = match.user
 
         if password:
             if user.check_password(password):
-                refresh = RefreshToken.for_user(user)
-                return Response({
-                    "access": str(refresh.access_token),
-                    "refresh": str(refresh)
-                }, status=status.HTTP_200_OK)
+                return Response(generate_tokens_for_user(user), status=status.HTTP_200_OK)
             return Response({"error": "Invalid password."}, status=status.HTTP_401_UNAUTHORIZED)
 
         if otp_value:
-            try:
-                otp = user.otps.get(value=otp_value, is_active=True)
-                if otp.is_valid():
-                    otp.is_active = False
-                    otp.save()
-
-                    tokens = generate_tokens_for_user(user)
-                    return Response(tokens, status=status.HTTP_200_OK)
-                else:
-                    return Response({"error": "OTP is expired or invalid."}, status=status.HTTP_401_UNAUTHORIZED)
-            except OTP.DoesNotExist:
-                return Response({"error": "Invalid OTP for this user."}, status=status.HTTP_401_UNAUTHORIZED)
+            if verify_otp(user, otp_value):
+                tokens = generate_tokens_for_user(user)
+                return Response(tokens, status=status.HTTP_200_OK)
+            return Response({"error": "OTP is expired or invalid."}, status=status.HTTP_401_UNAUTHORIZED)
 
         return Response({"error": "Provide either a password or OTP."}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class OTPDeliveryStatsView(APIView):
+    """
+    عمق صف و تأخیر ارسال OTP
+    """
+    permission_classes = [IsAdminUser]
+
+    @swagger_auto_schema(
+        operation_description="OTP delivery queue depth and latency per channel over the last hour (admin only).",
+        responses={200: "Pending, expired and delivered counts with latency percentiles."}
+    )
+    def get(self, request):
+        return Response(otp_delivery_stats())
+
+
+class TokenRefreshView(APIView):
+    """
+    گرفتن access token تازه با refresh token
+    """
+    authentication_classes = []
+
+    @swagger_auto_schema(
+        operation_description="Exchange a refresh token for a new access token. With rotation enabled a new "
+                              "refresh token is returned and the old one is revoked.",
+        request_body=TokenRefreshSerializer,
+        responses={
+            200: "New access (and refresh) token.",
+            401: "Invalid, expired or revoked refresh token.",
+        },
+    )
+    def post(self, request):
+        serializer = TokenRefreshSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            return Response(refresh_tokens(serializer.validated_data['refresh']), status=status.HTTP_200_OK)
+        except TokenError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_401_UNAUTHORIZED)
+
+
+class LogoutView(APIView):
+    """
+    خروج کاربر با باطل کردن refresh token (و access token همین درخواست)
+    """
+
+    @swagger_auto_schema(
+        operation_description="Revoke the given refresh token and, when present, the access token of this request.",
+        request_body=TokenRefreshSerializer,
+        responses={
+            200: "Logged out.",
+            401: "Invalid or expired refresh token.",
+        },
+    )
+    def post(self, request):
+        serializer = TokenRefreshSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            refresh = ClaimsRefreshToken(serializer.validated_data['refresh'])
+        except TokenError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_401_UNAUTHORIZED)
+        revocations.revoke(refresh)
+        if request.auth is not None:
+            revocations.revoke(request.auth)
+        return Response({"message": "Logged out."}, status=status.HTTP_200_OK)
@@ -0,0 +1,9 @@
+import os
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cara.settings')
+
+app = Celery('cara')
+# تنظیمات با پیشوند CELERY_ از settings جنگو خوانده می‌شوند
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
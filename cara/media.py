@@ -0,0 +1,137 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+from .storage import is_hashed_name
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+CHUNK_SIZE = 64 * 1024
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class UnsatisfiableRange(Exception):
+    pass
+
+
+def parse_range(header, size):
+    """
+    فقط یک بازه‌ی bytes پشتیبانی می‌شود؛ برای هدر نامعتبر یا چندبازه‌ای None (پاسخ کامل)
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    if size == 0:
+        raise UnsatisfiableRange
+    start, end = match.groups()
+    if not start:
+        length = int(end)
+        if length == 0:
+            raise UnsatisfiableRange
+        return max(0, size - length), size - 1
+    start, end = int(start), int(end) if end else size - 1
+    if start >= size:
+        raise UnsatisfiableRange
+    if start > end:
+        return None
+    return start, min(end, size - 1)
+
+
+def _read(path, start, length):
+    with open(path, 'rb') as file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def _if_range_matches(request, etag, last_modified):
+    value = request.headers.get('If-Range')
+    if value is None:
+        return True
+    if value.startswith(('"', 'W/')):
+        return value == etag
+    return parse_http_date_safe(value) == last_modified
+
+
+@require_safe
+def serve_media(request, path):
+    """
+    سرو فایل‌های MEDIA_ROOT با ETag/Last-Modified، Range و Cache-Control
+
+    فایل‌های با نام hash‌دار (cara.storage.HashedMediaStorage) immutable کش می‌شوند.
+    با MEDIA_X_ACCEL_REDIRECT_PREFIX یا MEDIA_X_SENDFILE فرستادن بایت‌ها به nginx/Apache سپرده می‌شود
+    و worker فقط هدرها را برمی‌گرداند.
+    """
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    try:
+        stat = os.stat(full_path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+
+    etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+    last_modified = int(stat.st_mtime)
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+    cache_control = IMMUTABLE_CACHE_CONTROL if is_hashed_name(path) else settings.MEDIA_CACHE_CONTROL
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        accel_prefix = getattr(settings, 'MEDIA_X_ACCEL_REDIRECT_PREFIX', None)
+        if accel_prefix:
+            # nginx خودش Range و ارسال فایل را انجام می‌دهد
+            response = HttpResponse(content_type=content_type)
+            response['X-Accel-Redirect'] = accel_prefix.rstrip('/') + '/' + quote(path)
+        elif getattr(settings, 'MEDIA_X_SENDFILE', False):
+            response = HttpResponse(content_type=content_type)
+            response['X-Sendfile'] = full_path
+        else:
+            response = _file_response(request, full_path, stat.st_size, content_type, etag, last_modified)
+    if response.status_code == 416:
+        return response
+    if encoding:
+        response['Content-Encoding'] = encoding
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = cache_control
+    response['Accept-Ranges'] = 'bytes'
+    response['X-Content-Type-Options'] = 'nosniff'
+    return response
+
+
+def _file_response(request, full_path, size, content_type, etag, last_modified):
+    byte_range = None
+    header = request.headers.get('Range')
+    if header and _if_range_matches(request, etag, last_modified):
+        try:
+            byte_range = parse_range(header, size)
+        except UnsatisfiableRange:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    start, end = byte_range or (0, size - 1)
+    length = max(0, end - start + 1)
+    if request.method == 'HEAD':
+        response = HttpResponse(content_type=content_type)
+    else:
+        response = StreamingHttpResponse(_read(full_path, start, length), content_type=content_type)
+    response['Content-Length'] = str(length)
+    if byte_range:
+        response.status_code = 206
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
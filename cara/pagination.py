@@ -0,0 +1,119 @@
+import json
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination
+from rest_framework.response import Response
+
+
+def estimate_count(queryset):
+    """
+    تخمین تعداد ردیف‌ها از روی planner پایگاه داده به جای COUNT(*)
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count(), False
+
+    sql, params = queryset.order_by().values('pk').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows']), True
+
+
+class KeysetPagination(CursorPagination):
+    """
+    صفحه‌بندی cursor روی یک ترتیب یکتا و ایندکس‌دار؛ هزینه‌ی صفحه‌های عمیق با صفحه‌ی اول برابر است
+
+    ویوها می‌توانند با `cursor_ordering` ترتیب را تغییر دهند. ترتیب چندستونی (مثل ('-feed_rank', '-id')) با
+    مقایسه‌ی همه‌ی ستون‌ها صفحه‌بندی می‌شود، نه فقط ستون اول؛ پس ستون اول لازم نیست یکتا باشد و ردیف‌های هم‌رتبه
+    با offset خوانده نمی‌شوند.
+    `?count=exact` تعداد دقیق و `?count=estimate` تخمین سریع را به پاسخ اضافه می‌کند.
+    """
+    ordering = 'id'
+    page_size_query_param = 'page_size'
+    count_query_param = 'count'
+
+    @property
+    def max_page_size(self):
+        return getattr(settings, 'PAGINATION_MAX_PAGE_SIZE', 100)
+
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, 'cursor_ordering', None)
+        if ordering:
+            return (ordering,) if isinstance(ordering, str) else tuple(ordering)
+        return super().get_ordering(request, queryset, view)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = None
+        self.count_is_estimate = False
+        mode = request.query_params.get(self.count_query_param)
+        if mode == 'exact':
+            self.count = queryset.count()
+        elif mode == 'estimate':
+            self.count, self.count_is_estimate = estimate_count(queryset)
+
+        ordering = self.get_ordering(request, queryset, view)
+        cursor = CursorPagination.decode_cursor(self, request) if len(ordering) > 1 else None
+        if cursor is None or cursor.position is None:
+            return super().paginate_queryset(queryset, request, view)
+
+        try:
+            values = json.loads(cursor.position)
+        except ValueError:
+            values = None
+        if not isinstance(values, list) or len(values) != len(ordering):
+            raise NotFound(self.invalid_cursor_message)
+        # CursorPagination فقط ستون اول را فیلتر می‌کند؛ موقعیت چندستونی اینجا اعمال و از cursor حذف می‌شود
+        queryset = queryset.filter(self._after(ordering, values, cursor.reverse))
+        page = super().paginate_queryset(queryset, request, view)
+        self.cursor = cursor
+        if cursor.reverse:
+            self.has_next, self.next_position = True, cursor.position
+        else:
+            self.has_previous, self.previous_position = True, cursor.position
+        self.display_page_controls = self.template is not None
+        return page
+
+    def decode_cursor(self, request):
+        cursor = super().decode_cursor(request)
+        if cursor is not None and len(self.ordering) > 1:
+            return Cursor(offset=cursor.offset, reverse=cursor.reverse, position=None)
+        return cursor
+
+    def _after(self, ordering, values, reverse):
+        """
+        ردیف‌های بعد از موقعیت cursor در ترتیب چندستونی (ستون‌های قبلی برابر و ستون بعدی بزرگ‌تر یا کوچک‌تر)
+        """
+        condition, equal = Q(pk__in=[]), Q()
+        for field, value in zip(ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') != reverse else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def _get_position_from_instance(self, instance, ordering):
+        if len(ordering) == 1:
+            return super()._get_position_from_instance(instance, ordering)
+        return json.dumps([str(getattr(instance, field.lstrip('-'))) for field in ordering])
+
+    def get_paginated_response(self, data):
+        payload = {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+        }
+        if self.count is not None:
+            payload['count'] = self.count
+            payload['count_is_estimate'] = self.count_is_estimate
+        payload['results'] = data
+        return Response(payload)
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties']['count'] = {'type': 'integer', 'nullable': True}
+        response_schema['properties']['count_is_estimate'] = {'type': 'boolean'}
+        return response_schema
@@ -0,0 +1,52 @@
+import math
+from decimal import Decimal
+import orjson
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+_encoder = JSONEncoder()
+
+
+def _default(obj):
+    # datetime و بقیه‌ی نوع‌ها دقیقاً مثل encoder خود DRF نوشته می‌شوند
+    return _encoder.default(obj)
+
+
+def _has_non_finite(value):
+    if isinstance(value, float):
+        return not math.isfinite(value)
+    if isinstance(value, Decimal):
+        return not value.is_finite()
+    if isinstance(value, dict):
+        return any(_has_non_finite(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return any(_has_non_finite(item) for item in value)
+    return False
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    رندر JSON با orjson؛ خروجی با JSONRenderer پیش‌فرض DRF (فشرده، UTF-8) یکسان است
+
+    تاریخ‌ها از orjson عبور داده می‌شوند تا با فرمت DRF ('Z' به جای '+00:00') نوشته شوند. U+2028/U+2029 مثل
+    json با escape نوشته می‌شوند. orjson برای NaN/Infinity بی‌صدا null می‌نویسد، پس داده‌ای که null دارد
+    بررسی و در صورت وجود این مقدارها به JSONRenderer سپرده می‌شود که مثل قبل خطا می‌دهد.
+    درخواست‌های دارای indent به JSONRenderer معمولی سپرده می‌شوند.
+    """
+    # کلیدهای عددی (مثل rate_histogram) مثل json به رشته تبدیل می‌شوند
+    options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        renderer_context = renderer_context or {}
+        if self.get_indent(accepted_media_type, renderer_context):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            content = orjson.dumps(data, default=_default, option=self.options)
+        except TypeError:
+            # مقدارهایی که orjson نمی‌شناسد و default هم نمی‌تواند (مثلاً عدد صحیح خیلی بزرگ)
+            return super().render(data, accepted_media_type, renderer_context)
+        if b'null' in content and _has_non_finite(data):
+            return super().render(data, accepted_media_type, renderer_context)
+        return content.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
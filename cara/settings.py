@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 from pathlib import Path
 from datetime import timedelta
 import os
+import sys
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -52,20 +53,43 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # کاربر از claimهای توکن ساخته می‌شود و فقط در صورت نیاز از دیتابیس خوانده می‌شود
+        'authentication.backends.ClaimsJWTAuthentication',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'cara.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PAGINATION_CLASS': 'cara.pagination.KeysetPagination',
+    'PAGE_SIZE': 20,
 }
 
+PAGINATION_MAX_PAGE_SIZE = 100
+# لیست ServiceProviderها با ServiceProviderShortRowSerializer روی ردیف‌های .values() ساخته می‌شود
+FAST_LIST_SERIALIZATION = True
+# اندازه‌ی صفحه‌ی فید نظرات و تعداد نظرهای جاسازی‌شده در جزئیات ServiceProvider
+REVIEW_FEED_PAGE_SIZE = 10
+# حداکثر تعداد آیتم‌های یک درخواست نوشتن دسته‌ای فرزندان ServiceProvider (.../bulk/)
+BULK_WRITE_MAX_ITEMS = 500
+
 SIMPLE_JWT = {
+    # ClaimsJWTAuthentication به is_active/is_staff/نقش‌های داخل access token حداکثر به این اندازه اعتماد می‌کند
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=30), 
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),  
     'ROTATE_REFRESH_TOKENS': True,
+    # ابطال با authentication.revocation انجام می‌شود، نه اپ token_blacklist
     'BLACKLIST_AFTER_ROTATION': True,
     'ALGORITHM': 'HS256',
     'SIGNING_KEY': SECRET_KEY, 
     'AUTH_HEADER_TYPES': ('Bearer',),
 }
 
+# jti توکن‌های باطل‌شده در cache مشترک؛ هر process یک bloom filter محلی جلوی آن دارد
+JWT_REVOCATION_FILTER_CAPACITY = 100000
+JWT_REVOCATION_FILTER_ERROR_RATE = 0.01
+# حداکثر تأخیر دیدن ابطال‌های processهای دیگر (ثانیه)
+JWT_REVOCATION_SYNC_INTERVAL = 1.0
+
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
@@ -108,6 +132,61 @@ DATABASES = {
     }
 }
 
+# در production با REDIS_URL از Redis مشترک بین workerها استفاده می‌شود
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# صف کارهای پس‌زمینه (Celery) با CELERY_BROKER_URL و یک worker جدا.
+# حالت eager (اجرای همزمان کار داخل همان درخواست) فقط در تست‌ها یا با CELERY_TASK_ALWAYS_EAGER=1 برای توسعه‌ی
+# محلی روشن است؛ بدون broker و بدون eager کارها در حافظه می‌مانند و system check هشدار می‌دهد.
+TESTING = sys.argv[1:2] == ['test']
+CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', 'memory://')
+CELERY_TASK_ALWAYS_EAGER = TESTING or os.environ.get('CELERY_TASK_ALWAYS_EAGER') == '1'
+CELERY_TASK_ACKS_LATE = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+# درگاه ارسال OTP به ازای کانال (authentication.delivery)؛ OTPها در صف و دسته‌ای فرستاده می‌شوند
+OTP_BACKENDS = {
+    'sms': 'authentication.delivery.ConsoleBackend',
+    'email': 'authentication.delivery.ConsoleBackend',
+}
+# محل نگهداری OTPها: hash کد در cache با TTL، یا authentication.stores.DatabaseOTPStore (جدول OTP).
+# CacheOTPStore فقط با cache مشترک بین processها (REDIS_URL) درست کار می‌کند؛ LocMemCache مال هر process است.
+OTP_STORE = (
+    'authentication.stores.CacheOTPStore' if os.environ.get('REDIS_URL')
+    else 'authentication.stores.DatabaseOTPStore'
+)
+OTP_MAX_FAILED_ATTEMPTS = 5
+# مدت نگهداری «کاربر پیدا نشد» برای یک identifier در cache (ثانیه)
+IDENTIFIER_NEGATIVE_CACHE_TIMEOUT = 30
+# سطل‌های توکن مسیرهای auth (authentication.throttling): {نوع کلید: (ظرفیت، ثانیه تا پر شدن کامل)}
+# نوع کلید route (کل مسیر)، ip یا identifier است؛ وضعیت در cache مشترک نگه داشته می‌شود
+AUTH_THROTTLE_RATES = {
+    'sign_up': {'ip': (10, 3600), 'identifier': (3, 3600)},
+    'send_otp': {'identifier': (3, 300), 'ip': (20, 600), 'route': (600, 60)},
+    'verify_otp': {'identifier': (10, 300), 'ip': (60, 600)},
+    'login': {'identifier': (10, 300), 'ip': (60, 600)},
+}
+
+RESPONSE_CACHE_ENABLED = True
+# عمر cache پاسخ به ازای '<basename>-<action>' (ثانیه)؛ پیش‌فرض در خود ViewSet
+RESPONSE_CACHE_TIMEOUTS = {}
+# Cache-Control پاسخ‌های شرطی (ETag) به ازای '<basename>-<action>'
+RESPONSE_CACHE_CONTROL = {
+    'sp_category-list': 'public, max-age=60, must-revalidate',
+    'expert-list': 'public, max-age=60, must-revalidate',
+}
+
 CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOWED_ORIGINS = ["http://localhost:3000",]
 
@@ -141,6 +220,11 @@ USE_I18N = True
 
 USE_TZ = True
 
+# ساعت‌های کاری ServiceProviderها به وقت محلی ثبت می‌شوند
+SERVICE_PROVIDER_TIME_ZONE = 'Asia/Tehran'
+# کد کشور شماره‌های داخلی (با صفر اول) هنگام نرمال کردن به E.164
+PHONE_DEFAULT_COUNTRY_CODE = '98'
+
 
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.1/howto/static-files/
@@ -157,6 +241,42 @@ MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# نام فایل‌های آپلودی hash محتوا را دارد تا media بتواند immutable کش شود (cara.storage)
+STORAGES = {
+    'default': {'BACKEND': 'cara.storage.HashedMediaStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+# سرو media توسط خود جنگو (cara.media.serve_media)؛ وقتی proxy جلویی مستقیم /media/ را سرو می‌کند False شود
+MEDIA_SERVE = True
+# Cache-Control فایل‌های قدیمی بدون hash؛ فایل‌های hash‌دار همیشه immutable هستند
+MEDIA_CACHE_CONTROL = 'public, max-age=3600'
+# مسیر internal در nginx (مثلاً '/protected-media/') تا worker فقط X-Accel-Redirect برگرداند
+MEDIA_X_ACCEL_REDIRECT_PREFIX = os.environ.get('MEDIA_X_ACCEL_REDIRECT_PREFIX')
+# برای Apache/lighttpd با mod_xsendfile
+MEDIA_X_SENDFILE = os.environ.get('MEDIA_X_SENDFILE') == '1'
+
+# عرض نسخه‌های WebP که برای هر تصویر آپلودشده ساخته می‌شوند (service_provider.images)
+IMAGE_VARIANT_WIDTHS = (64, 256, 1024)
+IMAGE_VARIANT_QUALITY = 80
+
+# فیلترهای facet در لیست ServiceProviderها: تا این تعداد نتیجه id‌ها از bitset و بیشتر از آن شرط SQL
+FACET_FILTER_MAX_IDS = 500
+
+# ورود ServiceProviderها از CSV/XLSX (service_provider.imports): ردیف در هر transaction و سقف خطاهای ذخیره‌شده
+PROVIDER_IMPORT_CHUNK_SIZE = 500
+PROVIDER_IMPORT_MAX_ERRORS = 1000
+# job در حال اجرایی که این مدت chunkی ذخیره نکرده، متعلق به worker ازکارافتاده است و از ادامه‌ی آن گرفته می‌شود
+PROVIDER_IMPORT_STALE_AFTER = timedelta(minutes=10)
+# خروجی جریانی providers/reviews/rates (service_provider.exports): ردیف در هر خواندن از cursor و هر تکه‌ی پاسخ
+EXPORT_CHUNK_SIZE = 2000
+# سقف کوئری هر درخواست در benchmark_endpoints (service_provider.benchmarks)؛ بیشتر شدن آن خطای دستور است
+BENCHMARK_QUERY_BUDGETS = {
+    'providers_list': 2,
+    'provider_detail': 8,
+    'login': 2,
+    'verify_otp': 3,
+}
+
 SWAGGER_SETTINGS = {
     'SECURITY_DEFINITIONS': {
         'Basic': {
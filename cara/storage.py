@@ -0,0 +1,42 @@
+import hashlib
+import posixpath
+import re
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+HASH_LENGTH = 12
+# name.<hash>.ext (یا name.<hash>_<پسوند تصادفی جنگو>.ext)؛ محتوای این فایل‌ها هیچ‌وقت عوض نمی‌شود
+HASHED_NAME_RE = re.compile(r'\.[0-9a-f]{%d}(_[A-Za-z0-9]{7})?\.[^./]+$' % HASH_LENGTH)
+
+
+def is_hashed_name(name):
+    return bool(HASHED_NAME_RE.search(name))
+
+
+class HashedMediaStorage(FileSystemStorage):
+    """
+    ذخیره‌ی فایل‌های آپلودی با hash محتوا در نام (logo.3f2a9c1b7d4e.png)
+
+    با تغییر محتوا نام (و در نتیجه URL) عوض می‌شود، پس پاسخ media می‌تواند برای همیشه کش شود.
+    فایل‌های هم‌محتوا به اشتراک گذاشته نمی‌شوند تا حذف یکی روی دیگری اثر نگذارد.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        return super().save(self.hashed_name(name, content), content, max_length=max_length)
+
+    def hashed_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        root, ext = posixpath.splitext(name)
+        match = HASHED_NAME_RE.search(name)
+        if match:
+            # نسخه‌ی جدید یک فایل hash‌دار: hash قبلی جایگزین می‌شود
+            root = name[:match.start()]
+        return f'{root}.{digest.hexdigest()[:HASH_LENGTH]}{ext}'
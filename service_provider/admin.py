@@ -1,8 +1,11 @@
+from functools import partial
 from django.contrib import admin
+from django.db import transaction
 from .models import (
     ServiceProvider, SPCategory, Address, SPWorkTime, SPTag, TagKey, SPImages, SPOwner,
-    SPReview, SPRate, Expert, SPExpert, SPCarExpert, Gifts, SPGifts,City
+    SPReview, SPRate, Expert, SPExpert, SPCarExpert, Gifts, SPGifts,City, ProviderImport
 )
+from .tasks import import_providers
 
 @admin.register(SPCategory)
 class SPCategoryAdmin(admin.ModelAdmin):
@@ -109,4 +112,22 @@ class GiftsAdmin(admin.ModelAdmin):
 class SPGiftsAdmin(admin.ModelAdmin):
     list_display = ('id', 'sp_id', 'gift_id', 'amount')
     search_fields = ('sp_id__name', 'gift_id__name')
-    list_per_page = 20
\ No newline at end of file
+    list_per_page = 20
+
+
+@admin.register(ProviderImport)
+class ProviderImportAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'status', 'rows_done', 'created_count', 'error_count', 'updated_at')
+    list_filter = ('status',)
+    readonly_fields = ('status', 'rows_done', 'created_count', 'error_count', 'errors', 'created_at', 'updated_at')
+    actions = ['run_imports']
+    list_per_page = 20
+
+    @admin.action(description="Import (or resume) the selected files")
+    def run_imports(self, request, queryset):
+        # job در حال اجرا دوباره در صف نمی‌رود؛ ProviderImporter.run هم job را اتمیک می‌گیرد
+        queryset = queryset.claimable().exclude(file='')
+        jobs = list(queryset.values_list('pk', flat=True))
+        for pk in jobs:
+            transaction.on_commit(partial(import_providers.delay, pk))
+        self.message_user(request, f"Queued {len(jobs)} imports.")
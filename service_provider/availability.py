@@ -0,0 +1,87 @@
+from bisect import bisect_right
+from datetime import timedelta
+from zoneinfo import ZoneInfo
+from django.conf import settings
+from django.utils import timezone
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+# شماره‌ی روز مطابق datetime.weekday() (دوشنبه = 0)
+WEEKDAY_INDEX = {
+    'monday': 0, 'tuesday': 1, 'wednesday': 2, 'thursday': 3, 'friday': 4, 'saturday': 5, 'sunday': 6,
+    'دوشنبه': 0, 'سهشنبه': 1, 'چهارشنبه': 2, 'پنجشنبه': 3, 'جمعه': 4, 'شنبه': 5, 'یکشنبه': 6,
+}
+
+
+def weekday_index(name):
+    key = (name or '').strip().lower().replace('\u200c', '').replace(' ', '')
+    return WEEKDAY_INDEX.get(key)
+
+
+def local_time_zone():
+    return ZoneInfo(getattr(settings, 'SERVICE_PROVIDER_TIME_ZONE', settings.TIME_ZONE))
+
+
+def minute_of_week(value):
+    """
+    شماره‌ی دقیقه از ابتدای هفته (دوشنبه ۰۰:۰۰) به وقت محلی ServiceProviderها
+    """
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value, local_time_zone())
+    value = value.astimezone(local_time_zone())
+    return value.weekday() * MINUTES_PER_DAY + value.hour * 60 + value.minute
+
+
+def build_intervals(work_times):
+    """
+    تبدیل (weekday_name, time_start, time_end)ها به آرایه‌ی مرتب و ادغام‌شده‌ی [start, end) بر حسب دقیقه‌ی هفته
+    """
+    raw = []
+    for weekday_name, time_start, time_end in work_times:
+        day = weekday_index(weekday_name)
+        if day is None:
+            continue
+        start = day * MINUTES_PER_DAY + time_start.hour * 60 + time_start.minute
+        end = day * MINUTES_PER_DAY + time_end.hour * 60 + time_end.minute
+        if end <= start:
+            # شیفت شبانه تا روز بعد ادامه دارد
+            end += MINUTES_PER_DAY
+        if end > MINUTES_PER_WEEK:
+            raw.append([start, MINUTES_PER_WEEK])
+            raw.append([0, end - MINUTES_PER_WEEK])
+        else:
+            raw.append([start, end])
+
+    merged = []
+    for start, end in sorted(raw):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def is_open(intervals, minute):
+    position = bisect_right(intervals, [minute, MINUTES_PER_WEEK + 1]) - 1
+    return position >= 0 and intervals[position][0] <= minute < intervals[position][1]
+
+
+def next_opening(intervals, at=None):
+    """
+    زمان باز شدن بعدی؛ اگر الان باز باشد یا ساعت کاری نداشته باشد None
+    """
+    if not intervals:
+        return None
+    at = (at or timezone.now()).astimezone(local_time_zone()).replace(second=0, microsecond=0)
+    minute = minute_of_week(at)
+    if is_open(intervals, minute):
+        return None
+    starts = [start for start, _ in intervals]
+    position = bisect_right(starts, minute)
+    if position < len(starts):
+        delta = starts[position] - minute
+    else:
+        delta = starts[0] + MINUTES_PER_WEEK - minute
+    return at + timedelta(minutes=delta)
+
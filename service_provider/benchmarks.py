@@ -0,0 +1,286 @@
+import http.client
+import json
+import math
+import platform
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from wsgiref.simple_server import WSGIRequestHandler, make_server
+import django
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connection
+from django.test import AsyncClient, Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from authentication.models import User
+from authentication.stores import get_otp_store
+from .models import ServiceProvider
+
+PERCENTILES = (50, 95, 99)
+# معیارهایی که با baseline مقایسه می‌شوند؛ تعداد کوئری نباید هیچ بیشتر شود
+COMPARED_METRICS = ('p95_ms', 'p99_ms', 'peak_memory_kb')
+
+
+class Fixture:
+    """
+    نمونه‌ای از ServiceProviderها و کاربرهای یک SyntheticDataset که درخواست‌ها روی آن‌ها می‌چرخند
+    """
+
+    def __init__(self, dataset, password, sample=200):
+        self.password = password
+        self.provider_ids = list(ServiceProvider.objects.order_by('id').values_list('id', flat=True)[:sample])
+        self.users = list(
+            User.objects.filter(username__startswith=dataset.username('user', '')).order_by('id')[:sample])
+        if not self.provider_ids or not self.users:
+            raise ValueError("The database has no synthetic providers or users.")
+
+    def provider(self, i):
+        return self.provider_ids[i % len(self.provider_ids)]
+
+    def user(self, i):
+        return self.users[i % len(self.users)]
+
+
+def providers_list(fixture, i):
+    return 'GET', reverse('service_provider-list'), None
+
+
+def provider_detail(fixture, i):
+    return 'GET', reverse('service_provider-detail', args=[fixture.provider(i)]), None
+
+
+def login(fixture, i):
+    return 'POST', reverse('login'), {'identifier': fixture.user(i).email, 'password': fixture.password}
+
+
+def verify_otp(fixture, i):
+    user = fixture.user(i)
+    # کد مستقیم از store گرفته می‌شود تا ساخت و ارسال آن جزو زمان درخواست نباشد
+    message = get_otp_store().issue(user, 'email')
+    return 'POST', reverse('verify_otp'), {'identifier': user.email, 'otp': message.value}
+
+
+# هر endpoint: (fixture, شماره‌ی درخواست) -> (method، مسیر، بدنه‌ی JSON)
+ENDPOINTS = {
+    'providers_list': providers_list,
+    'provider_detail': provider_detail,
+    'login': login,
+    'verify_otp': verify_otp,
+}
+
+
+class ClientDriver:
+    """
+    درخواست با django.test.Client؛ کل مسیر WSGIHandler و middlewareها بدون شبکه
+    """
+
+    def __init__(self):
+        self.client = Client()
+
+    def request(self, method, path, data):
+        body = json.dumps(data) if data is not None else ''
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = self.client.generic(method, path, body, content_type='application/json')
+            response.content
+            elapsed = time.perf_counter() - start
+        return elapsed, response.status_code, len(queries)
+
+
+class AsgiDriver:
+    """
+    درخواست با django.test.AsyncClient از مسیر ASGIHandler
+
+    زمان داخل event loop اندازه گرفته می‌شود. viewهای sync با async_to_sync از thread اصلی در همین
+    thread اجرا می‌شوند، پس کوئری‌ها روی همین connection شمرده می‌شوند.
+    """
+
+    def __init__(self):
+        self.client = AsyncClient()
+
+    async def timed(self, method, path, body):
+        start = time.perf_counter()
+        response = await self.client.generic(method, path, body, content_type='application/json')
+        response.content
+        return time.perf_counter() - start, response.status_code
+
+    def request(self, method, path, data):
+        body = json.dumps(data) if data is not None else ''
+        with CaptureQueriesContext(connection) as queries:
+            elapsed, status = async_to_sync(self.timed)(method, path, body)
+        return elapsed, status, len(queries)
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class WsgiServerDriver:
+    """
+    درخواست HTTP واقعی به سرور wsgiref روی یک port آزاد در thread جدا
+
+    کوئری‌ها در thread سرور شمرده می‌شوند؛ wsgiref برای هر درخواست یک اتصال TCP تازه می‌خواهد.
+    """
+
+    def __init__(self):
+        self.handler = WSGIHandler()
+        self.queries = 0
+        self.server = make_server('127.0.0.1', 0, self.application, handler_class=QuietHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def application(self, environ, start_response):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.handler(environ, start_response)
+            try:
+                body = b''.join(response)
+            finally:
+                response.close()
+        self.queries = len(queries)
+        return [body]
+
+    def request(self, method, path, data):
+        body = json.dumps(data) if data is not None else None
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        client = http.client.HTTPConnection(*self.server.server_address)
+        try:
+            start = time.perf_counter()
+            client.request(method, path, body, headers)
+            response = client.getresponse()
+            response.read()
+            elapsed = time.perf_counter() - start
+        finally:
+            client.close()
+        return elapsed, response.status, self.queries
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+
+DRIVERS = {'client': ClientDriver, 'asgi': AsgiDriver, 'wsgi': WsgiServerDriver}
+
+
+def percentile(values, p):
+    """
+    صدک به روش nearest-rank روی لیست مرتب‌شده
+    """
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+def measure(driver, fixture, endpoint, iterations, warmup=0, memory_iterations=0, cold=False):
+    """
+    زمان، تعداد کوئری و اوج حافظه‌ی یک endpoint
+
+    cache در شروع خالی می‌شود تا ترتیب اجرای modeها و endpointها روی نتیجه اثر نگذارد. اوج حافظه در دور
+    جداگانه‌ای با tracemalloc گرفته می‌شود تا سربار آن در زمان‌ها نباشد؛ cold=True پیش از هر درخواست هم
+    cache را خالی می‌کند.
+    """
+    cache.clear()
+    build = ENDPOINTS[endpoint]
+    counter = iter(range(warmup + iterations + memory_iterations))
+
+    def once():
+        if cold:
+            cache.clear()
+        method, path, data = build(fixture, next(counter))
+        return driver.request(method, path, data)
+
+    for _ in range(warmup):
+        once()
+    timings, queries, errors = [], [], 0
+    for _ in range(iterations):
+        elapsed, status, count = once()
+        timings.append(elapsed)
+        queries.append(count)
+        errors += status != 200
+
+    peak = 0
+    if memory_iterations:
+        tracemalloc.start()
+        try:
+            for _ in range(memory_iterations):
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+                once()
+                peak = max(peak, tracemalloc.get_traced_memory()[1] - before)
+        finally:
+            tracemalloc.stop()
+
+    timings.sort()
+    result = {'requests': iterations, 'errors': errors}
+    for p in PERCENTILES:
+        result[f'p{p}_ms'] = round(percentile(timings, p) * 1000, 3)
+    result['mean_ms'] = round(sum(timings) / iterations * 1000, 3)
+    result['throughput_rps'] = round(iterations / sum(timings), 1)
+    result['queries_max'] = max(queries)
+    result['queries_mean'] = round(sum(queries) / iterations, 2)
+    result['peak_memory_kb'] = round(peak / 1024, 1) if memory_iterations else None
+    return result
+
+
+def run_benchmarks(fixture, modes, endpoints, iterations, warmup=0, memory_iterations=0, cold=False):
+    """
+    گزارش JSON همه‌ی endpointها در همه‌ی modeها
+    """
+    report = {
+        'meta': {
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'providers': ServiceProvider.objects.count(),
+            'database': connection.vendor,
+            'django': django.get_version(),
+            'python': platform.python_version(),
+            'iterations': iterations,
+            'warmup': warmup,
+            'memory_iterations': memory_iterations,
+            'cold': cold,
+        },
+        'modes': {},
+    }
+    for mode in modes:
+        driver = DRIVERS[mode]()
+        try:
+            report['modes'][mode] = {
+                endpoint: measure(driver, fixture, endpoint, iterations, warmup, memory_iterations, cold)
+                for endpoint in endpoints
+            }
+        finally:
+            if hasattr(driver, 'close'):
+                driver.close()
+    return report
+
+
+def compare(report, baseline=None, tolerance=0.2, query_budgets=None):
+    """
+    لیست تخطی‌ها از سقف کوئری (query_budgets) و از baseline
+
+    زمان‌ها و اوج حافظه تا tolerance (نسبت) بیشتر از baseline مجازند و تعداد کوئری اصلاً نه.
+    """
+    violations = []
+    old_modes = (baseline or {}).get('modes', {})
+    for mode, results in report['modes'].items():
+        for endpoint, result in results.items():
+            label = f"{mode} {endpoint}"
+            budget = (query_budgets or {}).get(endpoint)
+            if budget is not None and result['queries_max'] > budget:
+                violations.append(f"{label}: {result['queries_max']} queries per request, budget is {budget}.")
+            old = old_modes.get(mode, {}).get(endpoint)
+            if not old:
+                continue
+            if result['queries_max'] > old['queries_max']:
+                violations.append(
+                    f"{label}: {result['queries_max']} queries per request, baseline is {old['queries_max']}.")
+            for metric in COMPARED_METRICS:
+                if result.get(metric) is None or old.get(metric) is None:
+                    continue
+                limit = old[metric] * (1 + tolerance)
+                if result[metric] > limit:
+                    violations.append(
+                        f"{label}: {metric} {result[metric]} exceeds baseline {old[metric]} by more than "
+                        f"{tolerance:.0%}.")
+    return violations
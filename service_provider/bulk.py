@@ -0,0 +1,226 @@
+from functools import partial
+from django.conf import settings
+from django.db import transaction
+from django.shortcuts import get_object_or_404
+from rest_framework.exceptions import ValidationError
+from .models import Expert, ServiceProvider, SPExpert, SPImages, SPTag, SPWorkTime, TagKey, Weekday
+from .serializers import (
+    SPExpertBulkItemSerializer, SPImagesBulkItemSerializer, SPTagBulkItemSerializer, SPWorkTimeBulkItemSerializer
+)
+from .signals import provider_children_changed
+from .tasks import generate_image_variants
+
+
+def missing_pk(value):
+    return f'Invalid pk "{value}" - object does not exist.'
+
+
+class ChildBulkWriter:
+    """
+    نوشتن لیست کامل فرزندان یک ServiceProvider در یک transaction
+
+    همه‌ی آیتم‌ها در یک دور بررسی می‌شوند و کلیدهای خارجی با یک کوئری برای کل لیست؛ بعد یک delete،
+    یک bulk_create و یک bulk_update. replace=True (PUT) ردیف‌هایی را که در لیست نیستند حذف می‌کند.
+    سیگنال‌های ردیف‌به‌ردیف اجرا نمی‌شوند و اثرشان یک بار با provider_children_changed اعمال می‌شود.
+    """
+    model = None
+    item_serializer = None
+    update_fields = ()
+
+    def __init__(self, sp_id, data, replace=True):
+        self.sp_id = int(sp_id)
+        self.data = data
+        self.replace = replace
+
+    def row_key(self, row):
+        return row.pk
+
+    def item_key(self, item):
+        return item.get('id')
+
+    def resolve(self, items):
+        """
+        بررسی کلیدهای خارجی آیتم‌های معتبر؛ خطا به ازای اندیس آیتم
+        """
+        return {}
+
+    def build(self, item):
+        raise NotImplementedError
+
+    def update(self, row, item):
+        changed = False
+        for field in self.update_fields:
+            if getattr(row, field) != item[field]:
+                setattr(row, field, item[field])
+                changed = True
+        return changed
+
+    def validate(self, existing):
+        if not isinstance(self.data, list):
+            raise ValidationError({'non_field_errors': ["Expected a list of items."]})
+        if len(self.data) > settings.BULK_WRITE_MAX_ITEMS:
+            raise ValidationError(
+                {'non_field_errors': [f"At most {settings.BULK_WRITE_MAX_ITEMS} items are allowed."]})
+
+        child = self.item_serializer()
+        items, errors = [], []
+        for value in self.data:
+            try:
+                items.append(child.run_validation(value))
+                errors.append({})
+            except ValidationError as exc:
+                items.append(None)
+                errors.append(exc.detail)
+        for index, error in self.resolve([(i, item) for i, item in enumerate(items) if item is not None]).items():
+            items[index] = None
+            errors[index] = error
+
+        seen = set()
+        for index, item in enumerate(items):
+            if item is None:
+                continue
+            key = self.item_key(item)
+            if key is None:
+                continue
+            if key in seen:
+                errors[index] = {'non_field_errors': ["Duplicate item."]}
+            elif 'id' in item and key not in existing:
+                errors[index] = {'id': [missing_pk(key)]}
+            seen.add(key)
+        if any(errors):
+            raise ValidationError(errors)
+        return items
+
+    def save(self):
+        get_object_or_404(ServiceProvider.objects.only('id'), pk=self.sp_id)
+        with transaction.atomic():
+            rows = list(self.model.objects.filter(SP_id=self.sp_id).select_for_update())
+            existing = {self.row_key(row): row for row in rows}
+            items = self.validate(existing)
+
+            results, created, updated, matched = [], [], [], set()
+            for item in items:
+                row = existing.get(self.item_key(item))
+                if row is None:
+                    row = self.build(item)
+                    created.append(row)
+                    result = 'created'
+                else:
+                    matched.add(row.pk)
+                    result = 'updated' if self.update(row, item) else 'unchanged'
+                    if result == 'updated':
+                        updated.append(row)
+                results.append((row, result))
+
+            deleted = 0
+            stale = [row.pk for row in rows if row.pk not in matched] if self.replace else []
+            if stale:
+                queryset = self.model.objects.filter(pk__in=stale)
+                # سیگنال‌های post_delete این حذف را از روی origin می‌شناسند و کاری نمی‌کنند
+                queryset.bulk_write = True
+                deleted = queryset.delete()[1].get(self.model._meta.label, 0)
+            self.model.objects.bulk_create(created)
+            if updated:
+                self.model.objects.bulk_update(updated, self.update_fields)
+            if created or updated or deleted:
+                self.changed(created)
+
+        return {
+            'results': [
+                {'index': index, 'status': result, 'id': row.pk} for index, (row, result) in enumerate(results)
+            ],
+            'deleted': deleted,
+        }
+
+    def changed(self, created):
+        provider_children_changed(self.model, self.sp_id)
+
+
+class WorkTimeBulkWriter(ChildBulkWriter):
+    """
+    آیتم با id همان زمان کاری را به‌روز می‌کند و آیتم بدون id زمان کاری تازه می‌سازد
+    """
+    model = SPWorkTime
+    item_serializer = SPWorkTimeBulkItemSerializer
+    update_fields = ('weekday_id', 'time_start', 'time_end', 'is_active')
+
+    def resolve(self, items):
+        ids = {item['weekday'] for _, item in items}
+        weekdays = set(Weekday.objects.filter(pk__in=ids).values_list('pk', flat=True))
+        errors = {}
+        for index, item in items:
+            item['weekday_id'] = item.pop('weekday')
+            if item['weekday_id'] not in weekdays:
+                errors[index] = {'weekday': [missing_pk(item['weekday_id'])]}
+        return errors
+
+    def build(self, item):
+        return SPWorkTime(SP_id=self.sp_id, **{field: item[field] for field in self.update_fields})
+
+
+class TagBulkWriter(ChildBulkWriter):
+    """
+    تگ‌ها با (key_name, value) شناخته می‌شوند؛ keyهای تازه ساخته می‌شوند
+    """
+    model = SPTag
+    item_serializer = SPTagBulkItemSerializer
+
+    def row_key(self, row):
+        return (row.key_id, row.value)
+
+    def item_key(self, item):
+        return (item['key_id'], item['value'])
+
+    def resolve(self, items):
+        names = {item['key_name'] for _, item in items}
+        if names:
+            TagKey.objects.bulk_create([TagKey(name=name) for name in names], ignore_conflicts=True)
+        keys = dict(TagKey.objects.filter(name__in=names).values_list('name', 'pk'))
+        for _, item in items:
+            item['key_id'] = keys[item.pop('key_name')]
+        return {}
+
+    def build(self, item):
+        return SPTag(SP_id=self.sp_id, key_id=item['key_id'], value=item['value'])
+
+
+class ExpertBulkWriter(ChildBulkWriter):
+    """
+    تخصص‌ها با id تخصص شناخته می‌شوند و فقط is_active به‌روز می‌شود
+    """
+    model = SPExpert
+    item_serializer = SPExpertBulkItemSerializer
+    update_fields = ('is_active',)
+
+    def row_key(self, row):
+        return row.expert_id
+
+    def item_key(self, item):
+        return item['expert']
+
+    def resolve(self, items):
+        ids = {item['expert'] for _, item in items}
+        experts = set(Expert.objects.filter(pk__in=ids).values_list('pk', flat=True))
+        return {
+            index: {'expert': [missing_pk(item['expert'])]}
+            for index, item in items if item['expert'] not in experts
+        }
+
+    def build(self, item):
+        return SPExpert(SP_id=self.sp_id, expert_id=item['expert'], is_active=item['is_active'])
+
+
+class ImagesBulkWriter(ChildBulkWriter):
+    """
+    آیتم با id تصویر فعلی را نگه می‌دارد و آیتم با image تصویر تازه اضافه می‌کند
+    """
+    model = SPImages
+    item_serializer = SPImagesBulkItemSerializer
+
+    def build(self, item):
+        return SPImages(SP_id=self.sp_id, image=item['image'])
+
+    def changed(self, created):
+        super().changed(created)
+        for row in created:
+            transaction.on_commit(partial(generate_image_variants.delay, SPImages._meta.label, row.pk, 'image'))
@@ -0,0 +1,104 @@
+import hashlib
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+STATS_KEYS = {'hit': 'response_cache:hits', 'miss': 'response_cache:misses'}
+
+
+def _tag_key(tag):
+    return f'response_cache:tag:{tag}'
+
+
+def invalidate_tags(*tags):
+    """
+    تغییر نسخه‌ی tagها؛ همه‌ی پاسخ‌های ذخیره‌شده با این tagها دیگر خوانده نمی‌شوند
+    """
+    for tag in tags:
+        key = _tag_key(tag)
+        if not cache.add(key, 1, None):
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, 1, None)
+
+
+def _count(kind):
+    try:
+        cache.incr(STATS_KEYS[kind])
+    except ValueError:
+        cache.add(STATS_KEYS[kind], 0, None)
+        cache.incr(STATS_KEYS[kind])
+
+
+def cache_stats():
+    values = cache.get_many(STATS_KEYS.values())
+    hits, misses = values.get(STATS_KEYS['hit'], 0), values.get(STATS_KEYS['miss'], 0)
+    total = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_ratio': hits / total if total else None}
+
+
+class CachedResponseMixin:
+    """
+    ذخیره‌ی پاسخ رندرشده‌ی list/retrieve در cache جنگو
+
+    کلید شامل مسیر، query string، نوع محتوای مذاکره‌شده و نسخه‌ی tagهای ویو است؛
+    سیگنال‌ها با invalidate_tags فقط tagهای مربوط به داده‌ی تغییرکرده را عوض می‌کنند.
+    """
+    cached_actions = ('list', 'retrieve')
+    cache_timeout = 60
+
+    def get_cache_tags(self):
+        raise NotImplementedError
+
+    def get_cache_timeout(self):
+        timeouts = getattr(settings, 'RESPONSE_CACHE_TIMEOUTS', {})
+        return timeouts.get(f'{self.basename}-{self.action}', self.cache_timeout)
+
+    def is_response_cacheable(self, request):
+        return (
+            getattr(settings, 'RESPONSE_CACHE_ENABLED', True)
+            and request.method in ('GET', 'HEAD')
+            and self.action in self.cached_actions
+        )
+
+    def get_response_cache_key(self, request):
+        tags = sorted(self.get_cache_tags())
+        versions = cache.get_many([_tag_key(tag) for tag in tags])
+        parts = [
+            request.path,
+            '&'.join(sorted(f'{key}={value}' for key, values in request.query_params.lists() for value in values)),
+            request.accepted_media_type or '',
+            request.headers.get('Accept-Language', ''),
+            *(f'{tag}={versions.get(_tag_key(tag), 0)}' for tag in tags),
+        ]
+        digest = hashlib.sha256('\n'.join(parts).encode()).hexdigest()
+        return f'response_cache:{self.basename}:{digest}'
+
+    def _cached(self, handler, request, *args, **kwargs):
+        if not self.is_response_cacheable(request):
+            return handler(request, *args, **kwargs)
+
+        key = self.get_response_cache_key(request)
+        cached = cache.get(key)
+        if cached is not None:
+            _count('hit')
+            content, content_type = cached
+            response = HttpResponse(content, content_type=content_type)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        _count('miss')
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            timeout = self.get_cache_timeout()
+            response.add_post_render_callback(
+                lambda rendered: cache.set(key, (rendered.content, rendered['Content-Type']), timeout))
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._cached(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached(super().retrieve, request, *args, **kwargs)
@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.checks import Warning, register
+
+
+@register()
+def check_task_queue(app_configs, **kwargs):
+    """
+    بدون broker واقعی و بدون eager، کارهای Celery (تصاویر، ورود فایل، ارسال OTP) هیچ‌وقت اجرا نمی‌شوند
+    """
+    if settings.CELERY_TASK_ALWAYS_EAGER or not settings.CELERY_BROKER_URL.startswith('memory://'):
+        return []
+    return [Warning(
+        "Celery tasks are queued in process memory and no worker will run them.",
+        hint="Set CELERY_BROKER_URL to a real broker and run a Celery worker, or set CELERY_TASK_ALWAYS_EAGER=1 "
+             "for local development.",
+        id='service_provider.W001',
+    )]
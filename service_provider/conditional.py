@@ -0,0 +1,77 @@
+import hashlib
+from django.conf import settings
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+
+class ConditionalGetMixin:
+    """
+    ETag قوی، Last-Modified و پاسخ 304 برای list/retrieve قبل از اجرای serializer
+
+    زیرکلاس `get_validators()` را پیاده‌سازی می‌کند و (token, last_modified) برمی‌گرداند؛
+    token باید با هر تغییر در داده‌ی پاسخ عوض شود. None یعنی شرطی نیست (مثلاً 404).
+    Cache-Control از settings.RESPONSE_CACHE_CONTROL با کلید '<basename>-<action>' خوانده می‌شود.
+    """
+    conditional_actions = ('list', 'retrieve')
+    cache_control = 'public, max-age=0, must-revalidate'
+
+    def get_validators(self):
+        raise NotImplementedError
+
+    def get_cache_control(self, request):
+        if request.user.is_authenticated:
+            return 'private, max-age=0, must-revalidate'
+        overrides = getattr(settings, 'RESPONSE_CACHE_CONTROL', {})
+        return overrides.get(f'{self.basename}-{self.action}', self.cache_control)
+
+    def _etag(self, request, token):
+        parts = [
+            str(token),
+            request.get_full_path(),
+            request.accepted_media_type or '',
+            str(request.user.pk) if request.user.is_authenticated else '',
+        ]
+        return '"%s"' % hashlib.sha256('\n'.join(parts).encode()).hexdigest()[:32]
+
+    def _conditional(self, handler, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD') or self.action not in self.conditional_actions:
+            return handler(request, *args, **kwargs)
+        validators = self.get_validators()
+        if validators is None:
+            return handler(request, *args, **kwargs)
+
+        token, last_modified = validators
+        etag = self._etag(request, token)
+        last_modified_ts = int(last_modified.timestamp()) if last_modified else None
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified_ts)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        response['ETag'] = etag
+        if last_modified_ts is not None:
+            response['Last-Modified'] = http_date(last_modified_ts)
+        response['Cache-Control'] = self.get_cache_control(request)
+        patch_vary_headers(response, ['Accept', 'Authorization'])
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._conditional(super().retrieve, request, *args, **kwargs)
+
+
+def updated_at_validators(view, queryset):
+    """
+    validator ساده برای مدل‌های دارای updated_at
+    برای لیست، Last-Modified فرستاده نمی‌شود چون حذف یک ردیف آن را تغییر نمی‌دهد
+    """
+    if view.action == 'retrieve':
+        updated_at = queryset.filter(pk=view.kwargs['pk']).values_list('updated_at', flat=True).first()
+        if updated_at is None:
+            return None
+        return updated_at.isoformat(), updated_at
+    summary = queryset.aggregate(count=Count('pk'), latest=Max('updated_at'))
+    return f"{summary['count']}:{summary['latest']}", None
@@ -0,0 +1,108 @@
+import csv
+import zlib
+from datetime import datetime
+from itertools import islice
+import orjson
+from django.conf import settings
+from django.db.models import F, FloatField
+from django.db.models.functions import Cast, NullIf
+from .models import ServiceProvider, SPRate, SPReview
+
+FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+# ستون‌های هر خروجی: (نام ستون، lookup برای values_list)
+EXPORTS = {
+    'providers': (ServiceProvider, [
+        ('id', 'id'),
+        ('name', 'name'),
+        ('owner', 'owner__user__username'),
+        ('category', 'category__name'),
+        ('city', 'address__city__name'),
+        ('district', 'address__district'),
+        ('neighbourhood', 'address__neighbourhood'),
+        ('full_address', 'address__full_address'),
+        ('latitude', 'latitude'),
+        ('longitude', 'longitude'),
+        ('rate_count', 'rate_count'),
+        ('average_rating', 'average_rating'),
+        *((f'rate_{score}_count', f'rate_{score}_count') for score in range(1, 6)),
+        ('updated_at', 'updated_at'),
+    ]),
+    'reviews': (SPReview, [
+        ('id', 'id'),
+        ('provider_id', 'SP_id'),
+        ('user_id', 'user_id'),
+        ('title', 'title'),
+        ('description', 'description'),
+        ('is_active', 'is_active'),
+        ('created_at', 'created_at'),
+    ]),
+    'rates': (SPRate, [
+        ('id', 'id'),
+        ('provider_id', 'SP_id'),
+        ('user_id', 'user_id'),
+        ('score', 'score'),
+    ]),
+}
+
+
+def export_rows(kind, chunk_size=None):
+    """
+    ردیف‌های یک خروجی به صورت tuple و به ترتیب id
+
+    iterator روی PostgreSQL از server-side cursor استفاده می‌کند و هر بار chunk_size ردیف می‌خواند.
+    """
+    model, columns = EXPORTS[kind]
+    queryset = model.objects.order_by('id')
+    if kind == 'providers':
+        queryset = queryset.annotate(average_rating=Cast('rate_sum', FloatField()) / NullIf(F('rate_count'), 0))
+    return queryset.values_list(*(lookup for _, lookup in columns)).iterator(
+        chunk_size=chunk_size or settings.EXPORT_CHUNK_SIZE)
+
+
+class _Line:
+    """
+    فایل نمایشی برای csv.writer که فقط خط نوشته‌شده را برمی‌گرداند
+    """
+
+    def write(self, value):
+        return value
+
+
+def _csv_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def export_chunks(kind, fmt, compress=False, chunk_size=None):
+    """
+    خروجی جریانی bytes؛ هر تکه chunk_size ردیف است و حافظه به تعداد کل ردیف‌ها بستگی ندارد
+    """
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    names = [name for name, _ in EXPORTS[kind][1]]
+    writer = csv.writer(_Line())
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16) if compress else None
+
+    def encode(rows):
+        if fmt == 'csv':
+            return ''.join(writer.writerow([_csv_value(value) for value in row]) for row in rows).encode()
+        return b''.join(orjson.dumps(dict(zip(names, row))) + b'\n' for row in rows)
+
+    def emit(data):
+        return compressor.compress(data) if compressor else data
+
+    if fmt == 'csv':
+        yield emit(writer.writerow(names).encode())
+    rows = export_rows(kind, chunk_size)
+    while True:
+        batch = list(islice(rows, chunk_size))
+        if not batch:
+            break
+        data = emit(encode(batch))
+        if data:
+            yield data
+    if compressor:
+        yield compressor.flush()
+
+
+def export_filename(kind, fmt, compress=False):
+    return f"{kind}.{fmt}" + ('.gz' if compress else '')
@@ -0,0 +1,225 @@
+from collections import defaultdict
+import numpy as np
+from django.db.models import Exists, F, OuterRef, Q, Value
+from django.db.models.functions import Concat, Lower, Trim
+from .indexes import InMemoryIndex
+from .models import City, Expert, ServiceProvider, SPCarExpert, SPCategory, SPExpert, SPTag
+
+DIMENSIONS = ('category', 'city', 'expert', 'car_brand', 'tag', 'min_rating')
+RATING_THRESHOLDS = range(1, 6)
+
+
+def _bits_from_positions(positions, size):
+    buffer = bytearray((size + 7) // 8)
+    for position in positions:
+        buffer[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+class FacetIndex(InMemoryIndex):
+    """
+    یک bitset (عدد صحیح پایتون) برای هر مقدار هر facet؛ بیت i یعنی ServiceProvider در جایگاه i
+
+    اشتراک فیلترها با AND و شمارش هر مقدار با popcount انجام می‌شود.
+    """
+    name = 'facets'
+
+    def clear(self):
+        self.positions = {}
+        self.ids = []
+        self.alive = 0
+        self.bits = {dimension: defaultdict(int) for dimension in DIMENSIONS}
+        self.members = {}
+        self.labels = {dimension: {} for dimension in DIMENSIONS}
+        self.labels['min_rating'] = {threshold: f"{threshold}+" for threshold in RATING_THRESHOLDS}
+
+    def _position(self, sp_id):
+        if sp_id not in self.positions:
+            self.positions[sp_id] = len(self.ids)
+            self.ids.append(sp_id)
+        return self.positions[sp_id]
+
+    def _collect(self, sp_ids):
+        """
+        {sp_id: {dimension: set(values)}} از پایگاه داده
+        """
+        providers = ServiceProvider.objects.all()
+        experts = SPExpert.objects.filter(is_active=True)
+        cars = SPCarExpert.objects.all()
+        tags = SPTag.objects.all()
+        if sp_ids is not None:
+            providers = providers.filter(pk__in=sp_ids)
+            experts = experts.filter(SP_id__in=sp_ids)
+            cars = cars.filter(SP_id__in=sp_ids)
+            tags = tags.filter(SP_id__in=sp_ids)
+
+        members = {}
+        rows = providers.values_list('id', 'category_id', 'address__city_id', 'rate_sum', 'rate_count')
+        for sp_id, category_id, city_id, rate_sum, rate_count in rows.iterator(chunk_size=5000):
+            values = {dimension: set() for dimension in DIMENSIONS}
+            if category_id is not None:
+                values['category'].add(category_id)
+            if city_id is not None:
+                values['city'].add(city_id)
+            if rate_count:
+                values['min_rating'].update(t for t in RATING_THRESHOLDS if rate_sum / rate_count >= t)
+            members[sp_id] = values
+        for sp_id, expert_id in experts.values_list('SP_id', 'expert_id').iterator(chunk_size=5000):
+            if sp_id in members:
+                members[sp_id]['expert'].add(expert_id)
+        for sp_id, brand in cars.values_list('SP_id', 'car__brand').iterator(chunk_size=5000):
+            if sp_id in members and brand:
+                members[sp_id]['car_brand'].add(brand.strip().lower())
+                self.labels['car_brand'].setdefault(brand.strip().lower(), brand.strip())
+        for sp_id, key, value in tags.values_list('SP_id', 'key__name', 'value').iterator(chunk_size=5000):
+            if sp_id in members:
+                members[sp_id]['tag'].add(f"{key}:{value}")
+                self.labels['tag'].setdefault(f"{key}:{value}", f"{key}: {value}")
+        return members
+
+    def _load_labels(self):
+        self.labels['category'] = dict(SPCategory.objects.values_list('id', 'name'))
+        self.labels['city'] = dict(City.objects.values_list('id', 'name'))
+        self.labels['expert'] = dict(Expert.objects.values_list('id', 'name'))
+
+    def load(self, sp_ids=None):
+        members = self._collect(sp_ids)
+        self._load_labels()
+        if sp_ids is None:
+            # ساخت یک‌باره‌ی bitsetها؛ OR کردن تک‌تک بیت‌ها روی اعداد بزرگ کند است
+            positions = defaultdict(list)
+            for sp_id, values in members.items():
+                position = self._position(sp_id)
+                self.members[sp_id] = values
+                for dimension, dimension_values in values.items():
+                    for value in dimension_values:
+                        positions[dimension, value].append(position)
+            size = len(self.ids)
+            self.alive = _bits_from_positions(range(size), size)
+            for (dimension, value), value_positions in positions.items():
+                self.bits[dimension][value] = _bits_from_positions(value_positions, size)
+            return
+
+        for sp_id, values in members.items():
+            bit = 1 << self._position(sp_id)
+            self.members[sp_id] = values
+            self.alive |= bit
+            for dimension, dimension_values in values.items():
+                for value in dimension_values:
+                    self.bits[dimension][value] |= bit
+
+    def remove(self, sp_ids):
+        for sp_id in sp_ids:
+            values = self.members.pop(sp_id, None)
+            if values is None:
+                continue
+            mask = ~(1 << self.positions[sp_id])
+            self.alive &= mask
+            for dimension, dimension_values in values.items():
+                for value in dimension_values:
+                    self.bits[dimension][value] &= mask
+                    if not self.bits[dimension][value]:
+                        del self.bits[dimension][value]
+
+    def _dimension_mask(self, dimension, values):
+        if dimension == 'min_rating':
+            # آستانه‌ها تو در تو هستند؛ کمترین آستانه‌ی درخواستی معیار است
+            return self.bits[dimension].get(min(values), 0)
+        mask = 0
+        for value in values:
+            mask |= self.bits[dimension].get(value, 0)
+        return mask
+
+    def query(self, filters, with_counts=True):
+        """
+        filters: {dimension: [values]}؛ مقادیر یک بُعد OR و بُعدها با هم AND می‌شوند
+        خروجی: (bitset نتیجه، {dimension: {value: count}})
+        """
+        self.ensure_ready()
+        with self.lock:
+            masks = {dimension: self._dimension_mask(dimension, values)
+                     for dimension, values in filters.items() if values}
+            result = self.alive
+            for mask in masks.values():
+                result &= mask
+            if not with_counts:
+                return result, {}
+
+            counts = {}
+            for dimension in DIMENSIONS:
+                others = self.alive
+                for other, mask in masks.items():
+                    if other != dimension:
+                        others &= mask
+                counts[dimension] = {
+                    value: count
+                    for value, bits in self.bits[dimension].items()
+                    if (count := (bits & others).bit_count())
+                }
+            return result, counts
+
+    def ids_from_bits(self, bits):
+        with self.lock:
+            if not bits:
+                return []
+            raw = np.frombuffer(bits.to_bytes((bits.bit_length() + 7) // 8, 'little'), dtype=np.uint8)
+            positions = np.flatnonzero(np.unpackbits(raw, bitorder='little'))
+            return sorted(self.ids[position] for position in positions)
+
+    def label(self, dimension, value):
+        return self.labels[dimension].get(value, str(value))
+
+
+facet_index = FacetIndex()
+
+
+def facet_conditions(filters):
+    """
+    همان فیلترهای FacetIndex.query به صورت شرط‌های SQL روی ServiceProvider
+
+    برای نتیجه‌های بزرگی که لیست idهایشان در IN جا نمی‌شود (SQLite حداکثر چند ده هزار پارامتر می‌پذیرد).
+    """
+    conditions = []
+    for dimension, values in filters.items():
+        if not values:
+            continue
+        if dimension == 'category':
+            conditions.append(Q(category_id__in=values))
+        elif dimension == 'city':
+            conditions.append(Q(address__city_id__in=values))
+        elif dimension == 'expert':
+            conditions.append(Exists(SPExpert.objects.filter(SP=OuterRef('pk'), is_active=True, expert_id__in=values)))
+        elif dimension == 'car_brand':
+            conditions.append(Exists(SPCarExpert.objects.annotate(brand=Lower(Trim('car__brand'))).filter(
+                SP=OuterRef('pk'), brand__in=values)))
+        elif dimension == 'tag':
+            conditions.append(Exists(SPTag.objects.annotate(pair=Concat('key__name', Value(':'), 'value')).filter(
+                SP=OuterRef('pk'), pair__in=values)))
+        elif dimension == 'min_rating':
+            conditions.append(Q(rate_count__gt=0, rate_sum__gte=min(values) * F('rate_count')))
+    return conditions
+
+
+def parse_facet_filters(query_params):
+    """
+    خواندن فیلترهای facet از query string؛ مقادیر تکراری یا جدا شده با کاما پشتیبانی می‌شوند
+    """
+    filters = {}
+    for dimension in DIMENSIONS:
+        raw = [part.strip() for value in query_params.getlist(dimension) for part in value.split(',')]
+        raw = [value for value in raw if value]
+        if not raw:
+            continue
+        if dimension in ('category', 'city', 'expert', 'min_rating'):
+            try:
+                filters[dimension] = [int(value) for value in raw]
+            except ValueError:
+                raise ValueError(f"{dimension} expects integer values.")
+            if dimension == 'min_rating' and not all(value in RATING_THRESHOLDS for value in filters[dimension]):
+                raise ValueError(f"min_rating expects values between {RATING_THRESHOLDS[0]} and "
+                                 f"{RATING_THRESHOLDS[-1]}.")
+        elif dimension == 'car_brand':
+            filters[dimension] = [value.lower() for value in raw]
+        else:
+            filters[dimension] = raw
+    return filters
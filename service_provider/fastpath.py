@@ -0,0 +1,86 @@
+from django.conf import settings
+from rest_framework.response import Response
+
+
+class RowField:
+    """
+    یک فیلد خروجی RowSerializer
+
+    column: ستون ردیف .values()؛ None یعنی کل ردیف به تابع تبدیل داده شود
+    convert: نام متد تبدیل روی RowSerializer با امضای (value, state)
+    omit_none: مثل فیلدهای فقط‌خواندنی DRF که وقتی رابطه‌ی میانی None است در خروجی نمی‌آیند
+    """
+
+    def __init__(self, name, column=None, convert=None, omit_none=False):
+        self.name = name
+        self.column = name if column is None and convert is None else column
+        self.convert = convert
+        self.omit_none = omit_none
+
+
+class RowSerializer:
+    """
+    سریال‌سازی فقط‌خواندنی سریع برای لیست‌ها: ردیف‌های .values() مستقیم به dict خروجی تبدیل می‌شوند
+
+    از روی `fields` یک تابع پایتون مخصوص همین فهرست فیلدها ساخته (compile) می‌شود تا برای هر ردیف
+    فقط یک dict literal ساخته شود، بدون ماشین فیلدهای DRF. خروجی باید با serializer معادل یکسان باشد.
+    زیرکلاس‌ها `columns`، `fields` و در صورت نیاز `prepare(rows, context)` را تعریف می‌کنند.
+    """
+    columns = ()
+    fields = ()
+
+    def __init__(self):
+        self._serialize_row = self._compile()
+
+    def _compile(self):
+        converters, items, omitted = {}, [], []
+        for position, field in enumerate(self.fields):
+            value = 'row' if field.column is None else f'row[{field.column!r}]'
+            if field.convert:
+                converters[f'convert_{position}'] = getattr(self, field.convert)
+                value = f'convert_{position}({value}, state)'
+            items.append(f'{field.name!r}: {value}')
+            if field.omit_none:
+                omitted.append(field)
+
+        lines = [f"def make({', '.join(converters)}):", "    def serialize_row(row, state):"]
+        lines.append(f"        out = {{{', '.join(items)}}}")
+        for field in omitted:
+            lines.append(f"        if out[{field.name!r}] is None:")
+            lines.append(f"            del out[{field.name!r}]")
+        lines.append("        return out")
+        lines.append("    return serialize_row")
+        namespace = {}
+        exec(compile('\n'.join(lines), f'<{type(self).__name__}>', 'exec'), namespace)
+        return namespace['make'](**converters)
+
+    def prepare(self, rows, context):
+        """
+        داده‌ی مشترک همه‌ی ردیف‌ها (مثلاً نتیجه‌ی کوئری‌های دسته‌ای) که به تابع‌های تبدیل داده می‌شود
+        """
+        return {}
+
+    def serialize(self, rows, context=None):
+        rows = list(rows)
+        state = self.prepare(rows, context or {})
+        serialize_row = self._serialize_row
+        return [serialize_row(row, state) for row in rows]
+
+
+class RowListMixin:
+    """
+    action لیست با `row_serializer` (یک RowSerializer) روی ردیف‌های .values() به جای serializer معمولی
+    با settings.FAST_LIST_SERIALIZATION = False مسیر معمولی DRF استفاده می‌شود.
+    """
+    row_serializer = None
+
+    def list(self, request, *args, **kwargs):
+        if self.row_serializer is None or not getattr(settings, 'FAST_LIST_SERIALIZATION', True):
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        queryset = queryset.prefetch_related(None).values(*self.row_serializer.columns)
+        page = self.paginate_queryset(queryset)
+        data = self.row_serializer.serialize(queryset if page is None else page, self.get_serializer_context())
+        if page is None:
+            return Response(data)
+        return self.get_paginated_response(data)
@@ -0,0 +1,57 @@
+class FieldSelection:
+    """
+    انتخاب فیلدها از روی ?fields= و ?expand=
+
+    fields: فهرست فیلدهای سطح بالا، با نقطه برای زیرفیلدها (reviews.title)
+    expand: رابطه‌هایی که به جای شناسه به صورت کامل برگردانده می‌شوند
+    بدون هیچ‌کدام از این دو پارامتر همه‌ی فیلدها کامل برگردانده می‌شوند (شکل قبلی پاسخ).
+    """
+
+    def __init__(self, fields=None, expand=None, subfields=None):
+        self.fields = fields  # None یعنی همه
+        self.expand = set(expand or ())
+        self.subfields = subfields or {}
+        self.legacy = fields is None and not self.expand
+
+    @classmethod
+    def from_query_params(cls, query_params, allowed, relations):
+        """
+        allowed: نام همه‌ی فیلدهای سطح بالا
+        relations: {رابطه‌ی قابل expand: نام زیرفیلدهای مجاز یا None}
+        خطا: ValueError برای نام ناشناخته
+        """
+        def split(name):
+            return [part.strip() for value in query_params.getlist(name) for part in value.split(',') if part.strip()]
+
+        requested, expand, subfields = split('fields'), split('expand'), {}
+        fields = None
+        if requested:
+            fields = set()
+            for item in requested:
+                name, _, sub = item.partition('.')
+                fields.add(name)
+                if sub:
+                    if relations.get(name) is None:
+                        raise ValueError(f"'{name}' has no nested fields.")
+                    if sub not in relations[name]:
+                        raise ValueError(f"Unknown field: {item}.")
+                    subfields.setdefault(name, set()).add(sub)
+                    expand.append(name)
+        unknown = (fields or set()) - set(allowed)
+        if unknown:
+            raise ValueError(f"Unknown field(s): {', '.join(sorted(unknown))}.")
+        not_expandable = set(expand) - set(relations)
+        if not_expandable:
+            raise ValueError(f"Cannot expand: {', '.join(sorted(not_expandable))}.")
+        if fields is not None:
+            fields |= set(expand)
+        return cls(fields, expand, subfields)
+
+    def includes(self, name):
+        return self.fields is None or name in self.fields
+
+    def expanded(self, name):
+        return self.legacy or name in self.expand
+
+
+ALL_FIELDS = FieldSelection()
@@ -0,0 +1,112 @@
+import math
+import re
+import numpy as np
+from django.db.models import Q
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.32
+GEOHASH_PRECISION = 9
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+_LOCATION_RE = re.compile(r'^\s*([-+]?\d+(?:\.\d+)?)\s*[,\s]\s*([-+]?\d+(?:\.\d+)?)\s*$')
+
+
+def parse_location(text):
+    """
+    تبدیل رشته‌ی "lat, lon" یا "lat lon" به عدد؛ در صورت نامعتبر بودن (None, None)
+    """
+    match = _LOCATION_RE.match(text or '')
+    if not match:
+        return None, None
+    lat, lon = float(match.group(1)), float(match.group(2))
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None, None
+    return lat, lon
+
+
+def geohash_encode(lat, lon, precision=GEOHASH_PRECISION):
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, bit_count, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, value = (lon_range, lon) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            rng[0] = mid
+        else:
+            bits <<= 1
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits, bit_count = 0, 0
+    return ''.join(chars)
+
+
+def geohash_cell_size(precision):
+    """
+    ابعاد هر خانه‌ی geohash بر حسب درجه: (ارتفاع عرض جغرافیایی، پهنای طول جغرافیایی)
+    """
+    lon_bits = math.ceil(precision * 5 / 2)
+    lat_bits = precision * 5 // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def covering_geohashes(lat, lon, radius_km):
+    """
+    پیشوندهای geohash (خانه‌ی مرکزی و ۸ همسایه) که دایره‌ی جستجو را کامل پوشش می‌دهند؛
+    اگر شعاع از بزرگ‌ترین خانه بیشتر باشد None برمی‌گردد
+    """
+    lon_km_per_degree = KM_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6)
+    precision = None
+    for candidate in range(GEOHASH_PRECISION, 0, -1):
+        height, width = geohash_cell_size(candidate)
+        if height * KM_PER_DEGREE >= radius_km and width * lon_km_per_degree >= radius_km:
+            precision = candidate
+            break
+    if precision is None:
+        return None
+
+    height, width = geohash_cell_size(precision)
+    prefixes = set()
+    for dy in (-1, 0, 1):
+        for dx in (-1, 0, 1):
+            cell_lat = min(max(lat + dy * height, -90.0), 90.0)
+            cell_lon = (lon + dx * width + 180.0) % 360.0 - 180.0
+            prefixes.add(geohash_encode(cell_lat, cell_lon, precision))
+    return sorted(prefixes)
+
+
+def haversine_km(lat, lon, lats, lons):
+    """
+    فاصله‌ی یک نقطه تا آرایه‌ای از نقاط (برداری با numpy)
+    """
+    lat1, lon1 = np.radians(lat), np.radians(lon)
+    lat2, lon2 = np.radians(lats), np.radians(lons)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def nearest(queryset, lat, lon, radius_km, limit):
+    """
+    k نزدیک‌ترین ServiceProvider در شعاع داده شده به صورت [(id, distance_km), ...]
+    """
+    prefixes = covering_geohashes(lat, lon, radius_km)
+    candidates = queryset.filter(geohash__isnull=False)
+    if prefixes:
+        # بازه‌ی رشته‌ای معادل startswith است ولی از ایندکس معمولی استفاده می‌کند
+        prefix_filter = Q()
+        for prefix in prefixes:
+            prefix_filter |= Q(geohash__gte=prefix, geohash__lt=prefix + '~')
+        candidates = candidates.filter(prefix_filter)
+
+    rows = list(candidates.values_list('id', 'latitude', 'longitude'))
+    if not rows:
+        return []
+    ids, lats, lons = (np.asarray(column) for column in zip(*rows))
+    distances = haversine_km(lat, lon, lats.astype(float), lons.astype(float))
+    inside = np.flatnonzero(distances <= radius_km)
+    if inside.size > limit:
+        inside = inside[np.argpartition(distances[inside], limit - 1)[:limit]]
+    order = inside[np.argsort(distances[inside], kind='stable')]
+    return [(int(ids[i]), float(distances[i])) for i in order]
@@ -0,0 +1,82 @@
+import io
+import logging
+import posixpath
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+# فیلدهای تصویر و ستونی که نسخه‌های کوچک‌شده‌ی آن‌ها در آن نگه داشته می‌شود
+IMAGE_FIELDS = {
+    'service_provider.ServiceProvider': {'logo_image': 'logo_variants', 'main_image': 'main_image_variants'},
+    'service_provider.SPImages': {'image': 'image_variants'},
+    'service_provider.SPCategory': {'icon': 'icon_variants'},
+    'service_provider.Expert': {'icon': 'icon_variants'},
+}
+VARIANTS_DIR = 'variants'
+
+
+def variant_name(name, width):
+    stem, _ = posixpath.splitext(name)
+    return f'{VARIANTS_DIR}/{stem}.w{width}.webp'
+
+
+def _has_alpha(image):
+    return image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info)
+
+
+def build_variants(name, storage=default_storage):
+    """
+    ساخت نسخه‌های WebP تصویر برای هر عرض IMAGE_VARIANT_WIDTHS که از عرض اصلی بزرگ‌تر نباشد
+    خروجی: {'source': name, '<عرض>': نام فایل نسخه}؛ برای فایل ناموجود یا خراب فقط source
+    """
+    variants = {'source': name}
+    try:
+        with storage.open(name, 'rb') as file, Image.open(file) as original:
+            image = ImageOps.exif_transpose(original)
+            image = image.convert('RGBA' if _has_alpha(image) else 'RGB')
+    except (FileNotFoundError, UnidentifiedImageError) as exc:
+        logger.warning("Cannot build variants for %s: %s", name, exc)
+        return variants
+
+    widths = [width for width in sorted(settings.IMAGE_VARIANT_WIDTHS) if width <= image.width]
+    for width in widths or [image.width]:
+        resized = image
+        if width != image.width:
+            resized = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+        buffer = io.BytesIO()
+        resized.save(buffer, 'WEBP', quality=settings.IMAGE_VARIANT_QUALITY, method=4)
+        target = variant_name(name, width)
+        if storage.exists(target):
+            storage.delete(target)
+        variants[str(width)] = storage.save(target, ContentFile(buffer.getvalue()))
+    return variants
+
+
+def delete_variants(variants, keep=(), storage=default_storage):
+    for key, name in (variants or {}).items():
+        if key != 'source' and name not in keep:
+            storage.delete(name)
+
+
+def variant_items(variants):
+    """
+    (عرض، نام فایل) به ترتیب عرض
+    """
+    return sorted(
+        ((int(key), name) for key, name in (variants or {}).items() if key != 'source'),
+        key=lambda item: item[0],
+    )
+
+
+def srcset(variants, request=None, storage=default_storage):
+    """
+    {'64w': url, ...} برای serializerها؛ تا وقتی نسخه‌ها ساخته نشده‌اند خالی است
+    """
+    urls = {}
+    for width, name in variant_items(variants):
+        url = storage.url(name)
+        urls[f'{width}w'] = request.build_absolute_uri(url) if request is not None else url
+    return urls
@@ -0,0 +1,331 @@
+import csv
+import hashlib
+import io
+import os
+from datetime import datetime, time
+from functools import partial
+from itertools import islice
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_time
+from .geo import geohash_encode, parse_location
+from .models import (
+    Address, City, ProviderImport, ServiceProvider, SPCategory, SPOwner, SPTag, SPWorkTime, TagKey, Weekday
+)
+from .services import rebuild_availability
+from .signals import invalidate_responses, reindex_providers
+from .tasks import generate_image_variants
+
+FORMATS = ('csv', 'xlsx')
+
+# ستون‌های فایل؛ work_times مثل "Monday 09:00-17:00; Tuesday 09:00-13:00" و tags مثل "brand:BMW; service:oil"
+COLUMNS = (
+    'name', 'owner', 'category', 'city', 'district', 'neighbourhood', 'full_address', 'location', 'logo_image',
+    'work_times', 'tags',
+)
+REQUIRED_COLUMNS = ('name', 'location')
+MAX_LENGTHS = {
+    'name': 255, 'owner': 150, 'category': 255, 'city': 255, 'district': 255, 'neighbourhood': 150,
+    'full_address': 255, 'location': 255, 'logo_image': 100,
+}
+
+
+class ImportFileError(ValueError):
+    pass
+
+
+class ImportTakenOver(Exception):
+    """
+    worker دیگری job را گرفته و جلو رفته است؛ chunk فعلی rollback می‌شود
+    """
+
+
+def file_format(name):
+    extension = os.path.splitext(name)[1].lower().lstrip('.')
+    if extension not in FORMATS:
+        raise ImportFileError(f"Unsupported file type {name!r}; expected one of {', '.join(FORMATS)}.")
+    return extension
+
+
+def file_checksum(stream):
+    digest = hashlib.sha256()
+    for block in iter(partial(stream.read, 1 << 20), b''):
+        digest.update(block)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+def run_import(job, chunk_size=None):
+    """
+    اجرا یا ادامه‌ی ورود فایل یک ProviderImport (مسیر source یا فایل آپلودشده)؛ None اگر job قابل گرفتن نباشد
+    """
+    fmt = file_format(job.name)
+    with (open(job.source, 'rb') if job.source else job.file.storage.open(job.file.name, 'rb')) as stream:
+        if not job.checksum:
+            job.checksum = file_checksum(stream)
+            job.save(update_fields=['checksum', 'updated_at'])
+        return ProviderImporter(job, chunk_size).run(stream, fmt)
+
+
+def read_rows(stream, fmt):
+    """
+    خواندن جریانی ردیف‌ها به صورت (شماره‌ی ردیف در فایل، {ستون: متن})؛ ردیف ۱ عنوان ستون‌هاست
+    """
+    rows = _xlsx_rows(stream) if fmt == 'xlsx' else _csv_rows(stream)
+    try:
+        header = [str(value or '').strip().lower() for value in next(rows, [])]
+        missing = [column for column in REQUIRED_COLUMNS if column not in header]
+        if missing:
+            raise ImportFileError(f"Missing columns: {', '.join(missing)}.")
+        for number, values in enumerate(rows, start=2):
+            if any(values):
+                yield number, dict(zip(header, values))
+    finally:
+        rows.close()
+
+
+def _csv_rows(stream):
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    try:
+        for values in csv.reader(text):
+            yield [value.strip() for value in values]
+    finally:
+        # stream را خود فراخواننده می‌بندد
+        text.detach()
+
+
+def _xlsx_rows(stream):
+    from openpyxl import load_workbook
+    # read_only فقط ردیف‌های در حال خواندن را در حافظه نگه می‌دارد
+    workbook = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        for values in workbook.active.iter_rows(values_only=True):
+            yield [_cell_text(value) for value in values]
+    finally:
+        workbook.close()
+
+
+def _cell_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, (datetime, time)):
+        return value.strftime('%H:%M')
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+
+def _parse_time(text):
+    try:
+        return parse_time(text.strip())
+    except ValueError:
+        return None
+
+
+def _entries(text):
+    return [entry.strip() for entry in (text or '').split(';') if entry.strip()]
+
+
+class ProviderImporter:
+    """
+    ورود ServiceProviderها از یک فایل در chunkهای PROVIDER_IMPORT_CHUNK_SIZE ردیفی
+
+    هر chunk با bulk_create در یک transaction نوشته می‌شود و rows_done همان‌جا ذخیره می‌شود. City، SPCategory،
+    TagKey و Weekday از map درون‌حافظه‌ای خوانده و نام‌های تازه ساخته می‌شوند؛ owner (نام کاربری) برای هر chunk
+    با یک کوئری. ردیف نامعتبر وارد نمی‌شود و خطایش در errors می‌ماند.
+    """
+
+    def __init__(self, job, chunk_size=None):
+        self.job = job
+        self.chunk_size = chunk_size or settings.PROVIDER_IMPORT_CHUNK_SIZE
+        self.weekdays = {name.lower(): pk for pk, name in Weekday.objects.values_list('pk', 'name')}
+        self.cities = {}
+        for pk, name in City.objects.order_by('-pk').values_list('pk', 'name'):
+            self.cities[name] = pk
+        self.categories = dict(SPCategory.objects.values_list('name', 'pk'))
+        self.tag_keys = dict(TagKey.objects.values_list('name', 'pk'))
+
+    def run(self, stream, fmt):
+        """
+        اجرای job اگر قابل گرفتن باشد (ProviderImport.objects.claimable)؛ در غیر این صورت None
+
+        گرفتن job با یک UPDATE شرطی اتمیک است، پس دو اجرای همزمان (دو بار action در admin یا همراه با
+        import_providers) یک ردیف را دو بار وارد نمی‌کنند. job در حال اجرای worker ازکارافتاده بعد از
+        PROVIDER_IMPORT_STALE_AFTER از آخرین ردیف ذخیره‌شده ادامه می‌یابد؛ اگر آن worker زنده باشد، chunk بعدی‌اش
+        با ImportTakenOver رد می‌شود. پیشرفت بعد از گرفتن job از دیتابیس خوانده می‌شود.
+        """
+        job = self.job
+        claimed = ProviderImport.objects.claimable().filter(pk=job.pk).update(
+            status=ProviderImport.RUNNING, updated_at=timezone.now())
+        if not claimed:
+            return None
+        job.refresh_from_db(fields=['status', 'rows_done', 'created_count', 'error_count', 'errors', 'updated_at'])
+        reader = read_rows(stream, fmt)
+        try:
+            rows = islice(reader, job.rows_done, None)
+            while True:
+                chunk = list(islice(rows, self.chunk_size))
+                if not chunk:
+                    break
+                self.import_chunk(chunk)
+        except ImportTakenOver:
+            return None
+        except Exception:
+            job.status = ProviderImport.FAILED
+            job.save(update_fields=['status', 'updated_at'])
+            raise
+        finally:
+            reader.close()
+        job.status = ProviderImport.DONE
+        job.save(update_fields=['status', 'updated_at'])
+        return job
+
+    def parse(self, values):
+        """
+        یک ردیف فایل به داده‌ی ServiceProvider؛ خطاها به صورت {ستون: پیام}
+        """
+        errors = {
+            column: f"Ensure this field has no more than {limit} characters."
+            for column, limit in MAX_LENGTHS.items() if len(values.get(column, '')) > limit
+        }
+        name = values.get('name', '')
+        if not name:
+            errors['name'] = "This field is required."
+        location = values.get('location', '')
+        latitude, longitude = parse_location(location)
+        if latitude is None:
+            errors['location'] = 'Expected "lat, lon".'
+
+        work_times = []
+        for entry in _entries(values.get('work_times')):
+            weekday, _, hours = entry.partition(' ')
+            start, _, end = hours.strip().partition('-')
+            start, end = _parse_time(start), _parse_time(end)
+            if weekday.lower() not in self.weekdays:
+                errors['work_times'] = f"Unknown weekday {weekday!r}."
+            elif start is None or end is None:
+                errors['work_times'] = f"Expected 'Weekday HH:MM-HH:MM', got {entry!r}."
+            else:
+                work_times.append((self.weekdays[weekday.lower()], start, end))
+
+        tags = {}
+        for entry in _entries(values.get('tags')):
+            key, _, value = entry.partition(':')
+            if not key.strip() or not value.strip():
+                errors['tags'] = f"Expected 'key:value', got {entry!r}."
+            else:
+                tags[(key.strip()[:100], value.strip()[:255])] = None
+
+        if errors:
+            return None, errors
+        owner = values.get('owner', '')
+        if not owner and self.job.owner_id is None:
+            return None, {'owner': "This field is required."}
+        return {
+            'name': name,
+            'owner': owner,
+            'category': values.get('category', ''),
+            'city': values.get('city', ''),
+            'address': {field: values.get(field, '') for field in ('district', 'neighbourhood', 'full_address')},
+            'location': location,
+            'latitude': latitude,
+            'longitude': longitude,
+            'logo_image': values.get('logo_image', ''),
+            'work_times': work_times,
+            'tags': list(tags),
+        }, None
+
+    def import_chunk(self, chunk):
+        parsed, errors = [], []
+        for number, values in chunk:
+            data, row_errors = self.parse(values)
+            if row_errors:
+                errors.append({'row': number, 'errors': row_errors})
+            else:
+                parsed.append((number, data))
+
+        usernames = {data['owner'] for _, data in parsed if data['owner']}
+        owners = dict(SPOwner.objects.filter(user__username__in=usernames).values_list('user__username', 'pk'))
+        rows = []
+        for number, data in parsed:
+            if data['owner'] and data['owner'] not in owners:
+                errors.append({'row': number, 'errors': {'owner': f"Unknown owner {data['owner']!r}."}})
+            else:
+                rows.append(data)
+        errors.sort(key=lambda error: error['row'])
+
+        with transaction.atomic():
+            new_categories = self._resolve_names(rows)
+            addresses = [
+                Address(city_id=self.cities[data['city']], **data['address']) for data in rows if data['city']
+            ]
+            Address.objects.bulk_create(addresses)
+            addresses = iter(addresses)
+            providers = []
+            for data in rows:
+                providers.append(ServiceProvider(
+                    name=data['name'],
+                    owner_id=owners.get(data['owner'], self.job.owner_id),
+                    category_id=self.categories.get(data['category']),
+                    address=next(addresses) if data['city'] else None,
+                    location=data['location'],
+                    latitude=data['latitude'],
+                    longitude=data['longitude'],
+                    geohash=geohash_encode(data['latitude'], data['longitude']),
+                    logo_image=data['logo_image'],
+                ))
+            ServiceProvider.objects.bulk_create(providers)
+            SPWorkTime.objects.bulk_create([
+                SPWorkTime(SP=provider, weekday_id=weekday_id, time_start=start, time_end=end)
+                for provider, data in zip(providers, rows) for weekday_id, start, end in data['work_times']
+            ])
+            SPTag.objects.bulk_create([
+                SPTag(SP=provider, key_id=self.tag_keys[key], value=value)
+                for provider, data in zip(providers, rows) for key, value in data['tags']
+            ])
+
+            # سیگنال‌های post_save برای bulk_create اجرا نمی‌شوند
+            sp_ids = [provider.pk for provider in providers]
+            rebuild_availability(sp_ids)
+            reindex_providers(sp_ids)
+            invalidate_responses('providers', 'categories' if new_categories else None)
+            for provider in providers:
+                if provider.logo_image:
+                    transaction.on_commit(partial(
+                        generate_image_variants.delay, ServiceProvider._meta.label, provider.pk, 'logo_image'))
+
+            job = self.job
+            room = max(0, settings.PROVIDER_IMPORT_MAX_ERRORS - len(job.errors))
+            job.errors.extend(errors[:room])
+            rows_done = job.rows_done
+            job.rows_done += len(chunk)
+            job.created_count += len(providers)
+            job.error_count += len(errors)
+            job.updated_at = timezone.now()
+            # شرط rows_done: اگر worker دیگری job را گرفته و chunk را نوشته باشد، این chunk ذخیره نمی‌شود
+            saved = ProviderImport.objects.filter(
+                pk=job.pk, status=ProviderImport.RUNNING, rows_done=rows_done,
+            ).update(rows_done=job.rows_done, created_count=job.created_count, error_count=job.error_count,
+                     errors=job.errors, updated_at=job.updated_at)
+            if not saved:
+                raise ImportTakenOver(f"Import #{job.pk} was taken over by another worker.")
+
+    def _resolve_names(self, rows):
+        """
+        ساخت City، SPCategory و TagKeyهای تازه‌ی chunk و افزودن آن‌ها به mapها
+        """
+        cities = {data['city'] for data in rows if data['city']} - self.cities.keys()
+        for city in City.objects.bulk_create([City(name=name) for name in cities]):
+            self.cities[city.name] = city.pk
+
+        categories = {data['category'] for data in rows if data['category']} - self.categories.keys()
+        if categories:
+            SPCategory.objects.bulk_create([SPCategory(name=name) for name in categories], ignore_conflicts=True)
+            self.categories.update(SPCategory.objects.filter(name__in=categories).values_list('name', 'pk'))
+
+        keys = {key for data in rows for key, _ in data['tags']} - self.tag_keys.keys()
+        if keys:
+            TagKey.objects.bulk_create([TagKey(name=name) for name in keys], ignore_conflicts=True)
+            self.tag_keys.update(TagKey.objects.filter(name__in=keys).values_list('name', 'pk'))
+        return categories
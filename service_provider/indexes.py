@@ -0,0 +1,113 @@
+import threading
+from django.core.cache import cache
+
+# اگر عقب‌ماندگی یک worker از این تعداد تغییر بیشتر شود ایندکس از نو ساخته می‌شود
+MAX_REPLAY = 500
+# بارگذاری دوباره‌ی بیش از این تعداد ServiceProvider گران‌تر از ساخت دوباره‌ی کامل است
+MAX_REFRESH = 1000
+CHANGE_TTL = 60 * 60
+
+
+class InMemoryIndex:
+    """
+    پایه‌ی ایندکس‌های درون‌حافظه‌ای روی ServiceProvider
+
+    هر worker نسخه‌ی خودش را نگه می‌دارد. تغییرات (شناسه‌ی ServiceProviderها) در cache مشترک
+    با یک شماره‌ی نسخه ثبت می‌شوند و workerهای دیگر قبل از هر پرس‌وجو آن‌ها را اعمال می‌کنند.
+    زیرکلاس‌ها `clear`، `load(sp_ids)` و `remove(sp_ids)` را پیاده‌سازی می‌کنند.
+    """
+    name = None
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.built = False
+        self.version = 0
+
+    @property
+    def version_key(self):
+        return f'service_provider:{self.name}:version'
+
+    def change_key(self, version):
+        return f'service_provider:{self.name}:change:{version}'
+
+    def clear(self):
+        raise NotImplementedError
+
+    def load(self, sp_ids=None):
+        """
+        خواندن داده‌ی ServiceProviderها از پایگاه داده؛ None یعنی همه
+        """
+        raise NotImplementedError
+
+    def remove(self, sp_ids):
+        raise NotImplementedError
+
+    def rebuild(self):
+        with self.lock:
+            self.version = cache.get_or_set(self.version_key, 0, None)
+            self.clear()
+            self.load()
+            self.built = True
+
+    def ensure_ready(self):
+        """
+        ساخت ایندکس در اولین استفاده و اعمال تغییرات ثبت‌شده توسط workerهای دیگر
+        """
+        if not self.built:
+            self.rebuild()
+            return
+        shared = cache.get(self.version_key) or 0
+        if shared <= self.version:
+            return
+        with self.lock:
+            if shared - self.version > MAX_REPLAY:
+                self.rebuild()
+                return
+            keys = [self.change_key(version) for version in range(self.version + 1, shared + 1)]
+            changes = cache.get_many(keys)
+            if len(changes) != len(keys):
+                self.rebuild()
+                return
+            self.refresh({sp_id for key in keys for sp_id in changes[key]})
+            self.version = shared
+
+    def refresh(self, sp_ids):
+        with self.lock:
+            if len(sp_ids) > MAX_REFRESH:
+                version = self.version
+                self.rebuild()
+                self.version = max(self.version, version)
+                return
+            self.remove(sp_ids)
+            self.load(sp_ids)
+
+    def invalidate(self):
+        """
+        وادار کردن همه‌ی workerها به ساخت دوباره‌ی کامل در پرس‌وجوی بعدی
+        """
+        cache.add(self.version_key, 0, None)
+        cache.incr(self.version_key, MAX_REPLAY + 1)
+        self.built = False
+
+    def mark_dirty(self, sp_ids):
+        """
+        از سیگنال‌ها صدا زده می‌شود: اعمال محلی و انتشار تغییر برای workerهای دیگر
+        """
+        sp_ids = {sp_id for sp_id in sp_ids if sp_id is not None}
+        if not sp_ids:
+            return
+        if len(sp_ids) > MAX_REFRESH:
+            self.invalidate()
+            return
+        try:
+            version = cache.incr(self.version_key)
+        except ValueError:
+            cache.add(self.version_key, 0, None)
+            version = cache.incr(self.version_key)
+        cache.set(self.change_key(version), sorted(sp_ids), CHANGE_TTL)
+        if not self.built:
+            return
+        with self.lock:
+            if version == self.version + 1:
+                self.refresh(sp_ids)
+                self.version = version
@@ -0,0 +1,107 @@
+import json
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from service_provider.benchmarks import DRIVERS, ENDPOINTS, Fixture, compare, run_benchmarks
+from service_provider.synthetic import SyntheticDataset
+
+
+class Command(BaseCommand):
+    help = ("Benchmark the service-providers list/detail, login and OTP verification endpoints on a synthetic "
+            "dataset: p50/p95/p99 latency, throughput, SQL queries and peak memory per endpoint, through "
+            "django.test.Client, AsyncClient (ASGI) and a real wsgiref HTTP server. By default a test database "
+            "is created and destroyed. Fails when BENCHMARK_QUERY_BUDGETS or the --baseline report is exceeded.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--providers', type=int, default=1000, help="Size of the generated dataset.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--password', default='benchmark', help="Password of the generated users.")
+        parser.add_argument('--mode', action='append', choices=sorted(DRIVERS),
+                            help="Repeat for several modes (default: client).")
+        parser.add_argument('--endpoint', action='append', choices=list(ENDPOINTS),
+                            help="Repeat for several endpoints (default: all).")
+        parser.add_argument('--iterations', type=int, default=200, help="Timed requests per endpoint.")
+        parser.add_argument('--warmup', type=int, default=20)
+        parser.add_argument('--memory-iterations', type=int, default=20,
+                            help="Extra requests traced with tracemalloc for peak memory; 0 disables it.")
+        parser.add_argument('--cold', action='store_true', help="Clear the cache before every request.")
+        parser.add_argument('--output', help="Write the JSON report to this file.")
+        parser.add_argument('--baseline', help="JSON report of an earlier run to compare against.")
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help="Allowed p95/p99/peak memory growth over the baseline, as a ratio.")
+        parser.add_argument('--existing-db', action='store_true',
+                            help="Use the configured database instead of a test database.")
+        parser.add_argument('--keepdb', action='store_true', help="Keep the test database and its dataset.")
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1 or options['providers'] < 1:
+            raise CommandError("--iterations and --providers must be positive.")
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as file:
+                baseline = json.load(file)
+
+        if options['existing_db']:
+            report = self.run(options)
+        else:
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+            try:
+                report = self.run(options)
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+
+        if baseline:
+            changed = [
+                key for key in ('providers', 'database', 'cold') if baseline['meta'].get(key) != report['meta'][key]
+            ]
+            if changed:
+                self.stderr.write(self.style.WARNING(f"The baseline differs in {', '.join(changed)}."))
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(report, file, indent=2)
+        self.write_summary(report)
+
+        errors = [
+            f"{mode} {endpoint}: {result['errors']} of {result['requests']} responses were not 200."
+            for mode, results in report['modes'].items() for endpoint, result in results.items() if result['errors']
+        ]
+        violations = errors + compare(report, baseline, options['tolerance'], settings.BENCHMARK_QUERY_BUDGETS)
+        if violations:
+            raise CommandError("Benchmark budget exceeded:\n" + "\n".join(violations))
+
+    def run(self, options):
+        dataset = SyntheticDataset(options['providers'], seed=options['seed'], password=options['password'])
+        if not dataset.exists():
+            if options['verbosity'] > 0:
+                self.stdout.write(f"Generating {options['providers']} providers (seed {options['seed']})...")
+            dataset.generate()
+
+        # throttle درخواست‌های تکراری login/verify-otp را بعد از چند بار 429 می‌کند
+        with override_settings(AUTH_THROTTLE_RATES={}):
+            report = run_benchmarks(
+                Fixture(dataset, options['password']),
+                options['mode'] or ['client'],
+                options['endpoint'] or list(ENDPOINTS),
+                options['iterations'],
+                warmup=options['warmup'],
+                memory_iterations=options['memory_iterations'],
+                cold=options['cold'],
+            )
+        report['meta']['seed'] = options['seed']
+        return report
+
+    def write_summary(self, report):
+        meta = report['meta']
+        self.stdout.write(f"{meta['providers']} providers on {meta['database']}, {meta['iterations']} requests "
+                          f"per endpoint{', cold cache' if meta['cold'] else ''}")
+        self.stdout.write(f"{'mode':<8}{'endpoint':<18}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>9}"
+                          f"{'queries':>9}{'peak KB':>10}")
+        for mode, results in report['modes'].items():
+            for endpoint, result in results.items():
+                peak = result['peak_memory_kb']
+                self.stdout.write(
+                    f"{mode:<8}{endpoint:<18}{result['p50_ms']:>9.2f}{result['p95_ms']:>9.2f}"
+                    f"{result['p99_ms']:>9.2f}{result['throughput_rps']:>9.1f}{result['queries_max']:>9}"
+                    f"{'-' if peak is None else f'{peak:.1f}':>10}"
+                )
@@ -0,0 +1,91 @@
+import time
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+from cara.renderers import FastJSONRenderer
+from service_provider.models import ServiceProvider, SPCategory, SPOwner, SPTag, TagKey
+from service_provider.serializers import ServiceProviderShortRowSerializer, ServiceProviderShortSerializer
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ("Compare ServiceProviderShortSerializer + JSONRenderer with the .values() fast path + FastJSONRenderer "
+            "on the list payload. Synthetic rows are created inside a transaction that is rolled back.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=5, help="Best of this many runs is reported.")
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                ids = self.create_rows(options['rows'])
+                self.report(ids, options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def create_rows(self, count):
+        user = get_user_model().objects.create_user(
+            username='benchmark_list_serialization', email='benchmark_list_serialization@example.com')
+        owner = SPOwner.objects.create(user=user)
+        category = SPCategory.objects.create(name='benchmark_list_serialization')
+        key = TagKey.objects.create(name='benchmark')
+        providers = ServiceProvider.objects.bulk_create([
+            ServiceProvider(
+                name=f"Garage {i}", owner=owner, category=category if i % 4 else None,
+                logo_image=f'SP_logos/{i}.png', main_image=f'SP_main_images/{i}.png' if i % 2 else None,
+                location="35.7, 51.4", weekly_hours=[[480, 1020], [1920, 2460]],
+                rate_sum=i % 50, rate_count=i % 10,
+            )
+            for i in range(count)
+        ], batch_size=1000)
+        SPTag.objects.bulk_create([
+            SPTag(SP=sp, key=key, value=f"value{n}") for sp in providers for n in range(2)
+        ], batch_size=1000)
+        return [sp.id for sp in providers]
+
+    def best(self, repeat, function):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    def report(self, ids, repeat):
+        context = {'request': APIRequestFactory().get('/service/service-providers/')}
+        providers = ServiceProvider.objects.filter(pk__in=ids).order_by('id')
+        rows_serializer = ServiceProviderShortRowSerializer()
+        instances = list(providers.for_list())
+        rows = list(providers.values(*rows_serializer.columns))
+        state = rows_serializer.prepare(rows, context)
+
+        drf_data = ServiceProviderShortSerializer(instances, many=True, context=context).data
+        fast_data = [rows_serializer._serialize_row(row, state) for row in rows]
+        if JSONRenderer().render(drf_data) != FastJSONRenderer().render(fast_data):
+            self.stderr.write(self.style.WARNING("Fast path output differs from ServiceProviderShortSerializer."))
+
+        per_thousand = 1000 / len(ids)
+        stages = [
+            ("fetch", lambda: list(providers.for_list()),
+             lambda: rows_serializer.prepare(list(providers.values(*rows_serializer.columns)), context)),
+            ("serialize", lambda: ServiceProviderShortSerializer(instances, many=True, context=context).data,
+             lambda: [rows_serializer._serialize_row(row, state) for row in rows]),
+            ("render", lambda: JSONRenderer().render(drf_data), lambda: FastJSONRenderer().render(fast_data)),
+        ]
+        self.stdout.write(f"{len(ids)} rows, best of {repeat}, ms per 1,000 rows")
+        self.stdout.write(f"{'stage':<10}{'drf':>10}{'fast':>10}{'speedup':>10}")
+        totals = [0, 0]
+        for name, slow, fast in stages:
+            slow_ms = self.best(repeat, slow) * 1000 * per_thousand
+            fast_ms = self.best(repeat, fast) * 1000 * per_thousand
+            totals[0] += slow_ms
+            totals[1] += fast_ms
+            self.stdout.write(f"{name:<10}{slow_ms:>10.2f}{fast_ms:>10.2f}{slow_ms / fast_ms:>9.1f}x")
+        self.stdout.write(f"{'total':<10}{totals[0]:>10.2f}{totals[1]:>10.2f}{totals[0] / totals[1]:>9.1f}x")
@@ -0,0 +1,31 @@
+import sys
+from django.core.management.base import BaseCommand
+from service_provider.exports import EXPORTS, FORMATS, export_chunks
+
+
+class Command(BaseCommand):
+    help = ("Stream every Service Provider, review or rate to CSV or NDJSON, ordered by id. Rows are read in "
+            "chunks through a server-side cursor, so memory does not grow with the table.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(EXPORTS))
+        parser.add_argument('--format', choices=sorted(FORMATS), default='csv', dest='fmt')
+        parser.add_argument('--gzip', action='store_true', help="Compress the output with gzip.")
+        parser.add_argument('--output', '-o', default='-', help="Output file; '-' (default) writes to stdout.")
+        parser.add_argument('--chunk-size', type=int, help="Rows per cursor fetch (EXPORT_CHUNK_SIZE).")
+
+    def handle(self, *args, **options):
+        chunks = export_chunks(options['kind'], options['fmt'], compress=options['gzip'],
+                               chunk_size=options['chunk_size'])
+        if options['output'] == '-':
+            stream = getattr(self.stdout, 'buffer', None) or sys.stdout.buffer
+            for data in chunks:
+                stream.write(data)
+            stream.flush()
+            return
+        size = 0
+        with open(options['output'], 'wb') as stream:
+            for data in chunks:
+                stream.write(data)
+                size += len(data)
+        self.stderr.write(f"Wrote {size} bytes to {options['output']}.")
@@ -0,0 +1,35 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from service_provider.images import IMAGE_FIELDS
+from service_provider.tasks import generate_image_variants
+
+
+class Command(BaseCommand):
+    help = ("Build the resized WebP variants of existing images. By default only images whose variants are "
+            "missing or stale are queued.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', choices=sorted(IMAGE_FIELDS), action='append', dest='models',
+                            help="Only process the given model (repeatable). Defaults to all.")
+        parser.add_argument('--force', action='store_true', help="Rebuild variants that are already up to date.")
+        parser.add_argument('--sync', action='store_true', help="Build in this process instead of queueing.")
+
+    def handle(self, *args, **options):
+        total = 0
+        for label in options['models'] or sorted(IMAGE_FIELDS):
+            model = apps.get_model(label)
+            for field_name, variants_field in IMAGE_FIELDS[label].items():
+                rows = model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+                count = 0
+                for pk, name, variants in rows.values_list('pk', field_name, variants_field).iterator(chunk_size=2000):
+                    if not options['force'] and (variants or {}).get('source') == name:
+                        continue
+                    if options['sync']:
+                        generate_image_variants(label, pk, field_name)
+                    else:
+                        generate_image_variants.delay(label, pk, field_name)
+                    count += 1
+                self.stdout.write(f"{label}.{field_name}: {count}")
+                total += count
+        verb = "Built" if options['sync'] else "Queued"
+        self.stdout.write(self.style.SUCCESS(f"{verb} variants for {total} images."))
@@ -0,0 +1,58 @@
+import os
+from django.core.management.base import BaseCommand, CommandError
+from service_provider.imports import COLUMNS, ImportFileError, file_checksum, file_format, run_import
+from service_provider.models import ProviderImport, SPOwner
+
+
+class Command(BaseCommand):
+    help = (f"Import Service Providers from a CSV or XLSX file in fixed-size chunks. Columns: {', '.join(COLUMNS)}. "
+            "Running the command again on the same file resumes an interrupted import after its last committed chunk; "
+            "an import left running by a crashed process is resumed once PROVIDER_IMPORT_STALE_AFTER has passed.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--owner', help="Username of the owner for rows without an owner column.")
+        parser.add_argument('--chunk-size', type=int, help="Rows per transaction (PROVIDER_IMPORT_CHUNK_SIZE).")
+        parser.add_argument('--restart', action='store_true',
+                            help="Start a new import even if this file was imported before.")
+
+    def handle(self, *args, **options):
+        path = os.path.abspath(options['path'])
+        try:
+            file_format(path)
+            with open(path, 'rb') as stream:
+                checksum = file_checksum(stream)
+        except (ImportFileError, OSError) as exc:
+            raise CommandError(str(exc))
+        owner = None
+        if options['owner']:
+            owner = SPOwner.objects.filter(user__username=options['owner']).first()
+            if owner is None:
+                raise CommandError(f"No Service Provider owner with username {options['owner']!r}.")
+
+        job = ProviderImport.objects.filter(checksum=checksum).order_by('-pk').first()
+        if job is None or options['restart']:
+            job = ProviderImport.objects.create(source=path, checksum=checksum, owner=owner)
+        elif job.status == ProviderImport.DONE:
+            raise CommandError(f"{path} was already imported (import #{job.pk}); use --restart to import it again.")
+        elif not ProviderImport.objects.claimable().filter(pk=job.pk).exists():
+            raise CommandError(f"Import #{job.pk} of {path} is already running.")
+        else:
+            self.stdout.write(f"Resuming import #{job.pk} after {job.rows_done} rows.")
+            job.source = path
+            job.owner = owner or job.owner
+            # updated_at heartbeat اجرای قبلی است و نباید اینجا جلو برود
+            job.save(update_fields=['source', 'owner'])
+
+        try:
+            if run_import(job, options['chunk_size']) is None:
+                raise CommandError(f"Import #{job.pk} of {path} is already running.")
+        except ImportFileError as exc:
+            raise CommandError(str(exc))
+        for error in job.errors:
+            messages = '; '.join(f"{column}: {message}" for column, message in error['errors'].items())
+            self.stdout.write(f"row {error['row']}: {messages}")
+        if job.error_count > len(job.errors):
+            self.stdout.write(f"... {job.error_count - len(job.errors)} more rows with errors.")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {job.created_count} service providers, {job.error_count} rows with errors (import #{job.pk})."))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from service_provider.services import rebuild_availability
+
+
+class Command(BaseCommand):
+    help = "Rebuild the weekly availability index (weekly_hours and SPOpenInterval) from SPWorkTime."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sp-id', type=int, action='append', dest='sp_ids',
+                            help="Only rebuild the given Service Provider (repeatable).")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            count = rebuild_availability(options['sp_ids'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt availability for {count} service providers."))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from service_provider.facets import facet_index
+from service_provider.search import search_index
+
+INDEXES = {'search': search_index, 'facets': facet_index}
+
+
+class Command(BaseCommand):
+    help = "Rebuild the in-memory search and facet indexes and make every worker reload them."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--index', choices=sorted(INDEXES), action='append', dest='indexes',
+                            help="Only rebuild the given index (repeatable). Defaults to all.")
+
+    def handle(self, *args, **options):
+        for name in options['indexes'] or sorted(INDEXES):
+            index = INDEXES[name]
+            index.invalidate()
+            index.rebuild()
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt the {name} index."))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from service_provider.models import ServiceProvider
+from service_provider.services import rebuild_rate_aggregates
+
+
+class Command(BaseCommand):
+    help = "Recompute rate_sum, rate_count and the 1-5 histogram of every Service Provider from SPRate."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sp-id', type=int, action='append', dest='sp_ids',
+                            help="Only rebuild the given Service Provider (repeatable).")
+
+    def handle(self, *args, **options):
+        queryset = ServiceProvider.objects.all()
+        if options['sp_ids']:
+            queryset = queryset.filter(pk__in=options['sp_ids'])
+        with transaction.atomic():
+            count = rebuild_rate_aggregates(queryset)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rate aggregates for {count} service providers."))
@@ -0,0 +1,66 @@
+# Generated by Django 5.0.7 on 2026-10-18 12:12
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def backfill_rate_aggregates(apps, schema_editor):
+    ServiceProvider = apps.get_model('service_provider', 'ServiceProvider')
+    SPRate = apps.get_model('service_provider', 'SPRate')
+    rows = SPRate.objects.values('SP_id').annotate(
+        total=Sum('score'),
+        count=Count('id'),
+        **{f'count_{score}': Count('id', filter=Q(score=score)) for score in range(1, 6)}
+    )
+    for row in rows:
+        ServiceProvider.objects.filter(pk=row['SP_id']).update(
+            rate_sum=row['total'] or 0,
+            rate_count=row['count'],
+            **{f'rate_{score}_count': row[f'count_{score}'] for score in range(1, 6)}
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service_provider', '0004_alter_spgifts_options_rename_amout_spgifts_amount'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='serviceprovider',
+            name='rate_1_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='serviceprovider',
+            name='rate_2_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='serviceprovider',
+            name='rate_3_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='serviceprovider',
+            name='rate_4_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='serviceprovider',
+            name='rate_5_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='serviceprovider',
+            name='rate_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='serviceprovider',
+            name='rate_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_rate_aggregates, migrations.RunPython.noop),
+    ]
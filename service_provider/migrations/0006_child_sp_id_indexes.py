@@ -0,0 +1,39 @@
+# Generated by Django 5.0.7 on 2026-10-18 12:14
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service_provider', '0005_serviceprovider_rate_aggregates'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='spexpert',
+            index=models.Index(fields=['SP', 'id'], name='spexpert_sp_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='spimages',
+            index=models.Index(fields=['SP', 'id'], name='spimages_sp_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sprate',
+            index=models.Index(fields=['SP', 'id'], name='sprate_sp_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='spreview',
+            index=models.Index(fields=['SP', 'id'], name='spreview_sp_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sptag',
+            index=models.Index(fields=['SP', 'id'], name='sptag_sp_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='spworktime',
+            index=models.Index(fields=['SP', 'id'], name='spworktime_sp_id_idx'),
+        ),
+    ]
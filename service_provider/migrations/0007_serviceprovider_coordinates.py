@@ -0,0 +1,78 @@
+# Generated by Django 5.0.7 on 2026-10-18 12:15
+
+import re
+from django.db import migrations, models
+
+# نسخه‌ی ثابت service_provider.geo در زمان این migration
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+_LOCATION_RE = re.compile(r'^\s*([-+]?\d+(?:\.\d+)?)\s*[,\s]\s*([-+]?\d+(?:\.\d+)?)\s*$')
+
+
+def parse_location(text):
+    match = _LOCATION_RE.match(text or '')
+    if not match:
+        return None, None
+    lat, lon = float(match.group(1)), float(match.group(2))
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None, None
+    return lat, lon
+
+
+def geohash_encode(lat, lon, precision=9):
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, bit_count, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, value = (lon_range, lon) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            rng[0] = mid
+        else:
+            bits <<= 1
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits, bit_count = 0, 0
+    return ''.join(chars)
+
+
+def backfill_coordinates(apps, schema_editor):
+    ServiceProvider = apps.get_model('service_provider', 'ServiceProvider')
+    batch = []
+    for sp in ServiceProvider.objects.only('id', 'location').iterator(chunk_size=2000):
+        sp.latitude, sp.longitude = parse_location(sp.location)
+        sp.geohash = geohash_encode(sp.latitude, sp.longitude) if sp.latitude is not None else None
+        batch.append(sp)
+        if len(batch) >= 2000:
+            ServiceProvider.objects.bulk_update(batch, ['latitude', 'longitude', 'geohash'])
+            batch = []
+    if batch:
+        ServiceProvider.objects.bulk_update(batch, ['latitude', 'longitude', 'geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service_provider', '0006_child_sp_id_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='serviceprovider',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='serviceprovider',
+            name='latitude',
+            field=models.FloatField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='serviceprovider',
+            name='longitude',
+            field=models.FloatField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_coordinates, migrations.RunPython.noop),
+    ]
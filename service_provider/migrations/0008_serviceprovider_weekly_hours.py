@@ -0,0 +1,82 @@
+# Generated by Django 5.0.7 on 2026-10-18 12:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# نسخه‌ی ثابت service_provider.availability در زمان این migration
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+WEEKDAY_INDEX = {
+    'monday': 0, 'tuesday': 1, 'wednesday': 2, 'thursday': 3, 'friday': 4, 'saturday': 5, 'sunday': 6,
+    'دوشنبه': 0, 'سهشنبه': 1, 'چهارشنبه': 2, 'پنجشنبه': 3, 'جمعه': 4, 'شنبه': 5, 'یکشنبه': 6,
+}
+
+
+def build_intervals(work_times):
+    raw = []
+    for weekday_name, time_start, time_end in work_times:
+        day = WEEKDAY_INDEX.get((weekday_name or '').strip().lower().replace('\u200c', '').replace(' ', ''))
+        if day is None:
+            continue
+        start = day * MINUTES_PER_DAY + time_start.hour * 60 + time_start.minute
+        end = day * MINUTES_PER_DAY + time_end.hour * 60 + time_end.minute
+        if end <= start:
+            end += MINUTES_PER_DAY
+        if end > MINUTES_PER_WEEK:
+            raw.append([start, MINUTES_PER_WEEK])
+            raw.append([0, end - MINUTES_PER_WEEK])
+        else:
+            raw.append([start, end])
+
+    merged = []
+    for start, end in sorted(raw):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def backfill_availability(apps, schema_editor):
+    ServiceProvider = apps.get_model('service_provider', 'ServiceProvider')
+    SPWorkTime = apps.get_model('service_provider', 'SPWorkTime')
+    SPOpenInterval = apps.get_model('service_provider', 'SPOpenInterval')
+    work_times = {}
+    rows = SPWorkTime.objects.filter(is_active=True).values_list('SP_id', 'weekday__name', 'time_start', 'time_end')
+    for sp_id, weekday_name, time_start, time_end in rows:
+        work_times.setdefault(sp_id, []).append((weekday_name, time_start, time_end))
+    for sp_id, items in work_times.items():
+        intervals = build_intervals(items)
+        ServiceProvider.objects.filter(pk=sp_id).update(weekly_hours=intervals)
+        SPOpenInterval.objects.bulk_create(
+            SPOpenInterval(SP_id=sp_id, start_minute=start, end_minute=end) for start, end in intervals)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service_provider', '0007_serviceprovider_coordinates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='serviceprovider',
+            name='weekly_hours',
+            field=models.JSONField(default=list, editable=False),
+        ),
+        migrations.CreateModel(
+            name='SPOpenInterval',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_minute', models.PositiveSmallIntegerField()),
+                ('end_minute', models.PositiveSmallIntegerField()),
+                ('SP', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='open_intervals', to='service_provider.serviceprovider')),
+            ],
+            options={
+                'verbose_name': 'Service Provider Open Interval',
+                'verbose_name_plural': 'Service Provider Open Intervals',
+                'indexes': [models.Index(fields=['start_minute', 'end_minute'], name='spopeninterval_minute_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_availability, migrations.RunPython.noop),
+    ]
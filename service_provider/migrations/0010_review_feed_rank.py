@@ -0,0 +1,55 @@
+# Generated by Django 5.0.7 on 2026-10-18 12:28
+
+from datetime import datetime, timedelta, timezone
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+# نسخه‌ی ثابت service_provider.models.review_feed_rank در زمان این migration
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+RATED_RANK = 1 << 52
+
+
+def review_feed_rank(created_at, rated):
+    return (created_at - EPOCH) // timedelta(microseconds=1) + (RATED_RANK if rated else 0)
+
+
+def backfill_feed_rank(apps, schema_editor):
+    SPRate = apps.get_model('service_provider', 'SPRate')
+    SPReview = apps.get_model('service_provider', 'SPReview')
+    rated = set(SPRate.objects.exclude(user=None).values_list('SP_id', 'user_id').iterator(chunk_size=5000))
+    batch = []
+    for review in SPReview.objects.only('id', 'SP', 'user', 'created_at').iterator(chunk_size=2000):
+        review.feed_rank = review_feed_rank(review.created_at, (review.SP_id, review.user_id) in rated)
+        batch.append(review)
+        if len(batch) >= 2000:
+            SPReview.objects.bulk_update(batch, ['feed_rank'])
+            batch = []
+    if batch:
+        SPReview.objects.bulk_update(batch, ['feed_rank'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service_provider', '0009_version_and_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='spreview',
+            name='feed_rank',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='spreview',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='spreview',
+            index=models.Index(fields=['SP', 'is_active', '-feed_rank'], name='spreview_feed_idx'),
+        ),
+        migrations.RunPython(backfill_feed_rank, migrations.RunPython.noop),
+    ]
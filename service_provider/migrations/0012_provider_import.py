@@ -0,0 +1,36 @@
+# Generated by Django 5.0.7 on 2026-10-18 12:54
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service_provider', '0011_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProviderImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file', models.FileField(blank=True, upload_to='imports/', validators=[django.core.validators.FileExtensionValidator(['csv', 'xlsx'])])),
+                ('source', models.CharField(blank=True, editable=False, max_length=500)),
+                ('checksum', models.CharField(blank=True, db_index=True, editable=False, max_length=64)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('failed', 'Failed'), ('done', 'Done')], default='pending', editable=False, max_length=10)),
+                ('rows_done', models.PositiveIntegerField(default=0, editable=False)),
+                ('created_count', models.PositiveIntegerField(default=0, editable=False)),
+                ('error_count', models.PositiveIntegerField(default=0, editable=False)),
+                ('errors', models.JSONField(blank=True, default=list, editable=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('owner', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='service_provider.spowner')),
+            ],
+            options={
+                'verbose_name': 'Provider Import',
+                'verbose_name_plural': 'Provider Imports',
+            },
+        ),
+    ]
@@ -1,11 +1,20 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
 from django.db import models
 from django.db import models
 from django.conf import settings
+from django.core.validators import FileExtensionValidator
+from django.utils import timezone
+from django.utils.functional import cached_property
+from .fieldsets import ALL_FIELDS
+from .geo import geohash_encode, parse_location
 
 
 class SPCategory(models.Model):
     name = models.CharField(max_length=255, unique=True, verbose_name="Category Name")
     icon = models.ImageField(upload_to='SPCategory_icons/', blank=True, null=True)
+    # نسخه‌های کوچک‌شده‌ی icon؛ در پس‌زمینه ساخته می‌شود (service_provider.images)
+    icon_variants = models.JSONField(default=dict, blank=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name = "Service Provider Category"
@@ -62,6 +71,7 @@ class SPWorkTime(models.Model):
     class Meta:
         verbose_name = "Service Provider Work Time"
         verbose_name_plural = "Service Provider Work Times"
+        indexes = [models.Index(fields=['SP', 'id'], name='spworktime_sp_id_idx')]
 
     def __str__(self):
         return f"{self.SP.name} - {self.weekday.name}: {self.time_start} to {self.time_end}"
@@ -87,6 +97,7 @@ class SPTag(models.Model):
         verbose_name = "Service Provider Tag"
         verbose_name_plural = "Service Provider Tags"
         unique_together = ('SP', 'key', 'value')  # جلوگیری از تکراری بودن
+        indexes = [models.Index(fields=['SP', 'id'], name='sptag_sp_id_idx')]
 
     def __str__(self):
         return f"{self.SP.name} - {self.key.name}: {self.value}"
@@ -108,14 +119,94 @@ class Car(models.Model):
         return f"{self.brand} {self.model} ({self.tag})"
 
 
+class ServiceProviderQuerySet(models.QuerySet):
+    def open_at(self, minute):
+        """
+        ServiceProviderهایی که در دقیقه‌ی داده شده از هفته باز هستند
+        """
+        return self.filter(models.Exists(SPOpenInterval.objects.filter(
+            SP=models.OuterRef('pk'), start_minute__lte=minute, end_minute__gt=minute)))
+
+    def for_list(self):
+        """
+        داده‌های لازم برای ServiceProviderShortSerializer
+        """
+        return self.select_related('category').prefetch_related(
+            models.Prefetch('tags', queryset=SPTag.objects.select_related('key').order_by('id')),
+        )
+
+    def for_detail(self, selection=ALL_FIELDS):
+        """
+        داده‌های لازم برای ServiceProviderSerializer با تعداد کوئری ثابت
+        رابطه‌هایی که در selection نیستند خوانده نمی‌شوند و رابطه‌های باز نشده فقط شناسه می‌خوانند
+        """
+        related = [
+            path for name, path in (('category', 'category'), ('address', 'address__city'), ('owner', 'owner__user'))
+            if selection.includes(name) and selection.expanded(name)
+        ]
+        prefetches = []
+
+        def prefetch(name, full, light_fields):
+            if full is None:
+                return
+            queryset = full if selection.expanded(name) else full.model.objects.only('id', *light_fields)
+            prefetches.append(models.Prefetch(name, queryset=queryset))
+
+        if selection.includes('work_times'):
+            prefetch('work_times', SPWorkTime.objects.select_related('weekday'), ['SP'])
+        if selection.includes('tags'):
+            prefetch('tags', SPTag.objects.select_related('key'), ['SP'])
+        if selection.includes('images'):
+            prefetch('images', SPImages.objects.all(), ['SP'])
+        if selection.includes('expertises'):
+            prefetch('expertises', SPExpert.objects.select_related('expert'), ['SP'])
+        full_reviews = False
+        if selection.includes('reviews') or selection.includes('user_review'):
+            full_reviews = any(selection.includes(name) and selection.expanded(name) for name in ('reviews', 'user_review'))
+            reviews = SPReview.objects.feed()
+            reviews = reviews.select_related('user__details') if full_reviews else reviews.only('id', 'SP', 'feed_rank')
+            prefetches.append(models.Prefetch(
+                'reviews', queryset=reviews[:review_feed_page_size() + 1], to_attr='review_page'))
+        # امتیاز نویسنده‌ی هر نظر هم از rates خوانده می‌شود
+        if selection.includes('rates') or selection.includes('user_rate') or full_reviews:
+            full = selection.includes('rates') and selection.expanded('rates')
+            prefetches.append(models.Prefetch('rates', queryset=(
+                SPRate.objects.select_related('user') if full
+                else SPRate.objects.only('id', 'SP', 'user', 'score')
+            ).order_by('id')))
+        return self.select_related(*related).prefetch_related(*prefetches)
+
+
 class ServiceProvider(models.Model):
     name = models.CharField(max_length=255)
     logo_image = models.ImageField(upload_to='SP_logos/')
     main_image = models.ImageField(upload_to='SP_main_images/', blank=True, null=True)
+    # نسخه‌های کوچک‌شده‌ی تصویرها؛ در پس‌زمینه ساخته می‌شوند (service_provider.images)
+    logo_variants = models.JSONField(default=dict, blank=True, editable=False)
+    main_image_variants = models.JSONField(default=dict, blank=True, editable=False)
     owner = models.ForeignKey('SPOwner', on_delete=models.CASCADE)
     address = models.ForeignKey(Address, on_delete=models.SET_NULL, null=True)
     category = models.ForeignKey(SPCategory, on_delete=models.SET_NULL, null=True)
     location = models.CharField(max_length=255)
+    # مختصات عددی استخراج‌شده از location؛ در save به‌روز می‌شود
+    latitude = models.FloatField(null=True, blank=True, editable=False, db_index=True)
+    longitude = models.FloatField(null=True, blank=True, editable=False, db_index=True)
+    geohash = models.CharField(max_length=12, null=True, blank=True, editable=False, db_index=True)
+    # بازه‌های کاری هفتگی [start, end) بر حسب دقیقه از دوشنبه ۰۰:۰۰؛ از روی SPWorkTime ساخته می‌شود
+    weekly_hours = models.JSONField(default=list, editable=False)
+    # خلاصه‌ی امتیازها؛ با سیگنال‌های SPRate به‌روز می‌شود (rebuild_rate_aggregates)
+    rate_sum = models.PositiveIntegerField(default=0, editable=False)
+    rate_count = models.PositiveIntegerField(default=0, editable=False)
+    rate_1_count = models.PositiveIntegerField(default=0, editable=False)
+    rate_2_count = models.PositiveIntegerField(default=0, editable=False)
+    rate_3_count = models.PositiveIntegerField(default=0, editable=False)
+    rate_4_count = models.PositiveIntegerField(default=0, editable=False)
+    rate_5_count = models.PositiveIntegerField(default=0, editable=False)
+    # نسخه‌ی ردیف؛ با هر تغییر در جدول‌های فرزند (touch_providers) افزایش می‌یابد و در ETag استفاده می‌شود
+    version = models.PositiveIntegerField(default=1, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ServiceProviderQuerySet.as_manager()
 
     class Meta:
         verbose_name = "Service Provider"
@@ -124,14 +215,67 @@ class ServiceProvider(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        self.latitude, self.longitude = parse_location(self.location)
+        self.geohash = geohash_encode(self.latitude, self.longitude) if self.latitude is not None else None
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'location' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'latitude', 'longitude', 'geohash'}
+        super().save(*args, **kwargs)
+
+    @property
+    def average_rating(self):
+        if self.rate_count:
+            return self.rate_sum / self.rate_count
+        return None
+
+    @property
+    def rate_histogram(self):
+        return {score: getattr(self, f'rate_{score}_count') for score in range(1, 6)}
+
+    @cached_property
+    def review_page(self):
+        """
+        صفحه‌ی اول فید نظرات به همراه یک ردیف اضافه برای تشخیص صفحه‌ی بعد
+        for_detail آن را با یک prefetch برای همه‌ی ServiceProviderها می‌خواند
+        """
+        return list(self.reviews.feed().select_related('user__details')[:review_feed_page_size() + 1])
+
+    @property
+    def first_reviews(self):
+        return self.review_page[:review_feed_page_size()]
+
+    @property
+    def has_more_reviews(self):
+        return len(self.review_page) > review_feed_page_size()
+
+
+class SPOpenInterval(models.Model):
+    """
+    ایندکس بازه‌های باز بودن برای فیلتر open_now/open_at
+    """
+    SP = models.ForeignKey(ServiceProvider, on_delete=models.CASCADE, related_name='open_intervals')
+    start_minute = models.PositiveSmallIntegerField()
+    end_minute = models.PositiveSmallIntegerField()
+
+    class Meta:
+        verbose_name = "Service Provider Open Interval"
+        verbose_name_plural = "Service Provider Open Intervals"
+        indexes = [models.Index(fields=['start_minute', 'end_minute'], name='spopeninterval_minute_idx')]
+
+    def __str__(self):
+        return f"{self.SP_id}: {self.start_minute}-{self.end_minute}"
+
 
 class SPImages(models.Model):
     SP = models.ForeignKey(ServiceProvider, on_delete=models.CASCADE, related_name='images')
     image = models.ImageField(upload_to='SP_images/')
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
 
     class Meta:
         verbose_name = "Service Provider Image"
         verbose_name_plural = "Service Provider Images"
+        indexes = [models.Index(fields=['SP', 'id'], name='spimages_sp_id_idx')]
 
     def __str__(self):
         return f"Image for {self.SP.name}"
@@ -148,21 +292,67 @@ class SPOwner(models.Model):
         return self.user.username
 
 
+# نظرهای نویسنده‌هایی که امتیاز داده‌اند همیشه بالاتر از بقیه قرار می‌گیرند
+RATED_RANK = 1 << 52
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def review_feed_rank(created_at, rated):
+    """
+    کلید مرتب‌سازی فید نظرات: اول نظرهای دارای امتیاز، بعد جدیدترها
+    """
+    return (created_at - EPOCH) // timedelta(microseconds=1) + (RATED_RANK if rated else 0)
+
+
+def review_feed_page_size():
+    return getattr(settings, 'REVIEW_FEED_PAGE_SIZE', 10)
+
+
+class SPReviewQuerySet(models.QuerySet):
+    def feed(self):
+        """
+        نظرهای فعال به ترتیب فید؛ با ایندکس spreview_feed_idx خوانده می‌شود
+        """
+        return self.filter(is_active=True).order_by('-feed_rank', '-id')
+
+
 class SPReview(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     SP = models.ForeignKey(ServiceProvider, on_delete=models.CASCADE, related_name='reviews')
     title = models.CharField(max_length=255)
     description = models.TextField()
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
     is_active = models.BooleanField(default=True)
+    feed_rank = models.BigIntegerField(default=0, editable=False)
+
+    objects = SPReviewQuerySet.as_manager()
 
     class Meta:
         verbose_name = "Service Provider Review"
         verbose_name_plural = "Service Provider Reviews"
+        indexes = [
+            models.Index(fields=['SP', 'id'], name='spreview_sp_id_idx'),
+            models.Index(fields=['SP', 'is_active', '-feed_rank'], name='spreview_feed_idx'),
+        ]
 
     def __str__(self):
         return f"Review by {self.user.username} for {self.SP.name}"
 
+    @property
+    def is_rated(self):
+        return self.feed_rank >= RATED_RANK
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            rated = SPRate.objects.filter(SP_id=self.SP_id, user_id=self.user_id).exists()
+        else:
+            rated = self.is_rated
+        self.feed_rank = review_feed_rank(self.created_at, rated)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'created_at' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'feed_rank'}
+        super().save(*args, **kwargs)
+
 
 class SPRate(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True)
@@ -172,15 +362,26 @@ class SPRate(models.Model):
     class Meta:
         verbose_name = "Service Provider Rating"
         verbose_name_plural = "Service Provider Ratings"
+        indexes = [models.Index(fields=['SP', 'id'], name='sprate_sp_id_idx')]
 
     def __str__(self):
         return f"{self.score} for {self.SP.name}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # مقدار ذخیره‌شده برای اصلاح خلاصه‌ی امتیاز هنگام ویرایش لازم است
+        if 'SP_id' in field_names and 'score' in field_names:
+            instance._loaded_rate = (instance.SP_id, instance.score)
+        return instance
+
 
 class Expert(models.Model):
     name = models.CharField(max_length=255)
     spcategory=models.ForeignKey(SPCategory,on_delete=models.CASCADE,related_name='expertise',null=True)
     icon = models.ImageField(upload_to='expert_icons/', blank=True, null=True)
+    icon_variants = models.JSONField(default=dict, blank=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name = "Expert"
@@ -198,6 +399,7 @@ class SPExpert(models.Model):
     class Meta:
         verbose_name = "Service Provider Expertise"
         verbose_name_plural = "Service Provider Expertises"
+        indexes = [models.Index(fields=['SP', 'id'], name='spexpert_sp_id_idx')]
 
     def __str__(self):
         return f"{self.SP.name} - {self.expert.name}"
@@ -232,6 +434,56 @@ class SPGifts(models.Model):
         return f"{self.sp_id.name} - {self.gift_id.name}"
 
 
+class ProviderImportQuerySet(models.QuerySet):
+    def claimable(self):
+        """
+        jobهایی که می‌شود اجرا کرد: PENDING، FAILED یا RUNNING بدون پیشرفت در PROVIDER_IMPORT_STALE_AFTER (worker ازکارافتاده)
+        """
+        stale = timezone.now() - settings.PROVIDER_IMPORT_STALE_AFTER
+        return self.filter(
+            models.Q(status__in=[ProviderImport.PENDING, ProviderImport.FAILED])
+            | models.Q(status=ProviderImport.RUNNING, updated_at__lt=stale)
+        )
+
+
+class ProviderImport(models.Model):
+    """
+    یک فایل CSV/XLSX برای ورود دسته‌ای ServiceProviderها (service_provider.imports)
+    پیشرفت در transaction هر chunk ذخیره می‌شود و اجرای دوباره از اولین ردیف واردنشده ادامه می‌دهد.
+    """
+    PENDING, RUNNING, FAILED, DONE = 'pending', 'running', 'failed', 'done'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (RUNNING, 'Running'), (FAILED, 'Failed'), (DONE, 'Done')]
+
+    file = models.FileField(upload_to='imports/', blank=True, validators=[FileExtensionValidator(['csv', 'xlsx'])])
+    # مسیر فایل روی سرور برای import_providers؛ فایل آپلودشده در admin در file است
+    source = models.CharField(max_length=500, blank=True, editable=False)
+    checksum = models.CharField(max_length=64, blank=True, db_index=True, editable=False)
+    # مالک ردیف‌هایی که ستون owner ندارند
+    owner = models.ForeignKey('SPOwner', on_delete=models.SET_NULL, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING, editable=False)
+    rows_done = models.PositiveIntegerField(default=0, editable=False)
+    created_count = models.PositiveIntegerField(default=0, editable=False)
+    error_count = models.PositiveIntegerField(default=0, editable=False)
+    # خطای ردیف‌ها [{'row': شماره‌ی ردیف در فایل، 'errors': {ستون: پیام}}]؛ حداکثر PROVIDER_IMPORT_MAX_ERRORS
+    errors = models.JSONField(default=list, blank=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # heartbeat؛ با ذخیره‌ی هر chunk به‌روز می‌شود
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ProviderImportQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Provider Import"
+        verbose_name_plural = "Provider Imports"
+
+    def __str__(self):
+        return f"Import #{self.pk} ({self.name})"
+
+    @property
+    def name(self):
+        return self.source or self.file.name
+
+
 # class GaragePriceRange(models.Model):
 #     price_start = models.DecimalField(max_digits=10, decimal_places=2)
 #     price_end = models.DecimalField(max_digits=10, decimal_places=2)
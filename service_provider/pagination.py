@@ -0,0 +1,30 @@
+from cara.pagination import KeysetPagination
+from .models import review_feed_page_size
+
+
+class ReviewFeedPagination(KeysetPagination):
+    """
+    صفحه‌بندی فید نظرات روی feed_rank (اول نظرهای دارای امتیاز، بعد جدیدترها)
+    feed_rank یکتا نیست؛ id ترتیب نظرهای هم‌رتبه را ثابت می‌کند (SPReviewQuerySet.feed)
+    """
+    ordering = ('-feed_rank', '-id')
+
+    def get_page_size(self, request):
+        self.page_size = review_feed_page_size()
+        return super().get_page_size(request)
+
+    def first_page_next_link(self, url, rows):
+        """
+        لینک صفحه‌ی دوم برای صفحه‌ی اولی که بیرون از paginator خوانده شده (ServiceProvider.review_page)
+        rows یک ردیف بیشتر از اندازه‌ی صفحه دارد اگر صفحه‌ی بعدی وجود داشته باشد
+        """
+        self.page_size = review_feed_page_size()
+        if len(rows) <= self.page_size:
+            return None
+        self.base_url = url
+        self.ordering = self.get_ordering(None, None, None)
+        self.page = rows[:self.page_size]
+        self.cursor = None
+        self.has_next, self.has_previous = True, False
+        self.next_position = self._get_position_from_instance(rows[self.page_size], self.ordering)
+        return self.get_next_link()
@@ -185,7 +185,7 @@ def create_fake_spgift(service_provider):
     SPGifts.objects.create(
         sp_id=service_provider,
         gift_id=gift,
-        amout=random.uniform(10, 500)  # مقدار عددی تصادفی
+        amount=random.uniform(10, 500)  # مقدار عددی تصادفی
     )
 # Main function for creating fake data
 def run():
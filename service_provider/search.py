@@ -0,0 +1,146 @@
+import heapq
+import re
+import unicodedata
+from bisect import bisect_left, insort
+from collections import defaultdict
+from rapidfuzz import fuzz, process
+from .indexes import InMemoryIndex
+from .models import ServiceProvider, SPCarExpert, SPExpert, SPTag
+
+# وزن هر منبع در امتیاز نهایی
+NAME_WEIGHT = 3.0
+RELATED_WEIGHT = 2.0
+ADDRESS_WEIGHT = 1.0
+
+PREFIX_FACTOR = 0.9
+FUZZY_FACTOR = 0.8
+FUZZY_CUTOFF = 75
+FUZZY_LIMIT = 5
+
+_CHARACTER_MAP = str.maketrans({
+    'ي': 'ی', 'ى': 'ی', 'ئ': 'ی', 'ك': 'ک', 'ة': 'ه', 'ۀ': 'ه', 'ؤ': 'و',
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    '\u200c': ' ',  # نیم‌فاصله
+    '\u0640': None,  # کشیده
+    **{chr(0x06F0 + digit): str(digit) for digit in range(10)},
+    **{chr(0x0660 + digit): str(digit) for digit in range(10)},
+})
+_DIACRITICS_RE = re.compile('[\u064B-\u065F\u0670]')
+_TOKEN_RE = re.compile(r'\w+')
+
+
+def normalize(text):
+    """
+    یکسان‌سازی حروف عربی/فارسی، ارقام و حروف لاتین برای جستجو
+    """
+    text = unicodedata.normalize('NFKC', text or '').translate(_CHARACTER_MAP)
+    return _DIACRITICS_RE.sub('', text).lower()
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall(normalize(text))
+
+
+class SearchIndex(InMemoryIndex):
+    """
+    ایندکس معکوس token -> {sp_id: weight} روی نام، تگ‌ها، تخصص‌ها، خودروها و آدرس
+    """
+    name = 'search'
+
+    def clear(self):
+        self.postings = defaultdict(dict)
+        self.documents = {}
+        self.vocabulary = []
+        self.by_length = defaultdict(list)
+
+    def _add(self, sp_id, text, weight):
+        tokens = self.documents.setdefault(sp_id, set())
+        for token in tokenize(text):
+            posting = self.postings[token]
+            if not posting:
+                insort(self.vocabulary, token)
+                self.by_length[len(token)].append(token)
+            posting[sp_id] = max(posting.get(sp_id, 0), weight)
+            tokens.add(token)
+
+    def remove(self, sp_ids):
+        for sp_id in sp_ids:
+            for token in self.documents.pop(sp_id, ()):
+                posting = self.postings.get(token)
+                if posting is None:
+                    continue
+                posting.pop(sp_id, None)
+                if not posting:
+                    del self.postings[token]
+                    self.vocabulary.pop(bisect_left(self.vocabulary, token))
+                    self.by_length[len(token)].remove(token)
+
+    def load(self, sp_ids=None):
+        providers = ServiceProvider.objects.all()
+        tags = SPTag.objects.all()
+        experts = SPExpert.objects.filter(is_active=True)
+        cars = SPCarExpert.objects.all()
+        if sp_ids is not None:
+            providers = providers.filter(pk__in=sp_ids)
+            tags = tags.filter(SP_id__in=sp_ids)
+            experts = experts.filter(SP_id__in=sp_ids)
+            cars = cars.filter(SP_id__in=sp_ids)
+
+        rows = providers.values_list('id', 'name', 'address__district', 'address__neighbourhood')
+        for sp_id, name, district, neighbourhood in rows.iterator(chunk_size=5000):
+            self._add(sp_id, name, NAME_WEIGHT)
+            self._add(sp_id, f"{district or ''} {neighbourhood or ''}", ADDRESS_WEIGHT)
+        # ردیف‌های فرزند فقط برای ServiceProviderهایی که بالا خوانده شدند معتبرند
+        for sp_id, value in tags.values_list('SP_id', 'value').iterator(chunk_size=5000):
+            if sp_id in self.documents:
+                self._add(sp_id, value, RELATED_WEIGHT)
+        for sp_id, name in experts.values_list('SP_id', 'expert__name').iterator(chunk_size=5000):
+            if sp_id in self.documents:
+                self._add(sp_id, name, RELATED_WEIGHT)
+        for sp_id, brand, model in cars.values_list('SP_id', 'car__brand', 'car__model').iterator(chunk_size=5000):
+            if sp_id in self.documents:
+                self._add(sp_id, f"{brand} {model}", RELATED_WEIGHT)
+
+    def _expand(self, token):
+        """
+        tokenهای ایندکس که با token مطابقت دارند: دقیق، پیشوندی و با خطای تایپی
+        """
+        matches = {}
+        if token in self.postings:
+            matches[token] = 1.0
+        position = bisect_left(self.vocabulary, token)
+        while position < len(self.vocabulary) and self.vocabulary[position].startswith(token):
+            matches.setdefault(self.vocabulary[position], PREFIX_FACTOR)
+            position += 1
+        if token in matches or len(token) < 3:
+            return matches
+        candidates = [
+            candidate
+            for length in range(len(token) - 2, len(token) + 3)
+            for candidate in self.by_length.get(length, ())
+        ]
+        for candidate, score, _ in process.extract(
+                token, candidates, scorer=fuzz.ratio, score_cutoff=FUZZY_CUTOFF, limit=FUZZY_LIMIT):
+            matches.setdefault(candidate, FUZZY_FACTOR * score / 100)
+        return matches
+
+    def search(self, query, limit=20):
+        """
+        [(sp_id, score), ...] مرتب بر اساس امتیاز
+        """
+        self.ensure_ready()
+        scores = defaultdict(float)
+        with self.lock:
+            for token in dict.fromkeys(tokenize(query)):
+                best = {}
+                for matched, factor in self._expand(token).items():
+                    for sp_id, weight in self.postings[matched].items():
+                        value = weight * factor
+                        if value > best.get(sp_id, 0):
+                            best[sp_id] = value
+                for sp_id, value in best.items():
+                    scores[sp_id] += value
+        return heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -item[0]))
+
+
+search_index = SearchIndex()
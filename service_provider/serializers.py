@@ -1,14 +1,33 @@
+from collections import defaultdict
 from rest_framework import serializers
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.encoding import filepath_to_uri
+from .availability import is_open, minute_of_week, next_opening
+from .fastpath import RowField, RowSerializer
+from .images import srcset, variant_items
+from .pagination import ReviewFeedPagination
 from .models import (
     SPCategory, City, Address, Weekday, SPWorkTime, TagKey, SPTag, CarCategory, Car,
     ServiceProvider, SPImages, SPOwner, SPReview, SPRate, Expert, SPExpert, SPCarExpert
 )
-from django.db.models import Exists, OuterRef
+
+class SrcsetField(serializers.ReadOnlyField):
+    """
+    نسخه‌های کوچک‌شده‌ی یک تصویر به شکل {'64w': url, ...}؛ source ستون *_variants است
+    """
+
+    def to_representation(self, value):
+        return srcset(value, self.context.get('request'))
+
 
 class SPCategorySerializer(serializers.ModelSerializer):
+    icon_srcset = SrcsetField(source='icon_variants')
+
     class Meta:
         model = SPCategory
-        fields = '__all__'
+        exclude = ['icon_variants']
 
 
 class AddressSerializer(serializers.ModelSerializer):
@@ -40,9 +59,11 @@ class SPTagSerializer(serializers.ModelSerializer):
 
 
 class SPImagesSerializer(serializers.ModelSerializer):
+    image_srcset = SrcsetField(source='image_variants')
+
     class Meta:
         model = SPImages
-        fields = ['image']
+        fields = ['image', 'image_srcset']
 
 
 class SPOwnerSerializer(serializers.ModelSerializer):
@@ -69,6 +90,21 @@ class SPReviewSerializer(serializers.ModelSerializer):
         return "Unknown User"  # در صورت عدم وجود UserDetail
 
 
+class SPReviewFeedSerializer(SPReviewSerializer):
+    """
+    یک ردیف از فید نظرات به همراه امتیاز نویسنده
+    امتیازها از context['review_scores'] ({user_id: score}) خوانده می‌شوند تا برای هر ردیف کوئری نزند
+    """
+    is_rated = serializers.BooleanField(read_only=True)
+    score = serializers.SerializerMethodField()
+
+    class Meta(SPReviewSerializer.Meta):
+        fields = ['id'] + SPReviewSerializer.Meta.fields + ['is_rated', 'score']
+
+    def get_score(self, obj):
+        return self.context.get('review_scores', {}).get(obj.user_id)
+
+
 class SPRateSerializer(serializers.ModelSerializer):
     username = serializers.CharField(source='user.username', read_only=True)
 
@@ -78,9 +114,11 @@ class SPRateSerializer(serializers.ModelSerializer):
 
 
 class ExpertSerializer(serializers.ModelSerializer):
+    icon_srcset = SrcsetField(source='icon_variants')
+
     class Meta:
         model = Expert
-        fields = ['name', 'icon']
+        fields = ['name', 'icon', 'icon_srcset']
 
 
 class SPExpertSerializer(serializers.ModelSerializer):
@@ -90,18 +128,71 @@ class SPExpertSerializer(serializers.ModelSerializer):
         model = SPExpert
         fields = ['expert', 'is_active']
 
-class ServiceProviderSerializer(serializers.ModelSerializer):
+
+# آیتم‌های نوشتن دسته‌ای (service_provider.bulk)؛ کلیدهای خارجی به صورت id خوانده و یک‌جا بررسی می‌شوند
+class SPWorkTimeBulkItemSerializer(serializers.Serializer):
+    id = serializers.IntegerField(required=False)
+    weekday = serializers.IntegerField()
+    time_start = serializers.TimeField()
+    time_end = serializers.TimeField()
+    is_active = serializers.BooleanField(default=True)
+
+
+class SPTagBulkItemSerializer(serializers.Serializer):
+    key_name = serializers.CharField(max_length=100)
+    value = serializers.CharField(max_length=255)
+
+
+class SPExpertBulkItemSerializer(serializers.Serializer):
+    expert = serializers.IntegerField()
+    is_active = serializers.BooleanField(default=True)
+
+
+class SPImagesBulkItemSerializer(serializers.Serializer):
+    id = serializers.IntegerField(required=False)
+    image = serializers.ImageField(required=False)
+
+    def validate(self, attrs):
+        if ('id' in attrs) == ('image' in attrs):
+            raise serializers.ValidationError("Provide either an image id to keep or a new image.")
+        return attrs
+
+class AvailabilitySerializerMixin(serializers.Serializer):
+    """
+    is_open و next_opening از روی weekly_hours و بدون کوئری اضافه
+    زمان مرجع از context['availability_at'] (برای open_at) یا زمان فعلی خوانده می‌شود
+    """
+    is_open = serializers.SerializerMethodField()
+    next_opening = serializers.SerializerMethodField()
+
+    def _availability_at(self):
+        return self.context.get('availability_at') or timezone.now()
+
+    def get_is_open(self, obj):
+        return is_open(obj.weekly_hours, minute_of_week(self._availability_at()))
+
+    def get_next_opening(self, obj):
+        return next_opening(obj.weekly_hours, self._availability_at())
+
+
+class ServiceProviderSerializer(AvailabilitySerializerMixin, serializers.ModelSerializer):
     category = SPCategorySerializer(read_only=True)
     address = AddressSerializer(read_only=True)
     owner = SPOwnerSerializer(read_only=True)
     work_times = SPWorkTimeSerializer(many=True, read_only=True)
     tags = SPTagSerializer(many=True, read_only=True)
     images = SPImagesSerializer(many=True, read_only=True)
-    reviews = SPReviewSerializer(many=True, read_only=True)
+    # فقط صفحه‌ی اول فید؛ بقیه از /service-providers/<id>/reviews/ با reviews_next
+    reviews = SPReviewFeedSerializer(many=True, read_only=True, source='first_reviews')
+    reviews_next = serializers.SerializerMethodField()
     rates = SPRateSerializer(many=True, read_only=True)
     expertises = SPExpertSerializer(many=True, read_only=True)
-    average_rating = serializers.SerializerMethodField() 
-    user_review = serializers.SerializerMethodField()
+    logo_image_srcset = SrcsetField(source='logo_variants')
+    main_image_srcset = SrcsetField(source='main_image_variants')
+    average_rating = serializers.FloatField(read_only=True)
+    rate_count = serializers.IntegerField(read_only=True)
+    rate_histogram = serializers.DictField(child=serializers.IntegerField(), read_only=True)
+    user_review = SPReviewFeedSerializer(many=True, read_only=True, source='first_reviews')
     user_rate = serializers.SerializerMethodField()
 
     class Meta:
@@ -110,7 +201,9 @@ class ServiceProviderSerializer(serializers.ModelSerializer):
             'id',
             'name',
             'logo_image',
+            'logo_image_srcset',
             'main_image',
+            'main_image_srcset',
             'owner',
             'address',
             'category',
@@ -119,39 +212,73 @@ class ServiceProviderSerializer(serializers.ModelSerializer):
             'tags',
             'images',
             'reviews',
+            'reviews_next',
             'user_rate',
             'rates',
             'user_review',
             'expertises',
-            'average_rating'
+            'average_rating',
+            'rate_count',
+            'rate_histogram',
+            'is_open',
+            'next_opening',
+        ]
+        # رابطه‌هایی که بدون expand فقط شناسه برمی‌گردانند
+        expandable = [
+            'owner', 'address', 'category', 'work_times', 'tags', 'images',
+            'reviews', 'rates', 'expertises', 'user_review',
         ]
 
-    def get_average_rating(self, obj):
-        rates = obj.rates.all()
-        if rates.exists():
-            return sum(rate.score for rate in rates) / rates.count()
-        return None
-    
-    def get_user_review(self, obj):
-        """
-        این متد کامنت‌ها را بر اساس وجود نمره مرتب می‌کند
-        """
-        user_rates = SPRate.objects.filter(SP=obj, user=OuterRef('user'))
-        reviews = obj.reviews.annotate(has_rate=Exists(user_rates)).order_by('-has_rate')
-        return SPReviewSerializer(reviews, many=True).data
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        selection = self.context.get('field_selection')
+        if selection is None or selection.legacy:
+            return
+        for name in list(self.fields):
+            if not selection.includes(name):
+                self.fields.pop(name)
+            elif name in self.Meta.expandable and not selection.expanded(name):
+                self.fields[name] = self._collapsed_field(name)
+            elif name in selection.subfields:
+                field = self.fields[name]
+                nested = getattr(field, 'child', field).fields
+                for sub in list(nested):
+                    if sub not in selection.subfields[name]:
+                        nested.pop(sub)
+
+    def _collapsed_field(self, name):
+        field = self.fields[name]
+        kwargs = {'source': field.source} if field.source != name else {}
+        many = hasattr(field, 'child')
+        return serializers.PrimaryKeyRelatedField(many=many, read_only=True, **kwargs)
+
+    def to_representation(self, instance):
+        if any(isinstance(self.fields.get(name), serializers.ListSerializer) for name in ('reviews', 'user_review')):
+            # امتیاز نویسنده‌ی نظرها از rates که for_detail خوانده است
+            self.context['review_scores'] = {rate.user_id: rate.score for rate in instance.rates.all()}
+        return super().to_representation(instance)
+
+    def get_reviews_next(self, obj):
+        request = self.context.get('request')
+        if request is None:
+            return None
+        url = request.build_absolute_uri(reverse('sp_review-list', kwargs={'sp_id': obj.pk}))
+        return ReviewFeedPagination().first_page_next_link(url, obj.review_page)
 
     def get_user_rate(self, obj):
         user = self.context.get('request').user
         if user.is_authenticated:
-            rate = obj.rates.filter(user=user).first()
+            rate = next((rate for rate in obj.rates.all() if rate.user_id == user.id), None)
             return SPRateSerializer(rate).data if rate else None
         return None
 
         
-class ServiceProviderShortSerializer(serializers.ModelSerializer):
+class ServiceProviderShortSerializer(AvailabilitySerializerMixin, serializers.ModelSerializer):
     category_name = serializers.CharField(source='category.name', read_only=True)
-    rate_count = serializers.IntegerField(source='rates.count', read_only=True)
-    user_rate = serializers.SerializerMethodField()
+    logo_image_srcset = SrcsetField(source='logo_variants')
+    main_image_srcset = SrcsetField(source='main_image_variants')
+    rate_count = serializers.IntegerField(read_only=True)
+    user_rate = serializers.FloatField(source='average_rating', read_only=True)
     tags = serializers.SerializerMethodField()
 
     class Meta:
@@ -160,23 +287,118 @@ class ServiceProviderShortSerializer(serializers.ModelSerializer):
             'id',
             'name',
             'logo_image',
+            'logo_image_srcset',
             'main_image',
+            'main_image_srcset',
             'category_name',
             'rate_count',
             'user_rate', 
             'tags', 
+            'is_open',
+            'next_opening',
         ]
 
-    def get_user_rate(self, obj): 
-        rates = obj.rates.all()
-        if rates.exists():
-            return sum(rate.score for rate in rates) / rates.count()
-        return None
-
     def get_tags(self, obj):
-        tags = obj.tags.select_related('key').all()
+        tags = obj.tags.all()
         return [{
             'key': tag.key.name,
             'value': tag.value
         } for tag in tags]
 
+
+
+class ServiceProviderShortRowSerializer(RowSerializer):
+    """
+    مسیر سریع لیست: همان خروجی ServiceProviderShortSerializer از روی ردیف‌های .values()
+    تگ‌های همه‌ی ردیف‌های صفحه با یک کوئری خوانده می‌شوند.
+    """
+    columns = (
+        'id', 'name', 'logo_image', 'logo_variants', 'main_image', 'main_image_variants', 'category__name',
+        'rate_sum', 'rate_count', 'weekly_hours',
+    )
+    fields = (
+        RowField('id'),
+        RowField('name'),
+        RowField('logo_image', 'logo_image', convert='image_url'),
+        RowField('logo_image_srcset', 'logo_variants', convert='srcset'),
+        RowField('main_image', 'main_image', convert='image_url'),
+        RowField('main_image_srcset', 'main_image_variants', convert='srcset'),
+        RowField('category_name', 'category__name', omit_none=True),
+        RowField('rate_count'),
+        RowField('user_rate', convert='average_rating'),
+        RowField('tags', 'id', convert='tags'),
+        RowField('is_open', 'weekly_hours', convert='is_open'),
+        RowField('next_opening', 'weekly_hours', convert='next_opening'),
+    )
+
+    def prepare(self, rows, context):
+        at = context.get('availability_at') or timezone.now()
+        tags = defaultdict(list)
+        if rows:
+            queryset = SPTag.objects.filter(SP_id__in=[row['id'] for row in rows]).order_by('id')
+            for sp_id, key, value in queryset.values_list('SP_id', 'key__name', 'value'):
+                tags[sp_id].append({'key': key, 'value': value})
+        request = context.get('request')
+        media_prefix = None
+        if isinstance(default_storage, FileSystemStorage):
+            # برای فایل‌های محلی url همان MEDIA_URL + نام فایل است؛ urljoin و build_absolute_uri
+            # برای هر تصویر لازم نیست
+            media_prefix = default_storage.url('')
+            if request is not None:
+                media_prefix = request.build_absolute_uri(media_prefix)
+        return {'request': request, 'media_prefix': media_prefix, 'at': at, 'minute': minute_of_week(at), 'tags': tags}
+
+    def image_url(self, name, state):
+        if not name:
+            return None
+        if state['media_prefix'] is not None:
+            return state['media_prefix'] + filepath_to_uri(name).lstrip('/')
+        url = default_storage.url(name)
+        request = state['request']
+        return request.build_absolute_uri(url) if request is not None else url
+
+    def srcset(self, variants, state):
+        return {f'{width}w': self.image_url(name, state) for width, name in variant_items(variants)}
+
+    def average_rating(self, row, state):
+        return row['rate_sum'] / row['rate_count'] if row['rate_count'] else None
+
+    def tags(self, sp_id, state):
+        return state['tags'].get(sp_id, [])
+
+    def is_open(self, weekly_hours, state):
+        return is_open(weekly_hours, state['minute'])
+
+    def next_opening(self, weekly_hours, state):
+        return next_opening(weekly_hours, state['at'])
+
+
+class ServiceProviderNearbySerializer(ServiceProviderShortSerializer):
+    latitude = serializers.FloatField(read_only=True)
+    longitude = serializers.FloatField(read_only=True)
+    distance = serializers.FloatField(read_only=True)  # کیلومتر
+
+    class Meta(ServiceProviderShortSerializer.Meta):
+        fields = ServiceProviderShortSerializer.Meta.fields + ['latitude', 'longitude', 'distance']
+
+
+class NearbyQuerySerializer(serializers.Serializer):
+    lat = serializers.FloatField(min_value=-90, max_value=90)
+    lon = serializers.FloatField(min_value=-180, max_value=180)
+    radius = serializers.FloatField(min_value=0, max_value=500, default=5)
+    category_id = serializers.IntegerField(required=False)
+    open_now = serializers.BooleanField(required=False)
+    open_at = serializers.DateTimeField(required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=20)
+
+
+class ServiceProviderSearchSerializer(ServiceProviderShortSerializer):
+    score = serializers.FloatField(read_only=True)
+
+    class Meta(ServiceProviderShortSerializer.Meta):
+        fields = ServiceProviderShortSerializer.Meta.fields + ['score']
+
+
+class SearchQuerySerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=200)
+    limit = serializers.IntegerField(min_value=1, max_value=50, default=20)
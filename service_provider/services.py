@@ -0,0 +1,118 @@
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+from .availability import build_intervals
+from .models import RATED_RANK, ServiceProvider, SPOpenInterval, SPRate, SPReview, SPWorkTime
+
+
+def apply_rate_change(sp_id, score, delta):
+    """
+    اعمال افزایش/کاهش یک امتیاز روی ستون‌های خلاصه‌ی ServiceProvider
+    """
+    if sp_id is None or score not in range(1, 6):
+        return
+    ServiceProvider.objects.filter(pk=sp_id).update(**{
+        'rate_sum': F('rate_sum') + score * delta,
+        'rate_count': F('rate_count') + delta,
+        f'rate_{score}_count': F(f'rate_{score}_count') + delta,
+    })
+
+
+def refresh_review_ranks(pairs):
+    """
+    به‌روزرسانی بخش «امتیاز داده» در feed_rank نظرهای هر (sp_id, user_id)
+    """
+    pairs = {(sp_id, user_id) for sp_id, user_id in pairs if sp_id is not None and user_id is not None}
+    if not pairs:
+        return
+    condition = Q()
+    for sp_id, user_id in pairs:
+        condition |= Q(SP_id=sp_id, user_id=user_id)
+    rated = set(SPRate.objects.filter(condition).values_list('SP_id', 'user_id'))
+    for sp_id, user_id in pairs:
+        base = F('feed_rank') % RATED_RANK
+        SPReview.objects.filter(SP_id=sp_id, user_id=user_id).update(
+            feed_rank=base + RATED_RANK if (sp_id, user_id) in rated else base)
+
+
+def touch_providers(sp_ids):
+    """
+    افزایش version و updated_at بعد از تغییر داده‌ای که در جزئیات ServiceProvider دیده می‌شود
+    """
+    sp_ids = {sp_id for sp_id in sp_ids if sp_id is not None}
+    if sp_ids:
+        ServiceProvider.objects.filter(pk__in=sp_ids).update(version=F('version') + 1, updated_at=timezone.now())
+
+
+def rebuild_rate_aggregates(queryset=None):
+    """
+    محاسبه‌ی دوباره‌ی خلاصه‌ی امتیازها از روی جدول SPRate
+    """
+    if queryset is None:
+        queryset = ServiceProvider.objects.all()
+
+    totals = {
+        row['SP_id']: row
+        for row in SPRate.objects.filter(SP__in=queryset).values('SP_id').annotate(
+            total=Sum('score'),
+            count=Count('id'),
+            **{f'count_{score}': Count('id', filter=Q(score=score)) for score in range(1, 6)}
+        )
+    }
+
+    fields = ['rate_sum', 'rate_count'] + [f'rate_{score}_count' for score in range(1, 6)]
+    batch, total = [], 0
+    for sp in queryset.only('id').iterator(chunk_size=2000):
+        row = totals.get(sp.id, {})
+        sp.rate_sum = row.get('total') or 0
+        sp.rate_count = row.get('count', 0)
+        for score in range(1, 6):
+            setattr(sp, f'rate_{score}_count', row.get(f'count_{score}', 0))
+        batch.append(sp)
+        if len(batch) >= 2000:
+            ServiceProvider.objects.bulk_update(batch, fields)
+            total += len(batch)
+            batch = []
+    if batch:
+        ServiceProvider.objects.bulk_update(batch, fields)
+        total += len(batch)
+    return total
+
+
+def rebuild_availability(sp_ids=None):
+    """
+    ساخت دوباره‌ی weekly_hours و SPOpenInterval از روی SPWorkTime
+    """
+    providers = ServiceProvider.objects.only('id')
+    if sp_ids is not None:
+        providers = providers.filter(pk__in=set(sp_ids))
+
+    total = 0
+    for chunk in _chunks(providers.iterator(chunk_size=2000), 2000):
+        ids = [sp.id for sp in chunk]
+        work_times = {sp_id: [] for sp_id in ids}
+        rows = SPWorkTime.objects.filter(SP_id__in=ids, is_active=True).values_list(
+            'SP_id', 'weekday__name', 'time_start', 'time_end')
+        for sp_id, weekday_name, time_start, time_end in rows:
+            work_times[sp_id].append((weekday_name, time_start, time_end))
+
+        open_intervals = []
+        for sp in chunk:
+            sp.weekly_hours = build_intervals(work_times[sp.id])
+            open_intervals.extend(
+                SPOpenInterval(SP_id=sp.id, start_minute=start, end_minute=end) for start, end in sp.weekly_hours)
+        SPOpenInterval.objects.filter(SP_id__in=ids).delete()
+        SPOpenInterval.objects.bulk_create(open_intervals)
+        ServiceProvider.objects.bulk_update(chunk, ['weekly_hours'])
+        total += len(chunk)
+    return total
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
@@ -0,0 +1,291 @@
+from functools import partial
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from .caching import invalidate_tags
+from .facets import facet_index
+from .models import (
+    Address, Car, City, Expert, ServiceProvider, SPCarExpert, SPCategory, SPExpert, SPImages, SPOwner, SPRate,
+    SPReview, SPTag, SPWorkTime, TagKey, Weekday
+)
+from .images import IMAGE_FIELDS
+from .search import search_index
+from .services import apply_rate_change, rebuild_availability, refresh_review_ranks, touch_providers
+from .tasks import generate_image_variants
+
+# ایندکس‌های درون‌حافظه‌ای که با تغییر داده‌ی ServiceProvider باید به‌روز شوند
+PROVIDER_INDEXES = [search_index, facet_index]
+
+
+def reindex_providers(sp_ids):
+    sp_ids = {sp_id for sp_id in sp_ids if sp_id is not None}
+    if not sp_ids:
+        return
+
+    def apply():
+        for index in PROVIDER_INDEXES:
+            index.mark_dirty(sp_ids)
+    # بعد از commit تا workerهای دیگر داده‌ی نهایی را بخوانند
+    transaction.on_commit(apply)
+
+
+def handled_by_origin(origin):
+    """
+    حذف از طرف ServiceProvider یا نوشتن دسته‌ای (service_provider.bulk)؛ حذف‌کننده اثرها را یک بار برای همه اعمال می‌کند
+    """
+    return isinstance(origin, ServiceProvider) or getattr(origin, 'bulk_write', False)
+
+
+def provider_children_changed(model, sp_id):
+    """
+    همان اثرهای سیگنال‌های ردیف‌به‌ردیف، یک بار برای نوشتن دسته‌ای فرزندان یک ServiceProvider
+    """
+    if model is SPWorkTime:
+        rebuild_availability([sp_id])
+    elif model is not SPImages:
+        reindex_providers([sp_id])
+    touch_providers([sp_id])
+    if model is SPImages:
+        invalidate_responses(provider_tag(sp_id))
+    else:
+        invalidate_responses(provider_tag(sp_id), 'providers')
+
+
+@receiver(pre_save, sender=SPRate)
+def remember_previous_rate(sender, instance, **kwargs):
+    if instance.pk is None or hasattr(instance, '_loaded_rate'):
+        return
+    previous = SPRate.objects.filter(pk=instance.pk).values_list('SP_id', 'score').first()
+    instance._loaded_rate = previous or (None, None)
+
+
+@receiver(post_save, sender=SPRate)
+def update_rate_aggregates_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous_sp, previous_score = getattr(instance, '_loaded_rate', (None, None))
+    if not created and (previous_sp, previous_score) != (instance.SP_id, instance.score):
+        apply_rate_change(previous_sp, previous_score, -1)
+    if created or (previous_sp, previous_score) != (instance.SP_id, instance.score):
+        apply_rate_change(instance.SP_id, instance.score, 1)
+        reindex_providers([previous_sp, instance.SP_id])
+    instance._previous_rate = (previous_sp, previous_score)
+    instance._loaded_rate = (instance.SP_id, instance.score)
+
+
+@receiver(post_delete, sender=SPRate)
+def update_rate_aggregates_on_delete(sender, instance, **kwargs):
+    previous_sp, previous_score = getattr(instance, '_loaded_rate', (instance.SP_id, instance.score))
+    apply_rate_change(previous_sp, previous_score, -1)
+    reindex_providers([previous_sp])
+
+
+@receiver(post_save, sender=SPRate)
+@receiver(post_delete, sender=SPRate)
+def update_review_ranks(sender, instance, raw=False, origin=None, **kwargs):
+    # نظرهای نویسنده‌ای که امتیاز داده در فید بالاتر می‌آیند
+    if raw or isinstance(origin, ServiceProvider):
+        return
+    previous_sp = getattr(instance, '_previous_rate', (None,))[0]
+    refresh_review_ranks([(instance.SP_id, instance.user_id), (previous_sp, instance.user_id)])
+
+
+@receiver(post_save, sender=SPWorkTime)
+def update_availability_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    rebuild_availability([instance.SP_id])
+
+
+@receiver(post_delete, sender=SPWorkTime)
+def update_availability_on_delete(sender, instance, origin=None, **kwargs):
+    if handled_by_origin(origin):
+        return
+    rebuild_availability([instance.SP_id])
+
+
+@receiver(post_save, sender=ServiceProvider)
+@receiver(post_save, sender=SPImages)
+@receiver(post_save, sender=SPCategory)
+@receiver(post_save, sender=Expert)
+def schedule_image_variants(sender, instance, raw=False, **kwargs):
+    # نسخه‌های کوچک‌شده فقط وقتی تصویر با source ذخیره‌شده فرق دارد دوباره ساخته می‌شوند
+    if raw:
+        return
+    label = sender._meta.label
+    for field_name, variants_field in IMAGE_FIELDS[label].items():
+        name = getattr(instance, field_name).name or ''
+        if name != (getattr(instance, variants_field) or {}).get('source', ''):
+            transaction.on_commit(partial(generate_image_variants.delay, label, instance.pk, field_name))
+
+
+@receiver(post_save, sender=ServiceProvider)
+@receiver(post_delete, sender=ServiceProvider)
+def reindex_service_provider(sender, instance, raw=False, **kwargs):
+    if not raw:
+        reindex_providers([instance.pk])
+
+
+@receiver(post_save, sender=SPTag)
+@receiver(post_delete, sender=SPTag)
+@receiver(post_save, sender=SPExpert)
+@receiver(post_delete, sender=SPExpert)
+@receiver(post_save, sender=SPCarExpert)
+@receiver(post_delete, sender=SPCarExpert)
+def reindex_provider_child(sender, instance, raw=False, origin=None, **kwargs):
+    if raw or handled_by_origin(origin):
+        return
+    reindex_providers([instance.SP_id])
+
+
+@receiver(post_save, sender=Expert)
+def reindex_expert_providers(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    reindex_providers(
+        list(SPExpert.objects.filter(expert=instance).values_list('SP_id', flat=True))
+        + list(SPCarExpert.objects.filter(expert=instance).values_list('SP_id', flat=True))
+    )
+
+
+@receiver(post_save, sender=Car)
+def reindex_car_providers(sender, instance, raw=False, **kwargs):
+    if not raw:
+        reindex_providers(SPCarExpert.objects.filter(car=instance).values_list('SP_id', flat=True))
+
+
+@receiver(post_save, sender=Address)
+def reindex_address_providers(sender, instance, raw=False, **kwargs):
+    if not raw:
+        reindex_providers(ServiceProvider.objects.filter(address=instance).values_list('id', flat=True))
+
+
+@receiver(post_save, sender=SPCategory)
+def reindex_category_providers(sender, instance, raw=False, **kwargs):
+    if not raw:
+        reindex_providers(ServiceProvider.objects.filter(category=instance).values_list('id', flat=True))
+
+
+@receiver(post_save, sender=City)
+def reindex_city_providers(sender, instance, raw=False, **kwargs):
+    if not raw:
+        reindex_providers(ServiceProvider.objects.filter(address__city=instance).values_list('id', flat=True))
+
+
+
+def invalidate_responses(*tags):
+    tags = [tag for tag in tags if tag]
+    invalidate_tags(*tags)
+    # دوباره بعد از commit، تا پاسخی که در این فاصله از داده‌ی قدیمی ساخته شده باقی نماند
+    transaction.on_commit(lambda: invalidate_tags(*tags))
+
+
+def provider_tag(sp_id):
+    return f'provider:{sp_id}' if sp_id is not None else None
+
+
+@receiver(post_save, sender=ServiceProvider)
+@receiver(post_delete, sender=ServiceProvider)
+def invalidate_service_provider_responses(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_responses(provider_tag(instance.pk), 'providers')
+
+
+@receiver(post_save, sender=SPWorkTime)
+@receiver(post_delete, sender=SPWorkTime)
+@receiver(post_save, sender=SPTag)
+@receiver(post_delete, sender=SPTag)
+@receiver(post_save, sender=SPExpert)
+@receiver(post_delete, sender=SPExpert)
+@receiver(post_save, sender=SPCarExpert)
+@receiver(post_delete, sender=SPCarExpert)
+@receiver(post_save, sender=SPRate)
+@receiver(post_delete, sender=SPRate)
+def invalidate_listed_child_responses(sender, instance, raw=False, origin=None, **kwargs):
+    # این داده‌ها در لیست (یا فیلترهای لیست) هم دیده می‌شوند
+    if raw or handled_by_origin(origin):
+        return
+    previous_sp = getattr(instance, '_previous_rate', (None,))[0]
+    touch_providers([instance.SP_id, previous_sp])
+    invalidate_responses(provider_tag(instance.SP_id), provider_tag(previous_sp), 'providers')
+
+
+@receiver(post_save, sender=SPReview)
+@receiver(post_delete, sender=SPReview)
+@receiver(post_save, sender=SPImages)
+@receiver(post_delete, sender=SPImages)
+def invalidate_detail_child_responses(sender, instance, raw=False, origin=None, **kwargs):
+    if raw or handled_by_origin(origin):
+        return
+    touch_providers([instance.SP_id])
+    invalidate_responses(provider_tag(instance.SP_id))
+
+
+@receiver(post_save, sender=SPCategory)
+@receiver(post_delete, sender=SPCategory)
+def invalidate_category_responses(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_responses('categories', 'providers')
+
+
+@receiver(post_save, sender=Expert)
+@receiver(post_delete, sender=Expert)
+def invalidate_expert_responses(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    if kwargs.get('signal') is post_save:
+        touch_providers(SPExpert.objects.filter(expert=instance).values_list('SP_id', flat=True))
+    invalidate_responses('experts')
+
+
+@receiver(post_save, sender=Address)
+@receiver(post_save, sender=City)
+@receiver(post_save, sender=SPOwner)
+@receiver(post_save, sender=Car)
+def invalidate_related_provider_responses(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    lookup = {Address: 'address', City: 'address__city', SPOwner: 'owner'}.get(sender)
+    if lookup is None:
+        sp_ids = SPCarExpert.objects.filter(car=instance).values_list('SP_id', flat=True)
+    else:
+        sp_ids = ServiceProvider.objects.filter(**{lookup: instance}).values_list('id', flat=True)
+    sp_ids = list(sp_ids)
+    touch_providers(sp_ids)
+    invalidate_responses('providers', *(provider_tag(sp_id) for sp_id in sp_ids))
+
+
+@receiver(post_save, sender=TagKey)
+@receiver(post_save, sender=Weekday)
+def refresh_shared_name_providers(sender, instance, raw=False, **kwargs):
+    # نام TagKey در facetها و نام روز در weekly_hours و جزئیات ServiceProviderها دیده می‌شود
+    if raw:
+        return
+    children = SPTag.objects.filter(key=instance) if sender is TagKey else SPWorkTime.objects.filter(weekday=instance)
+    sp_ids = set(children.values_list('SP_id', flat=True))
+    if not sp_ids:
+        return
+    if sender is Weekday:
+        rebuild_availability(sp_ids)
+    reindex_providers(sp_ids)
+    touch_providers(sp_ids)
+    invalidate_responses('providers', *(provider_tag(sp_id) for sp_id in sp_ids))
+
+
+@receiver(pre_delete, sender=Address)
+@receiver(pre_delete, sender=City)
+def remember_located_providers(sender, instance, **kwargs):
+    # بعد از حذف، SET_NULL رابطه را پاک کرده و ServiceProviderها دیگر پیدا نمی‌شوند
+    lookup = 'address' if sender is Address else 'address__city'
+    instance._provider_ids = set(ServiceProvider.objects.filter(**{lookup: instance}).values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Address)
+@receiver(post_delete, sender=City)
+def invalidate_deleted_location_responses(sender, instance, **kwargs):
+    sp_ids = getattr(instance, '_provider_ids', ())
+    if not sp_ids:
+        return
+    reindex_providers(sp_ids)
+    touch_providers(sp_ids)
+    invalidate_responses('providers', *(provider_tag(sp_id) for sp_id in sp_ids))
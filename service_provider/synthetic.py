@@ -0,0 +1,277 @@
+import random
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from itertools import accumulate
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from faker import Faker
+from authentication.models import UserDetail, UserIdentifier
+from .availability import build_intervals
+from .geo import geohash_encode
+from .models import (
+    Address, Car, City, Expert, ServiceProvider, SPCarExpert, SPCategory, SPExpert, SPOpenInterval, SPOwner, SPRate,
+    SPReview, SPTag, SPWorkTime, TagKey, Weekday, review_feed_rank
+)
+from .signals import PROVIDER_INDEXES, invalidate_responses
+
+User = get_user_model()
+
+# داده‌ی پایه که بین همه‌ی ServiceProviderها مشترک است؛ ترتیب هر لیست ترتیب فراوانی (Zipf) است
+CATEGORIES = [
+    'Mechanical Repair', 'Tires', 'Car Wash', 'Oil Change', 'Body Shop', 'Electrical', 'Paint', 'Battery',
+    'Air Conditioning', 'Glass', 'Detailing', 'Towing',
+]
+CITIES = [
+    ('Tehran', 35.69, 51.39), ('Mashhad', 36.30, 59.60), ('Isfahan', 32.65, 51.67), ('Karaj', 35.84, 50.94),
+    ('Shiraz', 29.59, 52.58), ('Tabriz', 38.08, 46.29), ('Qom', 34.64, 50.88), ('Ahvaz', 31.32, 48.67),
+    ('Kermanshah', 34.31, 47.07), ('Urmia', 37.55, 45.07), ('Rasht', 37.28, 49.58), ('Zahedan', 29.50, 60.86),
+    ('Hamadan', 34.80, 48.51), ('Kerman', 30.28, 57.08), ('Yazd', 31.90, 54.37), ('Ardabil', 38.25, 48.29),
+    ('Bandar Abbas', 27.18, 56.27), ('Arak', 34.09, 49.69), ('Zanjan', 36.67, 48.48), ('Sanandaj', 35.31, 47.00),
+]
+EXPERTS = [
+    'Engine', 'Brakes', 'Suspension', 'Diagnostics', 'Transmission', 'Electrical Systems', 'Wheel Alignment',
+    'Body Work', 'AC Service', 'Tyre Fitting', 'Exhaust', 'Windshield', 'Diesel', 'Hybrid Systems', 'Detailing',
+    'Dent Repair',
+]
+TAGS = {
+    'brand': ['Peugeot', 'Iran Khodro', 'Saipa', 'Kia', 'Hyundai', 'Toyota', 'Renault', 'Chery', 'BMW', 'Mercedes'],
+    'payment': ['cash', 'card', 'installments'],
+    'parking': ['yes', 'no'],
+    'warranty': ['3 months', '6 months', '1 year'],
+    'pickup': ['yes', 'no'],
+}
+CARS = [
+    ('Peugeot', '206'), ('Peugeot', '405'), ('Peugeot', 'Pars'), ('Iran Khodro', 'Samand'), ('Iran Khodro', 'Dena'),
+    ('Saipa', 'Pride'), ('Saipa', 'Tiba'), ('Saipa', 'Quick'), ('Kia', 'Cerato'), ('Kia', 'Sportage'),
+    ('Hyundai', 'Elantra'), ('Hyundai', 'Tucson'), ('Toyota', 'Corolla'), ('Toyota', 'Camry'), ('Renault', 'Tondar'),
+    ('Chery', 'Tiggo 7'),
+]
+WEEKDAYS = ['Saturday', 'Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
+NAME_SUFFIXES = ['Auto Service', 'Garage', 'Car Care', 'Motors', 'Auto Repair', 'Tire Center', 'Car Clinic']
+# سهم هر امتیاز ۱ تا ۵ برای یک ServiceProvider متوسط
+SCORE_WEIGHTS = [6, 5, 12, 30, 47]
+REVIEW_WINDOW = timedelta(days=730)
+# «اکنون» داده‌ی ساختگی؛ ثابت است تا created_at، date_joined و feed_rank با یک seed همیشه یکی باشند
+DEFAULT_NOW = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def zipf_weights(count, exponent=1.0):
+    return list(accumulate(1 / rank ** exponent for rank in range(1, count + 1)))
+
+
+class SyntheticDataset:
+    """
+    ساخت داده‌ی ساختگی تکرارپذیر (با seed ثابت) برای benchmark
+
+    دسته‌بندی، شهر، TagKey، تخصص و خودرو بین همه‌ی ServiceProviderها مشترک‌اند و با توزیع Zipf انتخاب
+    می‌شوند؛ تعداد امتیاز هر ServiceProvider از توزیع دم‌سنگین (Pareto گسسته، شبیه Zipf) و بخشی از
+    امتیازدهنده‌ها نظر هم می‌نویسند. همه‌چیز در chunkهای chunk_size تایی با bulk_create نوشته می‌شود و
+    ستون‌های خلاصه (امتیازها، weekly_hours، SPOpenInterval، feed_rank) همان‌جا حساب می‌شوند.
+    """
+
+    def __init__(self, providers, seed=0, users=None, chunk_size=2000, zipf_exponent=1.2, max_rates=1000,
+                 password=None, log=None, now=None):
+        self.providers = providers
+        self.seed = seed
+        self.users = users or max(100, providers // 2)
+        self.owners = max(1, providers // 2)
+        self.chunk_size = chunk_size
+        self.zipf_exponent = zipf_exponent
+        self.max_rates = min(max_rates, self.users)
+        # یک hash برای همه‌ی کاربرها؛ hash کردن جداگانه برای میلیون‌ها کاربر ساعت‌ها طول می‌کشد
+        self.password = make_password(password)
+        self.log = log or (lambda message: None)
+        self.rng = random.Random(seed)
+        self.fake = Faker()
+        self.fake.seed_instance(seed)
+        self.now = now or DEFAULT_NOW
+        self.counts = {}
+
+    def username(self, kind, n):
+        return f'fake{self.seed}_{kind}{n}'
+
+    def exists(self):
+        return User.objects.filter(username__in=[self.username('user', 0), self.username('owner', 0)]).exists()
+
+    def generate(self):
+        self.create_dimensions()
+        self.user_ids = self.create_users('user', self.users, details=True)
+        owner_users = self.create_users('owner', self.owners)
+        self.owner_ids = []
+        for start in range(0, len(owner_users), self.chunk_size):
+            owners = SPOwner.objects.bulk_create(
+                [SPOwner(user_id=user_id) for user_id in owner_users[start:start + self.chunk_size]])
+            self.owner_ids.extend(owner.pk for owner in owners)
+        self.count(SPOwner, len(self.owner_ids))
+
+        # نام‌ها از مخزن‌های از پیش ساخته‌شده خوانده می‌شوند؛ Faker برای هر ردیف کند است
+        self.surnames = [self.fake.last_name() for _ in range(2000)]
+        self.streets = [self.fake.street_name() for _ in range(2000)]
+        self.titles = [self.fake.sentence(nb_words=5).rstrip('.') for _ in range(500)]
+        self.paragraphs = [self.fake.paragraph(nb_sentences=3) for _ in range(500)]
+
+        for start in range(0, self.providers, self.chunk_size):
+            with transaction.atomic():
+                self.create_chunk(min(self.chunk_size, self.providers - start))
+            self.log(f"providers {start + min(self.chunk_size, self.providers - start)}/{self.providers}")
+
+        for index in PROVIDER_INDEXES:
+            index.invalidate()
+        invalidate_responses('providers', 'categories', 'experts')
+        return self.counts
+
+    def count(self, model, number):
+        label = model._meta.label
+        self.counts[label] = self.counts.get(label, 0) + number
+
+    def create_dimensions(self):
+        self.weekdays = {name: Weekday.objects.get_or_create(name=name)[0].pk for name in WEEKDAYS}
+        self.categories = [SPCategory.objects.get_or_create(name=name)[0].pk for name in CATEGORIES]
+        self.cities = []
+        for name, lat, lon in CITIES:
+            city = City.objects.filter(name=name).order_by('pk').first() or City.objects.create(name=name)
+            self.cities.append((city.pk, lat, lon))
+        self.experts = [
+            (Expert.objects.filter(name=name).order_by('pk').first()
+             or Expert.objects.create(name=name, spcategory_id=self.categories[i % len(self.categories)])).pk
+            for i, name in enumerate(EXPERTS)
+        ]
+        self.tag_keys = [(TagKey.objects.get_or_create(name=name)[0].pk, values) for name, values in TAGS.items()]
+        self.cars = [
+            (Car.objects.filter(brand=brand, model=model).order_by('pk').first()
+             or Car.objects.create(brand=brand, model=model)).pk
+            for brand, model in CARS
+        ]
+        self.category_weights = zipf_weights(len(self.categories))
+        self.city_weights = zipf_weights(len(self.cities))
+        self.expert_weights = zipf_weights(len(self.experts), 0.8)
+
+    def create_users(self, kind, total, details=False):
+        ids = []
+        for start in range(0, total, self.chunk_size):
+            with transaction.atomic():
+                users = User.objects.bulk_create([
+                    User(username=self.username(kind, n), email=f'{self.username(kind, n)}@example.com',
+                         password=self.password, date_joined=self.now)
+                    for n in range(start, min(start + self.chunk_size, total))
+                ])
+                # bulk_create مقدار فیلدهای auto_now_add را با زمان فعلی جایگزین می‌کند
+                User.objects.filter(pk__in=[user.pk for user in users]).update(date_joined=self.now)
+                UserIdentifier.objects.bulk_create([
+                    UserIdentifier(user=user, kind=identifier_kind, value=value)
+                    for user in users for value, identifier_kind in UserIdentifier.values_for(user).items()
+                ])
+                if details:
+                    UserDetail.objects.bulk_create([
+                        UserDetail(user=user, firstname=self.fake.first_name(), lastname=self.fake.last_name())
+                        for user in users
+                    ])
+            ids.extend(user.pk for user in users)
+        self.count(User, len(ids))
+        return ids
+
+    def work_times(self):
+        """
+        ساعت کاری یک ServiceProvider: (weekday, time_start, time_end)ها
+        """
+        rng = self.rng
+        pattern = rng.random()
+        if pattern < 0.05:
+            # شبانه‌روزی
+            return [(day, time(0), time(0)) for day in WEEKDAYS]
+        if pattern < 0.15:
+            start, end = rng.choice([(8, 20), (9, 21), (10, 22)])
+            return [(day, time(start), time(end)) for day in WEEKDAYS]
+        workdays = WEEKDAYS[:6]
+        if pattern < 0.35:
+            # با استراحت ظهر؛ پنجشنبه فقط صبح
+            morning, evening = (time(rng.choice([8, 9])), time(13)), (time(16), time(rng.choice([19, 20])))
+            return [(day, *morning) for day in workdays] + [(day, *evening) for day in workdays[:5]]
+        start = time(rng.choice([7, 8, 8, 9, 9, 10]), rng.choice([0, 0, 30]))
+        end = time(rng.choice([17, 18, 18, 19, 20]))
+        return [(day, start, end) for day in workdays]
+
+    def create_chunk(self, size):
+        # همه‌ی انتخاب‌های تصادفی یک ServiceProvider پشت سر هم انجام می‌شوند تا داده به chunk_size وابسته نباشد
+        rng = self.rng
+        addresses, providers = [], []
+        rows = {model: [] for model in (SPWorkTime, SPOpenInterval, SPTag, SPExpert, SPCarExpert, SPRate, SPReview)}
+        for _ in range(size):
+            city_id, lat, lon = rng.choices(self.cities, cum_weights=self.city_weights)[0]
+            lat, lon = round(lat + rng.gauss(0, 0.04), 6), round(lon + rng.gauss(0, 0.05), 6)
+            address = Address(
+                city_id=city_id,
+                district=str(rng.randint(1, 22)),
+                neighbourhood=rng.choice(self.streets),
+                full_address=f"{rng.choice(self.streets)}, No. {rng.randint(1, 300)}",
+            )
+            work_times = self.work_times()
+            quality = rng.gauss(0, 1.5)
+            weights = [weight * (1.6 ** (quality * (score - 3) / 2)) for score, weight in enumerate(SCORE_WEIGHTS, 1)]
+            rate_count = min(int(rng.paretovariate(self.zipf_exponent)) - 1, self.max_rates)
+            raters = rng.sample(range(self.users), rate_count)
+            scores = rng.choices(range(1, 6), weights=weights, k=rate_count)
+            sp = ServiceProvider(
+                name=f"{rng.choice(self.surnames)} {rng.choice(NAME_SUFFIXES)}",
+                owner_id=rng.choice(self.owner_ids),
+                category_id=rng.choices(self.categories, cum_weights=self.category_weights)[0],
+                address=address,
+                location=f"{lat}, {lon}",
+                latitude=lat,
+                longitude=lon,
+                geohash=geohash_encode(lat, lon),
+                logo_image='',
+                weekly_hours=build_intervals(work_times),
+                rate_sum=sum(scores),
+                rate_count=rate_count,
+                **{f'rate_{score}_count': scores.count(score) for score in range(1, 6)},
+            )
+            addresses.append(address)
+            providers.append(sp)
+
+            # SP_id فرزندها بعد از bulk_create خود ServiceProviderها از sp.pk پر می‌شود
+            rows[SPWorkTime].extend(
+                SPWorkTime(SP=sp, weekday_id=self.weekdays[day], time_start=start, time_end=end)
+                for day, start, end in work_times)
+            rows[SPOpenInterval].extend(
+                SPOpenInterval(SP=sp, start_minute=start, end_minute=end) for start, end in sp.weekly_hours)
+            for key_id, values in rng.sample(self.tag_keys, rng.randint(1, 3)):
+                rows[SPTag].append(SPTag(SP=sp, key_id=key_id, value=rng.choice(values)))
+            experts = list(dict.fromkeys(
+                rng.choices(self.experts, cum_weights=self.expert_weights, k=rng.randint(1, 3))))
+            rows[SPExpert].extend(SPExpert(SP=sp, expert_id=expert_id) for expert_id in experts)
+            for expert_id in experts[:rng.randint(0, 2)]:
+                rows[SPCarExpert].append(SPCarExpert(SP=sp, car_id=rng.choice(self.cars), expert_id=expert_id))
+            for rater, score in zip(raters, scores):
+                rows[SPRate].append(SPRate(SP=sp, user_id=self.user_ids[rater], score=score))
+                if rng.random() < 0.35:
+                    rows[SPReview].append(self.review(sp, self.user_ids[rater], rated=True))
+            if rng.random() < 0.2 and rate_count < self.users:
+                # نظر بدون امتیاز از کاربری که به این ServiceProvider امتیاز نداده
+                raters = set(raters)
+                user = rng.randrange(self.users)
+                while user in raters:
+                    user = rng.randrange(self.users)
+                rows[SPReview].append(self.review(sp, self.user_ids[user], rated=False))
+
+        Address.objects.bulk_create(addresses)
+        ServiceProvider.objects.bulk_create(providers)
+        self.count(Address, len(addresses))
+        self.count(ServiceProvider, len(providers))
+        for model, objects in rows.items():
+            model.objects.bulk_create(objects, batch_size=self.chunk_size * 4)
+            self.count(model, len(objects))
+        sp_ids = [sp.pk for sp in providers]
+        ServiceProvider.objects.filter(pk__in=sp_ids).update(updated_at=self.now)
+        SPWorkTime.objects.filter(SP__in=sp_ids).update(created_at=self.now)
+
+    def review(self, sp, user_id, rated):
+        created_at = self.now - self.rng.random() * REVIEW_WINDOW
+        return SPReview(
+            SP=sp,
+            user_id=user_id,
+            title=self.rng.choice(self.titles),
+            description=self.rng.choice(self.paragraphs),
+            created_at=created_at,
+            feed_rank=review_feed_rank(created_at, rated),
+        )
@@ -0,0 +1,62 @@
+from celery import shared_task
+from django.apps import apps
+from django.utils import timezone
+from .caching import invalidate_tags
+from .images import IMAGE_FIELDS, build_variants, delete_variants
+from .services import touch_providers
+
+
+def _invalidate_image_responses(model_label, pk):
+    from .signals import provider_tag
+    if model_label == 'service_provider.SPCategory':
+        ServiceProvider = apps.get_model('service_provider', 'ServiceProvider')
+        touch_providers(ServiceProvider.objects.filter(category_id=pk).values_list('id', flat=True))
+        invalidate_tags('categories', 'providers')
+        return
+    if model_label == 'service_provider.Expert':
+        SPExpert = apps.get_model('service_provider', 'SPExpert')
+        touch_providers(SPExpert.objects.filter(expert_id=pk).values_list('SP_id', flat=True))
+        invalidate_tags('experts')
+        return
+    sp_id = pk
+    if model_label == 'service_provider.SPImages':
+        sp_id = apps.get_model(model_label).objects.filter(pk=pk).values_list('SP_id', flat=True).first()
+    touch_providers([sp_id])
+    invalidate_tags(provider_tag(sp_id), 'providers')
+
+
+@shared_task(autoretry_for=(OSError,), retry_backoff=True, max_retries=3)
+def generate_image_variants(model_label, pk, field_name):
+    """
+    ساخت نسخه‌های کوچک‌شده‌ی تصویر فعلی یک ردیف و حذف نسخه‌های تصویر قبلی
+    اگر تصویر در این فاصله عوض شده باشد ذخیره نمی‌شود؛ کار تصویر جدید جداگانه در صف است.
+    """
+    model = apps.get_model(model_label)
+    variants_field = IMAGE_FIELDS[model_label][field_name]
+    row = model.objects.filter(pk=pk).values_list(field_name, variants_field).first()
+    if row is None:
+        return
+    name, previous = row
+    variants = build_variants(name) if name else {}
+    values = {variants_field: variants}
+    # update() فیلد auto_now را عوض نمی‌کند؛ بدون آن ETag پاسخ (conditional.py) همان می‌ماند
+    if any(field.name == 'updated_at' for field in model._meta.concrete_fields):
+        values['updated_at'] = timezone.now()
+    updated = model.objects.filter(pk=pk, **{field_name: name}).update(**values)
+    if not updated:
+        delete_variants(variants)
+        return
+    delete_variants(previous, keep=set(variants.values()))
+    _invalidate_image_responses(model_label, pk)
+
+
+@shared_task
+def import_providers(import_id):
+    """
+    اجرا یا ادامه‌ی ورود فایل آپلودشده‌ی یک ProviderImport
+    """
+    from .imports import run_import
+    from .models import ProviderImport
+    job = ProviderImport.objects.claimable().filter(pk=import_id).first()
+    if job is not None:
+        run_import(job)
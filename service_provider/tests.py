@@ -1,7 +1,1191 @@
-from rest_framework.test import APITestCase
+import csv
+from datetime import datetime, timedelta
+from decimal import Decimal
+import gzip
+from io import BytesIO, StringIO
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+from zoneinfo import ZoneInfo
+from PIL import Image
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, APITestCase
 from rest_framework import status
-from django.contrib.auth.models import User
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.test import override_settings
+from django.utils import timezone
 from .models import (
     SPCategory, Address, City, SPWorkTime, Weekday, SPTag, TagKey,
-    ServiceProvider, SPOwner, SPReview, SPRate, Expert, SPExpert
+    ServiceProvider, SPOwner, SPReview, SPRate, Expert, SPExpert, Car, SPCarExpert, SPImages,
+    ProviderImport
 )
+from .availability import next_opening
+from .checks import check_task_queue
+from .search import search_index
+from .synthetic import DEFAULT_NOW
+from .imports import run_import
+from .tasks import generate_image_variants, import_providers
+from .facets import facet_index
+from .caching import cache_stats
+from .serializers import ServiceProviderShortRowSerializer, ServiceProviderShortSerializer
+from cara.renderers import FastJSONRenderer
+
+User = get_user_model()
+
+
+class ServiceProviderTestMixin:
+    def setUp(self):
+        super().setUp()
+        # کش و ایندکس‌های درون‌حافظه‌ای بین تست‌ها مشترک‌اند
+        cache.clear()
+        search_index.built = False
+        facet_index.built = False
+
+    @classmethod
+    def create_provider(cls, name="Garage", **kwargs):
+        owner_user = User.objects.create_user(username=f"owner_{name}", email=f"{name}@example.com")
+        defaults = {
+            'owner': SPOwner.objects.create(user=owner_user),
+            'logo_image': 'SP_logos/logo.png',
+            'location': "35.7, 51.4",
+        }
+        defaults.update(kwargs)
+        return ServiceProvider.objects.create(name=name, **defaults)
+
+    @classmethod
+    def create_user(cls, username):
+        return User.objects.create_user(username=username, email=f"{username}@example.com")
+
+
+class RateAggregateTests(ServiceProviderTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.sp = self.create_provider()
+        self.other_sp = self.create_provider(name="Other")
+
+    def assertAggregates(self, sp, rate_sum, rate_count, histogram):
+        sp.refresh_from_db()
+        self.assertEqual(sp.rate_sum, rate_sum)
+        self.assertEqual(sp.rate_count, rate_count)
+        self.assertEqual(sp.rate_histogram, histogram)
+
+    def test_create_update_delete_keep_aggregates_in_sync(self):
+        rate = SPRate.objects.create(SP=self.sp, user=self.create_user("u1"), score=5)
+        SPRate.objects.create(SP=self.sp, user=self.create_user("u2"), score=3)
+        self.assertAggregates(self.sp, 8, 2, {1: 0, 2: 0, 3: 1, 4: 0, 5: 1})
+
+        rate.score = 1
+        rate.save()
+        self.assertAggregates(self.sp, 4, 2, {1: 1, 2: 0, 3: 1, 4: 0, 5: 0})
+
+        rate = SPRate.objects.get(pk=rate.pk)
+        rate.SP = self.other_sp
+        rate.save()
+        self.assertAggregates(self.sp, 3, 1, {1: 0, 2: 0, 3: 1, 4: 0, 5: 0})
+        self.assertAggregates(self.other_sp, 1, 1, {1: 1, 2: 0, 3: 0, 4: 0, 5: 0})
+
+        SPRate.objects.filter(SP=self.sp).delete()
+        self.assertAggregates(self.sp, 0, 0, {1: 0, 2: 0, 3: 0, 4: 0, 5: 0})
+        self.assertIsNone(self.sp.average_rating)
+
+    def test_rebuild_command_repairs_drift(self):
+        SPRate.objects.bulk_create([
+            SPRate(SP=self.sp, score=4),
+            SPRate(SP=self.sp, score=2),
+        ])
+        self.assertAggregates(self.sp, 0, 0, {1: 0, 2: 0, 3: 0, 4: 0, 5: 0})
+
+        call_command('rebuild_rate_aggregates', stdout=StringIO())
+        self.assertAggregates(self.sp, 6, 2, {1: 0, 2: 1, 3: 0, 4: 1, 5: 0})
+        self.assertEqual(self.sp.average_rating, 3)
+
+    def test_list_reads_aggregate_columns(self):
+        SPRate.objects.create(SP=self.sp, score=4)
+        SPRate.objects.create(SP=self.sp, score=5)
+
+        response = self.client.get('/service/service-providers/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        row = next(item for item in response.json()['results'] if item['id'] == self.sp.id)
+        self.assertEqual(row['rate_count'], 2)
+        self.assertEqual(row['user_rate'], 4.5)
+
+
+class ServiceProviderRetrieveQueryTests(ServiceProviderTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        city = City.objects.create(name="Tehran")
+        address = Address.objects.create(district="1", city=city, neighbourhood="Vanak", full_address="Vanak Sq")
+        self.sp = self.create_provider(address=address, category=SPCategory.objects.create(name="Repair"))
+        self.weekday = Weekday.objects.create(name="Monday")
+        self.tag_key = TagKey.objects.create(name="parking")
+        self.next_child = 0
+
+    def add_children(self, count):
+        for _ in range(count):
+            self.next_child += 1
+            n = self.next_child
+            user = self.create_user(f"customer{n}")
+            SPWorkTime.objects.create(SP=self.sp, weekday=self.weekday, time_start="08:00", time_end="17:00")
+            SPTag.objects.create(SP=self.sp, key=self.tag_key, value=f"value{n}")
+            SPReview.objects.create(SP=self.sp, user=user, title="t", description="d")
+            SPRate.objects.create(SP=self.sp, user=user, score=n % 5 + 1)
+            SPExpert.objects.create(SP=self.sp, expert=Expert.objects.create(name=f"expert{n}"))
+
+    def retrieve(self, query=''):
+        response = self.client.get(f'/service/service-providers/{self.sp.id}/{query}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    def test_query_count_does_not_grow_with_children(self):
+        # ۷ کوئری برای payload و یکی برای ETag
+        self.add_children(1)
+        with self.assertNumQueries(8):
+            self.retrieve()
+
+        self.add_children(10)
+        with self.assertNumQueries(8):
+            data = self.retrieve()
+
+        # نظرها فقط صفحه‌ی اول فید را جاسازی می‌کنند
+        self.assertEqual(len(data['reviews']), 10)
+        self.assertEqual(len(data['user_review']), 10)
+        self.assertIn('/reviews/?cursor=', data['reviews_next'])
+        self.assertEqual(len(data['rates']), 11)
+        self.assertEqual(len(data['tags']), 11)
+        self.assertEqual(data['address']['city_name'], "Tehran")
+
+    def test_user_review_lists_rated_reviews_first(self):
+        rater = self.create_user("rater")
+        silent = self.create_user("silent")
+        SPReview.objects.create(SP=self.sp, user=silent, title="first", description="d")
+        SPReview.objects.create(SP=self.sp, user=rater, title="second", description="d")
+        SPRate.objects.create(SP=self.sp, user=rater, score=5)
+
+        data = self.retrieve()
+        self.assertEqual([review['title'] for review in data['user_review']], ["second", "first"])
+
+    def test_fields_and_expand_shape_response(self):
+        self.add_children(2)
+        data = self.retrieve('?fields=id,name,tags,reviews.title&expand=category')
+        self.assertEqual(set(data), {'id', 'name', 'tags', 'reviews', 'category'})
+        self.assertEqual(data['tags'], list(self.sp.tags.order_by('id').values_list('id', flat=True)))
+        self.assertEqual(data['reviews'], [{'title': "t"}, {'title': "t"}])
+        self.assertEqual(data['category']['name'], "Repair")
+
+    def test_unexpanded_relations_cost_fewer_queries(self):
+        self.add_children(5)
+        # provider، ETag، tags و reviews (فقط شناسه‌ها)
+        with self.assertNumQueries(4):
+            data = self.retrieve('?fields=id,tags,reviews')
+        self.assertEqual(len(data['reviews']), 5)
+
+    def test_unknown_field_is_rejected(self):
+        for query in ('?fields=nope', '?expand=name', '?fields=reviews.nope', '?fields=name.first'):
+            response = self.client.get(f'/service/service-providers/{self.sp.id}/{query}')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, query)
+
+
+class ReviewFeedTests(ServiceProviderTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.sp = self.create_provider()
+        self.url = f'/service/service-providers/{self.sp.id}/reviews/'
+
+    def add_review(self, username, score=None, **kwargs):
+        user = self.create_user(username)
+        review = SPReview.objects.create(SP=self.sp, user=user, title=username, description="d", **kwargs)
+        if score:
+            SPRate.objects.create(SP=self.sp, user=user, score=score)
+        return review
+
+    def test_rated_reviews_first_then_newest(self):
+        self.add_review("old_rated", score=4)
+        self.add_review("old")
+        self.add_review("new")
+        self.add_review("hidden", is_active=False)
+        late = self.add_review("late_rater")
+        SPRate.objects.create(SP=self.sp, user=late.user, score=2)
+
+        results = self.client.get(self.url).json()['results']
+        self.assertEqual([row['title'] for row in results], ["late_rater", "old_rated", "new", "old"])
+        self.assertEqual([row['score'] for row in results], [2, 4, None, None])
+
+        SPRate.objects.filter(user=late.user).delete()
+        results = self.client.get(self.url).json()['results']
+        self.assertEqual([row['title'] for row in results], ["old_rated", "late_rater", "new", "old"])
+
+    def test_cursor_pages_with_constant_queries(self):
+        for i in range(25):
+            self.add_review(f"user{i}", score=i % 5 + 1 if i % 2 else None)
+        url, titles = self.url, []
+        while url:
+            # صفحه‌ی نظرها (با نام نویسنده) و امتیازها
+            with self.assertNumQueries(2):
+                page = self.client.get(url).json()
+            titles += [row['title'] for row in page['results']]
+            url = page['next']
+        self.assertEqual(len(titles), 25)
+        self.assertEqual(len(set(titles)), 25)
+
+    def test_cursor_is_stable_across_tied_ranks(self):
+        created_at = timezone.now()
+        for i in range(5):
+            self.add_review(f"user{i}", created_at=created_at)
+        first = self.client.get(f'{self.url}?page_size=2').json()
+        self.assertEqual([row['title'] for row in first['results']], ["user4", "user3"])
+
+        # نظر هم‌رتبه‌ی تازه قبل از صفحه‌ی اول قرار می‌گیرد و صفحه‌های بعد را جابه‌جا نمی‌کند
+        self.add_review("user5", created_at=created_at)
+        second = self.client.get(first['next']).json()
+        self.assertEqual([row['title'] for row in second['results']], ["user2", "user1"])
+        third = self.client.get(second['next']).json()
+        self.assertEqual(([row['title'] for row in third['results']], third['next']), (["user0"], None))
+        previous = self.client.get(second['previous']).json()
+        self.assertEqual([row['title'] for row in previous['results']], ["user4", "user3"])
+
+    def test_detail_links_to_second_page(self):
+        for i in range(12):
+            self.add_review(f"user{i}")
+        detail = self.client.get(f'/service/service-providers/{self.sp.id}/').json()
+        rest = self.client.get(detail['reviews_next']).json()['results']
+        self.assertEqual(
+            [row['title'] for row in detail['reviews'] + rest], [f"user{i}" for i in reversed(range(12))])
+
+
+class KeysetPaginationTests(ServiceProviderTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.ids = [self.create_provider(name=f"Garage{i}").id for i in range(25)]
+
+    def test_cursor_walks_every_row_once(self):
+        url, seen = '/service/service-providers/?page_size=10', []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen.extend(item['id'] for item in response.json()['results'])
+            url = response.json()['next']
+        self.assertEqual(seen, self.ids)
+
+    def test_page_size_is_capped_and_count_is_opt_in(self):
+        with self.settings(PAGINATION_MAX_PAGE_SIZE=5):
+            response = self.client.get('/service/service-providers/?page_size=1000')
+        self.assertEqual(len(response.json()['results']), 5)
+        self.assertNotIn('count', response.json())
+
+        response = self.client.get('/service/service-providers/?count=exact')
+        self.assertEqual(response.json()['count'], 25)
+        self.assertFalse(response.json()['count_is_estimate'])
+
+        response = self.client.get('/service/service-providers/?count=estimate')
+        self.assertEqual(response.json()['count'], 25)
+
+
+class NearbySearchTests(ServiceProviderTestMixin, APITestCase):
+    def test_location_string_is_parsed_into_coordinates(self):
+        sp = self.create_provider(location="35.6657767 51.2443207")
+        self.assertAlmostEqual(sp.latitude, 35.6657767)
+        self.assertAlmostEqual(sp.longitude, 51.2443207)
+        self.assertTrue(sp.geohash.startswith("tnk6y"))
+
+        sp.location = "not a location"
+        sp.save(update_fields=['location'])
+        sp.refresh_from_db()
+        self.assertIsNone(sp.latitude)
+        self.assertIsNone(sp.geohash)
+
+    def test_returns_nearest_within_radius_sorted_by_distance(self):
+        category = SPCategory.objects.create(name="Tires")
+        far = self.create_provider(name="Far", location="35.80, 51.40")
+        near = self.create_provider(name="Near", location="35.701, 51.401")
+        middle = self.create_provider(name="Middle", location="35.71, 51.41", category=category)
+        self.create_provider(name="Karaj", location="35.83, 50.99")
+
+        response = self.client.get('/service/service-providers/nearby/?lat=35.70&lon=51.40&radius=15')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in response.json()], [near.id, middle.id, far.id])
+        distances = [item['distance'] for item in response.json()]
+        self.assertEqual(distances, sorted(distances))
+
+        response = self.client.get('/service/service-providers/nearby/?lat=35.70&lon=51.40&radius=15&limit=1')
+        self.assertEqual([item['id'] for item in response.json()], [near.id])
+
+        response = self.client.get(
+            f'/service/service-providers/nearby/?lat=35.70&lon=51.40&radius=15&category_id={category.id}')
+        self.assertEqual([item['id'] for item in response.json()], [middle.id])
+
+    def test_invalid_coordinates_are_rejected(self):
+        response = self.client.get('/service/service-providers/nearby/?lat=200&lon=51.40')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class AvailabilityTests(ServiceProviderTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.sp = self.create_provider()
+        self.night_shift = self.create_provider(name="Night")
+        self.create_provider(name="NoHours")
+        monday = Weekday.objects.create(name="Monday")
+        sunday = Weekday.objects.create(name="Sunday")
+        SPWorkTime.objects.create(SP=self.sp, weekday=monday, time_start="08:00", time_end="12:00")
+        SPWorkTime.objects.create(SP=self.sp, weekday=monday, time_start="11:00", time_end="17:00")
+        SPWorkTime.objects.create(SP=self.night_shift, weekday=sunday, time_start="22:00", time_end="02:00")
+
+    def ids(self, query):
+        response = self.client.get(f'/service/service-providers/?{query}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return {item['id'] for item in response.json()['results']}
+
+    def test_work_times_are_merged_into_weekly_hours(self):
+        self.sp.refresh_from_db()
+        self.assertEqual(self.sp.weekly_hours, [[8 * 60, 17 * 60]])
+        self.night_shift.refresh_from_db()
+        self.assertEqual(self.night_shift.weekly_hours, [[0, 120], [6 * 1440 + 22 * 60, 7 * 1440]])
+
+        self.sp.work_times.all().delete()
+        self.sp.refresh_from_db()
+        self.assertEqual(self.sp.weekly_hours, [])
+        self.assertFalse(self.sp.open_intervals.exists())
+
+    def test_open_at_filter_and_next_opening(self):
+        # 2026-10-19 is a Monday; times are in Asia/Tehran
+        self.assertEqual(self.ids('open_at=2026-10-19T09:30:00%2B03:30'), {self.sp.id})
+        self.assertEqual(self.ids('open_at=2026-10-19T01:00:00%2B03:30'), {self.night_shift.id})
+        self.assertEqual(self.ids('open_at=2026-10-19T20:00:00%2B03:30'), set())
+
+        response = self.client.get('/service/service-providers/?open_at=2026-10-19T09:30:00%2B03:30')
+        row = response.json()['results'][0]
+        self.assertTrue(row['is_open'])
+        self.assertIsNone(row['next_opening'])
+
+        self.sp.refresh_from_db()
+        at = datetime(2026, 10, 19, 18, 0, tzinfo=ZoneInfo('Asia/Tehran'))
+        self.assertEqual(next_opening(self.sp.weekly_hours, at), at + timedelta(days=6, hours=14))
+
+    def test_invalid_open_at_is_rejected(self):
+        response = self.client.get('/service/service-providers/?open_at=tomorrow')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class SearchTests(ServiceProviderTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        city = City.objects.create(name="تهران")
+        address = Address.objects.create(district="ونک", city=city, neighbourhood="ملاصدرا", full_address="-")
+        self.kaveh = self.create_provider(name="تعمیرگاه کاوه", address=address)
+        self.bosch = self.create_provider(name="Bosch Car Service")
+        SPTag.objects.create(SP=self.bosch, key=TagKey.objects.create(name="service"), value="گیربکس")
+        SPExpert.objects.create(SP=self.kaveh, expert=Expert.objects.create(name="صافکاری"))
+
+    def search(self, q):
+        response = self.client.get('/service/search/', {'q': q})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['id'] for item in response.json()]
+
+    def test_matches_name_tag_expert_and_address(self):
+        self.assertEqual(self.search("bosch"), [self.bosch.id])
+        self.assertEqual(self.search("گیربکس"), [self.bosch.id])
+        self.assertEqual(self.search("صافکاری"), [self.kaveh.id])
+        self.assertEqual(self.search("ونک"), [self.kaveh.id])
+
+    def test_normalizes_arabic_characters_and_tolerates_typos(self):
+        self.assertEqual(self.search("تعميرگاه كاوه"), [self.kaveh.id])
+        self.assertEqual(self.search("bosh"), [self.bosch.id])
+        self.assertEqual(self.search("Serv"), [self.bosch.id])
+
+    def test_index_follows_writes(self):
+        self.search("bosch")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bosch.name = "Hyundai Center"
+            self.bosch.save()
+            SPTag.objects.filter(SP=self.bosch).delete()
+        self.assertEqual(self.search("bosch"), [])
+        self.assertEqual(self.search("گیربکس"), [])
+        self.assertEqual(self.search("hyundai"), [self.bosch.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.kaveh.delete()
+        self.assertEqual(self.search("کاوه"), [])
+
+    def test_query_is_required(self):
+        response = self.client.get('/service/search/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class FacetTests(ServiceProviderTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.tehran, self.karaj = City.objects.create(name="Tehran"), City.objects.create(name="Karaj")
+        self.repair, self.wash = SPCategory.objects.create(name="Repair"), SPCategory.objects.create(name="Wash")
+        self.engine = Expert.objects.create(name="Engine")
+        parking = TagKey.objects.create(name="parking")
+
+        def provider(name, city, category):
+            address = Address.objects.create(district="-", city=city, neighbourhood="-", full_address="-")
+            return self.create_provider(name=name, address=address, category=category)
+
+        self.a = provider("A", self.tehran, self.repair)
+        self.b = provider("B", self.tehran, self.wash)
+        self.c = provider("C", self.karaj, self.repair)
+        SPExpert.objects.create(SP=self.a, expert=self.engine)
+        SPExpert.objects.create(SP=self.c, expert=self.engine)
+        SPCarExpert.objects.create(SP=self.a, car=Car.objects.create(brand="Peugeot", model="206"), expert=self.engine)
+        SPTag.objects.create(SP=self.b, key=parking, value="yes")
+        SPRate.objects.create(SP=self.a, score=5)
+        SPRate.objects.create(SP=self.c, score=3)
+
+    def facets(self, query=''):
+        response = self.client.get(f'/service/service-providers/facets/?{query}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        return data['count'], {dimension: {item['label']: item['count'] for item in items}
+                               for dimension, items in data['facets'].items()}
+
+    def list_ids(self, query):
+        response = self.client.get(f'/service/service-providers/?{query}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['id'] for item in response.json()['results']]
+
+    def test_counts_apply_every_other_filter(self):
+        count, facets = self.facets()
+        self.assertEqual(count, 3)
+        self.assertEqual(facets['city'], {"Tehran": 2, "Karaj": 1})
+        self.assertEqual(facets['min_rating'], {"1+": 2, "2+": 2, "3+": 2, "4+": 1, "5+": 1})
+
+        count, facets = self.facets(f'category={self.repair.id}')
+        self.assertEqual(count, 2)
+        self.assertEqual(facets['city'], {"Tehran": 1, "Karaj": 1})
+        # شمارش بُعد category خودش را فیلتر نمی‌کند
+        self.assertEqual(facets['category'], {"Repair": 2, "Wash": 1})
+
+        count, facets = self.facets(f'city={self.tehran.id}&expert={self.engine.id}&car_brand=peugeot')
+        self.assertEqual(count, 1)
+        self.assertEqual(facets['tag'], {})
+
+    def test_list_filters_through_the_index(self):
+        self.assertEqual(self.list_ids(f'city={self.tehran.id}'), [self.a.id, self.b.id])
+        self.assertEqual(self.list_ids('tag=parking:yes'), [self.b.id])
+        self.assertEqual(self.list_ids('min_rating=4'), [self.a.id])
+        self.assertEqual(self.list_ids(f'category={self.repair.id},{self.wash.id}&city={self.karaj.id}'), [self.c.id])
+
+    def test_index_follows_writes_and_rejects_bad_values(self):
+        self.facets()
+        with self.captureOnCommitCallbacks(execute=True):
+            SPRate.objects.create(SP=self.b, score=5)
+            self.c.address.city = self.tehran
+            self.c.address.save()
+        self.assertEqual(self.list_ids('min_rating=5'), [self.a.id, self.b.id])
+        self.assertEqual(self.list_ids(f'city={self.karaj.id}'), [])
+
+        for query in ('city=tehran', 'min_rating=0', 'min_rating=6'):
+            response = self.client.get(f'/service/service-providers/?{query}')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_large_results_filter_in_sql(self):
+        SPTag.objects.create(SP=self.a, key=TagKey.objects.get(name="parking"), value="no")
+        queries = [
+            f'city={self.tehran.id}', f'category={self.repair.id}&min_rating=4', f'expert={self.engine.id}',
+            'car_brand=peugeot', 'tag=parking:yes,parking:no', f'city={self.karaj.id}&tag=parking:yes',
+        ]
+        expected = [self.list_ids(query) for query in queries]
+        cache.clear()
+        with override_settings(FACET_FILTER_MAX_IDS=0):
+            self.assertEqual([self.list_ids(query) for query in queries], expected)
+        self.assertEqual(expected[:3], [[self.a.id, self.b.id], [self.a.id], [self.a.id, self.c.id]])
+
+
+class ResponseCacheTests(ServiceProviderTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.sp = self.create_provider()
+        self.other = self.create_provider(name="Other")
+
+    def get(self, url, expected_cache):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['X-Cache'], expected_cache)
+        return response
+
+    def test_second_read_is_served_from_cache(self):
+        url = f'/service/service-providers/{self.sp.id}/'
+        first = self.get(url, 'MISS')
+        # فقط کوئری ETag
+        with self.assertNumQueries(1):
+            second = self.get(url, 'HIT')
+        self.assertEqual(first.content, second.content)
+        self.get(url + '?format=api', 'MISS')
+        self.assertEqual(cache_stats()['hits'], 1)
+
+    def test_review_invalidates_only_its_provider_detail(self):
+        detail, other_detail, listing = (f'/service/service-providers/{self.sp.id}/',
+                                         f'/service/service-providers/{self.other.id}/',
+                                         '/service/service-providers/')
+        for url in (detail, other_detail, listing):
+            self.get(url, 'MISS')
+
+        SPReview.objects.create(SP=self.sp, user=self.create_user("reviewer"), title="t", description="d")
+        self.assertEqual(len(self.get(detail, 'MISS').json()['reviews']), 1)
+        self.get(other_detail, 'HIT')
+        self.get(listing, 'HIT')
+
+        SPRate.objects.create(SP=self.sp, score=4)
+        self.assertEqual(self.get(listing, 'MISS').json()['results'][0]['rate_count'], 1)
+        self.get(other_detail, 'HIT')
+
+    def test_shared_names_and_address_deletes_invalidate_providers(self):
+        detail, listing = f'/service/service-providers/{self.sp.id}/', '/service/service-providers/'
+        key = TagKey.objects.create(name="parking")
+        SPTag.objects.create(SP=self.sp, key=key, value="yes")
+        weekday = Weekday.objects.create(name="Monday")
+        SPWorkTime.objects.create(SP=self.sp, weekday=weekday, time_start="09:00", time_end="17:00")
+        city = City.objects.create(name="Tehran")
+        self.sp.address = Address.objects.create(district="-", city=city, neighbourhood="-", full_address="-")
+        self.sp.save()
+        self.assertEqual(facet_index.query({'tag': ['parking:yes']}, with_counts=False)[0].bit_count(), 1)
+
+        for url in (detail, listing):
+            self.get(url, 'MISS')
+        with self.captureOnCommitCallbacks(execute=True):
+            key.name = "garage"
+            key.save()
+        self.assertEqual(self.get(detail, 'MISS').json()['tags'][0]['key_name'], "garage")
+        self.get(listing, 'MISS')
+        self.assertEqual(facet_index.query({'tag': ['garage:yes']}, with_counts=False)[0].bit_count(), 1)
+
+        weekday.name = "Tuesday"
+        weekday.save()
+        self.sp.refresh_from_db()
+        self.assertEqual(self.sp.weekly_hours, [[1980, 2460]])
+        self.get(detail, 'MISS')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sp.address.delete()
+        self.assertIsNone(self.get(detail, 'MISS').json()['address'])
+        self.get(listing, 'MISS')
+        self.assertFalse(facet_index.query({'city': [city.id]}, with_counts=False)[0])
+
+    def test_category_list_is_invalidated_on_write(self):
+        self.get('/service/categories/', 'MISS')
+        self.get('/service/categories/', 'HIT')
+        SPCategory.objects.create(name="Paint")
+        self.assertEqual(len(self.get('/service/categories/', 'MISS').json()['results']), 1)
+
+
+class ConditionalGetTests(ServiceProviderTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.sp = self.create_provider(category=SPCategory.objects.create(name="Repair"))
+        self.url = f'/service/service-providers/{self.sp.id}/'
+
+    def test_matching_etag_returns_304_before_serializing(self):
+        response = self.client.get(self.url)
+        etag, last_modified = response['ETag'], response['Last-Modified']
+        self.assertTrue(etag.startswith('"'))
+        self.assertIn('must-revalidate', response['Cache-Control'])
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_child_and_category_changes_change_the_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        SPReview.objects.create(SP=self.sp, user=self.create_user("reviewer"), title="t", description="d")
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+        etag = response['ETag']
+        self.sp.category.name = "Tire"
+        self.sp.category.save()
+        self.assertNotEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)['ETag'], etag)
+
+    def test_category_list_etag_and_cache_control_setting(self):
+        with self.settings(RESPONSE_CACHE_CONTROL={'sp_category-list': 'public, max-age=300'}):
+            response = self.client.get('/service/categories/')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=300')
+        self.assertNotIn('Last-Modified', response)
+
+        response = self.client.get('/service/categories/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        etag = response['ETag']
+        SPCategory.objects.get().delete()
+        response = self.client.get('/service/categories/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_missing_provider_is_still_404(self):
+        response = self.client.get('/service/service-providers/999999/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class FastListSerializationTests(ServiceProviderTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        category = SPCategory.objects.create(name="Repair")
+        monday = Weekday.objects.create(name="Monday")
+        key = TagKey.objects.create(name="parking")
+        self.rated = self.create_provider(name="Rated", category=category, main_image='SP_main_images/گاراژ.png')
+        SPTag.objects.create(SP=self.rated, key=key, value="yes")
+        SPTag.objects.create(SP=self.rated, key=key, value="covered")
+        SPRate.objects.create(SP=self.rated, score=4)
+        SPRate.objects.create(SP=self.rated, score=3)
+        SPWorkTime.objects.create(SP=self.rated, weekday=monday, time_start="08:00", time_end="17:00")
+        self.create_provider(name="Bare")
+        self.at = datetime(2026, 10, 19, 18, 0, tzinfo=ZoneInfo('Asia/Tehran'))
+
+    def test_row_serializer_matches_short_serializer(self):
+        request = APIRequestFactory().get('/service/service-providers/')
+        context = {'request': request, 'availability_at': self.at}
+        providers = ServiceProvider.objects.for_list().order_by('id')
+        expected = ServiceProviderShortSerializer(providers, many=True, context=context).data
+        rows = ServiceProviderShortRowSerializer().serialize(
+            providers.prefetch_related(None).values(*ServiceProviderShortRowSerializer.columns), context)
+        self.assertEqual(rows, expected)
+        self.assertNotIn('category_name', rows[1])
+        self.assertIsNotNone(rows[0]['next_opening'])
+
+    def test_list_endpoint_output_is_unchanged(self):
+        url = '/service/service-providers/?page_size=1'
+        responses = []
+        for enabled in (False, True):
+            cache.clear()
+            with self.settings(FAST_LIST_SERIALIZATION=enabled):
+                first = self.client.get(url)
+                second = self.client.get(first.json()['next'])
+            responses.append([first.content, second.content])
+        self.assertEqual(responses[0], responses[1])
+
+    def test_fast_renderer_matches_json_renderer(self):
+        data = {
+            'name': "گاراژ \"مرکزی\"",
+            'at': datetime(2026, 10, 19, 14, 30, tzinfo=ZoneInfo('UTC')),
+            'local': self.at,
+            'histogram': {1: 0, 5: 2},
+            'price': Decimal('12.50'),
+            'items': [None, True, 1.5, []],
+            'separators': "x\u2028y\u2029z",
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+        for value in (float('nan'), float('inf'), Decimal('NaN')):
+            for renderer in (FastJSONRenderer(), JSONRenderer()):
+                with self.assertRaises(ValueError):
+                    renderer.render({'items': [None, {'score': value}]})
+
+
+class ImageVariantTests(ServiceProviderTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.settings_override = self.settings(MEDIA_ROOT=media_root)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+    def upload(self, name, size, mode='RGB'):
+        buffer = BytesIO()
+        Image.new(mode, size, (255, 0, 0, 128) if mode == 'RGBA' else 'red').save(buffer, 'PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+    def test_upload_builds_webp_variants(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            sp = self.create_provider(logo_image=self.upload('logo.png', (2000, 1000), 'RGBA'))
+        sp.refresh_from_db()
+        self.assertEqual(sp.logo_variants['source'], sp.logo_image.name)
+        self.assertEqual(sorted(int(width) for width in sp.logo_variants if width != 'source'), [64, 256, 1024])
+        with default_storage.open(sp.logo_variants['256']) as file, Image.open(file) as image:
+            self.assertEqual((image.format, image.size, image.mode), ('WEBP', (256, 128), 'RGBA'))
+
+        row = self.client.get('/service/service-providers/').json()['results'][0]
+        self.assertEqual(list(row['logo_image_srcset']), ['64w', '256w', '1024w'])
+        self.assertTrue(row['logo_image_srcset']['64w'].startswith('http://testserver/media/variants/SP_logos/'))
+        self.assertEqual(row['main_image_srcset'], {})
+
+    def test_small_image_is_not_upscaled_and_replacement_cleans_up(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            sp = self.create_provider(logo_image=self.upload('logo.png', (300, 300)))
+        sp.refresh_from_db()
+        old = sp.logo_variants
+        self.assertEqual(sorted(old), ['256', '64', 'source'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            sp.logo_image = self.upload('tiny.png', (32, 32))
+            sp.save()
+        sp.refresh_from_db()
+        self.assertEqual(sorted(sp.logo_variants), ['32', 'source'])
+        self.assertFalse(any(default_storage.exists(old[width]) for width in ('64', '256')))
+
+    def test_backfill_command_builds_missing_variants(self):
+        sp = self.create_provider(logo_image=self.upload('logo.png', (600, 400)))
+        category = SPCategory.objects.create(name="Repair", icon=self.upload('icon.png', (128, 128)))
+        ServiceProvider.objects.filter(pk=sp.pk).update(logo_variants={})
+
+        out = StringIO()
+        call_command('generate_image_variants', '--sync', stdout=out)
+        self.assertIn("Built variants for 2 images.", out.getvalue())
+        sp.refresh_from_db()
+        category.refresh_from_db()
+        self.assertEqual(sorted(sp.logo_variants), ['256', '64', 'source'])
+        self.assertEqual(sorted(category.icon_variants), ['64', 'source'])
+
+        call_command('generate_image_variants', '--sync', stdout=out)
+        self.assertIn("Built variants for 0 images.", out.getvalue())
+
+    def test_built_variants_change_the_etags(self):
+        category = SPCategory.objects.create(name="Repair", icon=self.upload('icon.png', (128, 128)))
+        sp = self.create_provider(category=category)
+        urls = [f'/service/categories/{category.pk}/', f'/service/service-providers/{sp.pk}/']
+        etags = [self.client.get(url)['ETag'] for url in urls]
+        self.assertEqual(self.client.get(urls[0]).json()['icon_srcset'], {})
+
+        generate_image_variants('service_provider.SPCategory', category.pk, 'icon')
+        for url, etag in zip(urls, etags):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(list(self.client.get(urls[0]).json()['icon_srcset']), ['64w'])
+
+    def test_memory_broker_without_eager_mode_is_reported(self):
+        with self.settings(CELERY_TASK_ALWAYS_EAGER=False, CELERY_BROKER_URL='memory://'):
+            self.assertEqual([message.id for message in check_task_queue(None)], ['service_provider.W001'])
+        with self.settings(CELERY_TASK_ALWAYS_EAGER=False, CELERY_BROKER_URL='redis://localhost:6379/0'):
+            self.assertEqual(check_task_queue(None), [])
+
+
+class MediaServingTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        override = self.settings(MEDIA_ROOT=media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.name = default_storage.save('SP_logos/logo.png', ContentFile(b'0123456789'))
+
+    def get(self, path, **headers):
+        return self.client.get(f'/media/{path}', headers=headers)
+
+    def test_uploads_get_content_hashed_names(self):
+        self.assertRegex(self.name, r'^SP_logos/logo\.[0-9a-f]{12}\.png$')
+        other = default_storage.save('SP_logos/logo.png', ContentFile(b'changed'))
+        self.assertNotEqual(other.split('.')[1], self.name.split('.')[1])
+
+    def test_hashed_files_are_immutable_and_conditional(self):
+        response = self.get(self.name)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(response['Content-Type'], 'image/png')
+
+        response = self.get(self.name, if_none_match=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        with open(os.path.join(settings.MEDIA_ROOT, 'legacy.png'), 'wb') as file:
+            file.write(b'x')
+        self.assertEqual(self.get('legacy.png')['Cache-Control'], 'public, max-age=3600')
+
+    def test_range_requests(self):
+        response = self.get(self.name, range='bytes=2-4')
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(b''.join(response.streaming_content), b'234')
+        self.assertEqual(response['Content-Range'], 'bytes 2-4/10')
+
+        response = self.get(self.name, range='bytes=-3')
+        self.assertEqual(b''.join(response.streaming_content), b'789')
+
+        response = self.get(self.name, range='bytes=20-')
+        self.assertEqual(response.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+        self.assertEqual(response['Content-Range'], 'bytes */10')
+
+        response = self.get(self.name, range='bytes=2-4', if_range='"stale"')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_accel_redirect_and_traversal(self):
+        with self.settings(MEDIA_X_ACCEL_REDIRECT_PREFIX='/protected-media/'):
+            response = self.get(self.name)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.name}')
+        self.assertEqual(response.content, b'')
+
+        self.assertEqual(self.get('../settings.py').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.get('SP_logos/').status_code, status.HTTP_404_NOT_FOUND)
+
+
+class BulkChildWriteTests(ServiceProviderTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.sp = self.create_provider()
+        self.client.force_authenticate(self.create_user("editor"))
+        self.monday = Weekday.objects.create(name="Monday")
+        self.tuesday = Weekday.objects.create(name="Tuesday")
+
+    def url(self, child):
+        return f'/service/service-providers/{self.sp.id}/{child}/bulk/'
+
+    def test_replace_work_times_in_one_transaction(self):
+        kept = SPWorkTime.objects.create(SP=self.sp, weekday=self.monday, time_start='09:00', time_end='12:00')
+        stale = SPWorkTime.objects.create(SP=self.sp, weekday=self.tuesday, time_start='09:00', time_end='12:00')
+        items = [
+            {'id': kept.id, 'weekday': self.monday.id, 'time_start': '08:00', 'time_end': '12:00'},
+        ] + [
+            {'weekday': self.tuesday.id, 'time_start': f'{hour:02d}:00', 'time_end': f'{hour + 1:02d}:00'}
+            for hour in range(8, 20)
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put(self.url('work-times'), items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        body = response.json()
+        self.assertEqual(body['deleted'], 1)
+        self.assertEqual(body['results'][0], {'index': 0, 'status': 'updated', 'id': kept.id})
+        self.assertEqual({row['status'] for row in body['results'][1:]}, {'created'})
+        self.assertFalse(SPWorkTime.objects.filter(pk=stale.pk).exists())
+        self.assertEqual(SPWorkTime.objects.filter(SP=self.sp).count(), 13)
+
+        # signalهای ردیف‌به‌ردیف اجرا نشده‌اند ولی weekly_hours یک بار ساخته شده است
+        self.sp.refresh_from_db()
+        self.assertEqual(self.sp.weekly_hours, [[480, 720], [1920, 2640]])
+
+        response = self.client.patch(self.url('work-times'), items[:1], format='json')
+        self.assertEqual(response.json(), {'results': [{'index': 0, 'status': 'unchanged', 'id': kept.id}],
+                                           'deleted': 0})
+
+    def test_invalid_items_are_reported_together_and_nothing_is_written(self):
+        other = SPWorkTime.objects.create(
+            SP=self.create_provider(name="Other"), weekday=self.monday, time_start='09:00', time_end='12:00')
+        items = [
+            {'weekday': self.monday.id, 'time_start': '09:00', 'time_end': '10:00'},
+            {'weekday': 999, 'time_start': '09:00', 'time_end': '10:00'},
+            {'weekday': self.monday.id, 'time_start': 'soon'},
+            {'id': other.id, 'weekday': self.monday.id, 'time_start': '09:00', 'time_end': '10:00'},
+        ]
+        response = self.client.put(self.url('work-times'), items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        errors = response.json()
+        self.assertEqual(errors[0], {})
+        self.assertEqual(list(errors[1]), ['weekday'])
+        self.assertEqual(sorted(errors[2]), ['time_end', 'time_start'])
+        self.assertEqual(list(errors[3]), ['id'])
+        self.assertFalse(SPWorkTime.objects.filter(SP=self.sp).exists())
+
+        for url in ('/service/service-providers/999/work-times/bulk/', '/service/service-providers/abc/images/bulk/'):
+            response = self.client.put(url, [], format='json')
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_tags_and_experts_upsert_by_natural_key(self):
+        color = TagKey.objects.create(name="color")
+        SPTag.objects.create(SP=self.sp, key=color, value="red")
+        SPTag.objects.create(SP=self.sp, key=color, value="blue")
+        items = [{'key_name': 'color', 'value': 'red'}, {'key_name': 'brand', 'value': 'BMW'}]
+        response = self.client.put(self.url('tags'), items, format='json')
+        self.assertEqual([row['status'] for row in response.json()['results']], ['unchanged', 'created'])
+        self.assertEqual(response.json()['deleted'], 1)
+        self.assertEqual(sorted(SPTag.objects.filter(SP=self.sp).values_list('key__name', 'value')),
+                         [('brand', 'BMW'), ('color', 'red')])
+
+        response = self.client.put(self.url('tags'), items + items[:1], format='json')
+        self.assertEqual(response.json()[2], {'non_field_errors': ["Duplicate item."]})
+
+        paint, engine = Expert.objects.create(name="paint"), Expert.objects.create(name="engine")
+        SPExpert.objects.create(SP=self.sp, expert=paint)
+        items = [{'expert': paint.id, 'is_active': False}, {'expert': engine.id}]
+        with self.assertNumQueries(8):
+            response = self.client.patch(self.url('experts'), items, format='json')
+        self.assertEqual([row['status'] for row in response.json()['results']], ['updated', 'created'])
+        self.assertEqual(dict(SPExpert.objects.filter(SP=self.sp).values_list('expert__name', 'is_active')),
+                         {'paint': False, 'engine': True})
+
+    def test_images_keep_and_upload(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        buffer = BytesIO()
+        Image.new('RGB', (40, 40), 'red').save(buffer, 'PNG')
+        with self.settings(MEDIA_ROOT=media_root):
+            upload = lambda name: SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+            first = self.client.patch(f'/service/service-providers/{self.sp.id}/images/bulk/',
+                                      {'image': [upload('a.png'), upload('b.png')]}, format='multipart').json()
+            self.assertEqual([row['status'] for row in first['results']], ['created', 'created'])
+            kept = first['results'][0]['id']
+
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.put(f'/service/service-providers/{self.sp.id}/images/bulk/',
+                                           {'keep': [kept], 'image': [upload('c.png')]}, format='multipart')
+            self.assertEqual([row['status'] for row in response.json()['results']], ['unchanged', 'created'])
+            self.assertEqual(response.json()['deleted'], 1)
+            new = SPImages.objects.get(pk=response.json()['results'][1]['id'])
+            self.assertEqual(new.image_variants['source'], new.image.name)
+            self.assertEqual(self.sp.images.count(), 2)
+
+
+class ProviderImportTests(ServiceProviderTestMixin, APITestCase):
+    HEADER = 'name,owner,category,city,district,neighbourhood,full_address,location,work_times,tags\n'
+
+    def setUp(self):
+        super().setUp()
+        self.owner = SPOwner.objects.create(user=self.create_user("importer"))
+        Weekday.objects.create(name="Monday")
+        Weekday.objects.create(name="Tuesday")
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'providers.csv')
+        with open(self.path, 'w', encoding='utf-8') as file:
+            file.write(self.HEADER)
+            for n in range(5):
+                file.write(f'Garage {n},importer,Repair,Shiraz,D{n},N,Street {n},"29.6, 52.5",'
+                           f'Monday 09:00-17:00; Tuesday 09:00-13:00,brand:BMW; color:red\n')
+            file.write('Broken,nobody,Repair,Shiraz,D,N,Street,somewhere,Friday 9-5,brand\n')
+            file.write('Stranger,nobody,,,,,,"29.6, 52.5",,\n')
+
+    def test_csv_import_in_chunks_with_row_errors(self):
+        out = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('import_providers', self.path, '--chunk-size', '2', stdout=out)
+        self.assertIn("Imported 5 service providers, 2 rows with errors", out.getvalue())
+        self.assertIn("row 7: location:", out.getvalue())
+        self.assertIn("row 8: owner: Unknown owner 'nobody'.", out.getvalue())
+
+        providers = ServiceProvider.objects.filter(name__startswith="Garage")
+        self.assertEqual(providers.count(), 5)
+        self.assertEqual(City.objects.filter(name="Shiraz").count(), 1)
+        self.assertEqual(SPCategory.objects.filter(name="Repair").count(), 1)
+        sp = providers.select_related('address__city', 'category').get(name="Garage 3")
+        self.assertEqual((sp.address.city.name, sp.address.district, sp.category.name), ("Shiraz", "D3", "Repair"))
+        self.assertEqual((sp.latitude, sp.longitude), (29.6, 52.5))
+        self.assertTrue(sp.geohash)
+        self.assertEqual(sp.weekly_hours, [[540, 1020], [1980, 2220]])
+        self.assertEqual(sorted(sp.tags.values_list('key__name', 'value')), [('brand', 'BMW'), ('color', 'red')])
+        self.assertEqual(search_index.search("Garage 3")[0][0], sp.id)
+
+        with self.assertRaisesMessage(CommandError, "was already imported"):
+            call_command('import_providers', self.path, stdout=StringIO())
+
+    def test_interrupted_import_resumes_after_last_chunk(self):
+        with mock.patch('service_provider.imports.rebuild_availability', side_effect=[2, RuntimeError("db gone")]):
+            with self.assertRaises(RuntimeError):
+                call_command('import_providers', self.path, '--chunk-size', '2', stdout=StringIO())
+        job = ProviderImport.objects.get()
+        self.assertEqual((job.status, job.rows_done, job.created_count), (ProviderImport.FAILED, 2, 2))
+
+        out = StringIO()
+        call_command('import_providers', self.path, '--chunk-size', '2', stdout=out)
+        self.assertIn(f"Resuming import #{job.pk} after 2 rows.", out.getvalue())
+        self.assertEqual(ServiceProvider.objects.filter(name__startswith="Garage").count(), 5)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.rows_done, job.created_count, job.error_count),
+                         (ProviderImport.DONE, 7, 5, 2))
+
+    def test_running_import_is_not_imported_twice(self):
+        job = ProviderImport.objects.create(source=self.path, owner=self.owner)
+        stale = ProviderImport.objects.get(pk=job.pk)
+        self.assertEqual(run_import(job).status, ProviderImport.DONE)
+        # نمونه‌ی قدیمی هنوز PENDING است؛ UPDATE شرطی آن را رد می‌کند
+        self.assertIsNone(run_import(stale))
+        self.assertEqual(ServiceProvider.objects.filter(name__startswith="Garage").count(), 5)
+
+        ProviderImport.objects.filter(pk=job.pk).update(status=ProviderImport.RUNNING)
+        with self.assertRaisesMessage(CommandError, f"Import #{job.pk} of {self.path} is already running."):
+            call_command('import_providers', self.path, stdout=StringIO())
+        import_providers(job.pk)
+        self.assertEqual(ServiceProvider.objects.filter(name__startswith="Garage").count(), 5)
+
+    def test_import_left_running_by_a_crashed_worker_is_resumed(self):
+        with mock.patch('service_provider.imports.rebuild_availability', side_effect=[2, RuntimeError("killed")]):
+            with self.assertRaises(RuntimeError):
+                call_command('import_providers', self.path, '--chunk-size', '2', stdout=StringIO())
+        job = ProviderImport.objects.get()
+        # worker بدون فرصت ثبت FAILED از کار افتاده است
+        ProviderImport.objects.filter(pk=job.pk).update(status=ProviderImport.RUNNING, updated_at=timezone.now())
+        with self.assertRaisesMessage(CommandError, "is already running."):
+            call_command('import_providers', self.path, stdout=StringIO())
+
+        ProviderImport.objects.filter(pk=job.pk).update(
+            updated_at=timezone.now() - settings.PROVIDER_IMPORT_STALE_AFTER - timedelta(seconds=1))
+        out = StringIO()
+        call_command('import_providers', self.path, '--chunk-size', '2', stdout=out)
+        self.assertIn(f"Resuming import #{job.pk} after 2 rows.", out.getvalue())
+        self.assertEqual(ServiceProvider.objects.filter(name__startswith="Garage").count(), 5)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.rows_done, job.created_count), (ProviderImport.DONE, 7, 5))
+
+    def test_taken_over_worker_does_not_commit_its_chunk(self):
+        job = ProviderImport.objects.create(source=self.path, owner=self.owner)
+
+        def take_over(sp_ids):
+            ProviderImport.objects.filter(pk=job.pk).update(rows_done=2)
+
+        with mock.patch('service_provider.imports.rebuild_availability', side_effect=take_over):
+            self.assertIsNone(run_import(job, chunk_size=2))
+        self.assertFalse(ServiceProvider.objects.filter(name__startswith="Garage").exists())
+        self.assertEqual(ProviderImport.objects.get(pk=job.pk).status, ProviderImport.RUNNING)
+
+    def test_admin_action_imports_uploaded_xlsx(self):
+        from openpyxl import Workbook
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append(['Name', 'Location', 'Category', 'Work_Times'])
+        sheet.append(['Xlsx Garage', '35.7, 51.4', 'Tires', 'monday 08:00-10:00'])
+        buffer = BytesIO()
+        workbook.save(buffer)
+
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        with self.settings(MEDIA_ROOT=media_root):
+            job = ProviderImport.objects.create(
+                owner=self.owner, file=SimpleUploadedFile('providers.xlsx', buffer.getvalue()))
+            self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "x"))
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post('/admin/service_provider/providerimport/',
+                                 {'action': 'run_imports', '_selected_action': [job.pk]})
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.created_count), (ProviderImport.DONE, 1))
+        sp = ServiceProvider.objects.get(name="Xlsx Garage")
+        self.assertEqual((sp.owner_id, sp.category.name, sp.weekly_hours), (self.owner.pk, "Tires", [[480, 600]]))
+
+
+class ExportTests(ServiceProviderTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        city = City.objects.create(name="Tehran")
+        self.sp = self.create_provider(
+            category=SPCategory.objects.create(name="Repair"),
+            address=Address.objects.create(city=city, district="1", neighbourhood="N", full_address="Street, 5"),
+        )
+        self.other = self.create_provider(name="Other")
+        self.users = [self.create_user(f"u{n}") for n in range(3)]
+        for user, score in zip(self.users, (5, 4, 4)):
+            SPRate.objects.create(SP=self.sp, user=user, score=score)
+        SPReview.objects.create(SP=self.sp, user=self.users[0], title="Good", description="Fast, \"clean\"\nwork")
+        self.client.force_authenticate(User.objects.create_superuser("admin", "admin@example.com", "x"))
+
+    def download(self, url, **extra):
+        response = self.client.get(url, **extra)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response, b''.join(response.streaming_content)
+
+    def test_providers_csv_is_flattened(self):
+        response, content = self.download('/service/exports/providers.csv', HTTP_ACCEPT='text/csv')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="providers.csv"')
+        rows = list(csv.DictReader(content.decode().splitlines()))
+        self.assertEqual([row['name'] for row in rows], ["Garage", "Other"])
+        self.assertEqual(
+            {key: rows[0][key] for key in ('owner', 'category', 'city', 'full_address', 'rate_count', 'rate_4_count')},
+            {'owner': 'owner_Garage', 'category': 'Repair', 'city': 'Tehran', 'full_address': 'Street, 5',
+             'rate_count': '3', 'rate_4_count': '2'})
+        self.assertAlmostEqual(float(rows[0]['average_rating']), 13 / 3)
+        self.assertEqual((rows[1]['city'], rows[1]['average_rating']), ('', ''))
+
+    def test_ndjson_gzip_and_chunked_reads(self):
+        with self.settings(EXPORT_CHUNK_SIZE=2):
+            response, content = self.download('/service/exports/rates.ndjson.gz')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        lines = gzip.decompress(content).splitlines()
+        self.assertEqual([json.loads(line)['score'] for line in lines], [5, 4, 4])
+        self.assertEqual(set(json.loads(lines[0])), {'id', 'provider_id', 'user_id', 'score'})
+
+        review = json.loads(self.download('/service/exports/reviews.ndjson')[1])
+        self.assertEqual(review['description'], "Fast, \"clean\"\nwork")
+
+        self.client.force_authenticate(self.users[0])
+        self.assertEqual(self.client.get('/service/exports/reviews.csv').status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_command_writes_file(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'reviews.csv.gz')
+        call_command('export_data', 'reviews', '--gzip', '--output', path, '--chunk-size', '1', stderr=StringIO())
+        with gzip.open(path, 'rt', newline='') as file:
+            rows = list(csv.DictReader(file))
+        self.assertEqual([(row['title'], row['description']) for row in rows], [("Good", "Fast, \"clean\"\nwork")])
+
+
+class SyntheticDatasetTests(ServiceProviderTestMixin, APITestCase):
+    def snapshot(self):
+        providers = ServiceProvider.objects.order_by('id')
+        return (
+            list(providers.values_list('name', 'location', 'category__name', 'address__city__name', 'rate_sum',
+                                       'rate_count', 'weekly_hours')),
+            list(SPReview.objects.order_by('id').values_list('user__username', 'title', 'created_at', 'feed_rank')),
+            list(User.objects.filter(username__startswith='fake').order_by('id')
+                 .values_list('username', 'date_joined')),
+        )
+
+    def test_same_seed_gives_same_consistent_data(self):
+        out = StringIO()
+        call_command('generate_fake_data', '--providers', '60', '--seed', '7', '--chunk-size', '25', stdout=out)
+        self.assertIn("service_provider.ServiceProvider: 60", out.getvalue())
+        providers, reviews, users = self.snapshot()
+        self.assertEqual(SPCategory.objects.count(), 12)
+        self.assertGreater(len({row[2] for row in providers}), 3)
+        self.assertTrue(reviews)
+
+        # ستون‌های خلاصه همان چیزی است که از جدول‌های فرزند ساخته می‌شود
+        call_command('rebuild_rate_aggregates', stdout=StringIO())
+        call_command('rebuild_availability', stdout=StringIO())
+        self.assertEqual(self.snapshot()[0], providers)
+        for review in SPReview.objects.all():
+            self.assertEqual(review.is_rated, SPRate.objects.filter(SP=review.SP_id, user=review.user_id).exists())
+
+        with self.assertRaisesMessage(CommandError, "already exists"):
+            call_command('generate_fake_data', '--providers', '60', '--seed', '7', stdout=StringIO())
+
+        ServiceProvider.objects.all().delete()
+        User.objects.filter(username__startswith='fake7_').delete()
+        call_command('generate_fake_data', '--providers', '60', '--seed', '7', '--chunk-size', '60', stdout=out)
+        self.assertEqual(self.snapshot(), (providers, reviews, users))
+        self.assertEqual({row[1] for row in users}, {DEFAULT_NOW})
+
+        with self.assertRaisesMessage(CommandError, "--now must be an ISO 8601 timestamp"):
+            call_command('generate_fake_data', '--seed', '8', '--now', '2025-01-01', stdout=StringIO())
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class BenchmarkEndpointsTests(ServiceProviderTestMixin, APITestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.report = os.path.join(self.directory, 'report.json')
+
+    def benchmark(self, *args):
+        call_command(
+            'benchmark_endpoints', '--existing-db', '--providers', '20', '--iterations', '5', '--warmup', '1',
+            '--memory-iterations', '1', '--mode', 'client', '--mode', 'asgi', *args, stdout=StringIO())
+
+    def test_report_and_budgets(self):
+        self.benchmark('--output', self.report)
+        with open(self.report) as file:
+            report = json.load(file)
+        self.assertEqual(report['meta']['providers'], 20)
+        self.assertEqual(set(report['modes']), {'client', 'asgi'})
+        for results in report['modes'].values():
+            self.assertEqual(set(results), {'providers_list', 'provider_detail', 'login', 'verify_otp'})
+            for result in results.values():
+                self.assertEqual(result['errors'], 0)
+                self.assertLessEqual(result['p50_ms'], result['p95_ms'])
+                self.assertLessEqual(result['p95_ms'], result['p99_ms'])
+                self.assertGreater(result['peak_memory_kb'], 0)
+            # اولین درخواست هر ServiceProvider از cache نمی‌آید
+            self.assertEqual(results['provider_detail']['queries_max'], 8)
+
+        # baseline سریع‌تر و با کوئری کمتر
+        for results in report['modes'].values():
+            for result in results.values():
+                result['p95_ms'] = result['p99_ms'] = 0.001
+                result['queries_max'] = 0
+        with open(self.report, 'w') as file:
+            json.dump(report, file)
+        with self.assertRaises(CommandError) as raised:
+            self.benchmark('--endpoint', 'provider_detail', '--baseline', self.report)
+        self.assertIn("client provider_detail: 8 queries per request, baseline is 0.", str(raised.exception))
+        self.assertIn("asgi provider_detail: p95_ms", str(raised.exception))
+
+        with override_settings(BENCHMARK_QUERY_BUDGETS={'verify_otp': 1}):
+            with self.assertRaisesMessage(CommandError, "client verify_otp: 3 queries per request, budget is 1."):
+                self.benchmark('--endpoint', 'verify_otp')
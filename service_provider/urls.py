@@ -1,9 +1,9 @@
-from django.urls import path, include
+from django.urls import path, include, re_path
 from rest_framework.routers import DefaultRouter
 from .views import (
     SPCategoryViewSet, AddressViewSet, SPWorkTimeViewSet, SPTagViewSet, SPImagesViewSet,
     SPOwnerViewSet, SPReviewViewSet, SPRateViewSet, ExpertViewSet, SPExpertViewSet,
-    ServiceProviderViewSet
+    ServiceProviderViewSet, SearchView, CacheStatsView, ExportView
 )
 
 router = DefaultRouter()
@@ -24,5 +24,9 @@ router.register(r'service-providers/(?P<sp_id>\d+)/rates', SPRateViewSet, basena
 router.register(r'service-providers/(?P<sp_id>\d+)/experts', SPExpertViewSet, basename='sp_expert')
 
 urlpatterns = [
+    path('search/', SearchView.as_view(), name='search'),
+    path('cache-stats/', CacheStatsView.as_view(), name='cache_stats'),
+    re_path(r'^exports/(?P<kind>providers|reviews|rates)\.(?P<fmt>csv|ndjson)(?P<compress>\.gz)?$',
+            ExportView.as_view(), name='export'),
     path('', include(router.urls)),
 ]
@@ -1,23 +1,92 @@
 from rest_framework.viewsets import ModelViewSet
+from rest_framework.decorators import action
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from rest_framework.parsers import MultiPartParser
+from rest_framework.negotiation import BaseContentNegotiation
+from rest_framework.serializers import Serializer
 from rest_framework import status
 from .models import (ServiceProvider,SPWorkTime,SPReview,SPRate,SPTag,SPCategory,Address
             ,SPWorkTime,SPImages,SPOwner,Expert,SPExpert)
 from .serializers import(ServiceProviderSerializer, ServiceProviderShortSerializer,SPWorkTimeSerializer, SPWorkTimeWritableSerializer,SPReviewSerializer,
             SPRateSerializer,SPTagSerializer,SPCategorySerializer,AddressSerializer,SPImagesSerializer
-            ,SPOwnerSerializer,ExpertSerializer,SPExpertSerializer)
-from rest_framework.permissions import AllowAny, IsAuthenticated
+            ,SPOwnerSerializer,ExpertSerializer,SPExpertSerializer,ServiceProviderNearbySerializer,NearbyQuerySerializer,
+            ServiceProviderSearchSerializer,SearchQuerySerializer,SPReviewFeedSerializer,
+            ServiceProviderShortRowSerializer, SPWorkTimeBulkItemSerializer, SPTagBulkItemSerializer,
+            SPExpertBulkItemSerializer)
+from .exports import FORMATS, export_chunks, export_filename
+from .bulk import ExpertBulkWriter, ImagesBulkWriter, TagBulkWriter, WorkTimeBulkWriter
+from .fastpath import RowListMixin
+from .pagination import ReviewFeedPagination
+from .search import search_index
+from .facets import DIMENSIONS, facet_conditions, facet_index, parse_facet_filters
+from .caching import CachedResponseMixin, cache_stats
+from .conditional import ConditionalGetMixin, updated_at_validators
+from .availability import minute_of_week, next_opening
+from .geo import nearest
+from .fieldsets import ALL_FIELDS, FieldSelection
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 
-class SPCategoryViewSet(ModelViewSet):
+
+def availability_filter(request):
+    """
+    خواندن open_now/open_at از query string؛ خروجی (زمان مرجع، دقیقه‌ی هفته) یا (None, None)
+    """
+    open_at = request.query_params.get('open_at')
+    if open_at:
+        value = parse_datetime(open_at)
+        if value is None:
+            raise ValidationError({'open_at': "Expected an ISO 8601 datetime."})
+        return value, minute_of_week(value)
+    if request.query_params.get('open_now', '').lower() in ('true', '1'):
+        value = timezone.now()
+        return value, minute_of_week(value)
+    return None, None
+
+
+def field_selection(request, serializer_class):
+    """
+    خواندن ?fields= و ?expand= برای serializer داده شده؛ نام ناشناخته خطای 400 می‌دهد
+    """
+    fields = serializer_class().fields
+    relations = {}
+    for name in serializer_class.Meta.expandable:
+        nested = getattr(fields[name], 'child', fields[name])
+        relations[name] = set(nested.fields) if isinstance(nested, Serializer) else None
+    try:
+        return FieldSelection.from_query_params(request.query_params, fields.keys(), relations)
+    except ValueError as exc:
+        raise ValidationError({'detail': str(exc)})
+
+
+def facet_filters(request):
+    try:
+        return parse_facet_filters(request.query_params)
+    except ValueError as exc:
+        raise ValidationError({'detail': str(exc)})
+
+
+class SPCategoryViewSet(ConditionalGetMixin, CachedResponseMixin, ModelViewSet):
     """
     ViewSet برای مدیریت دسته‌بندی‌های ServiceProvider
     """
     queryset = SPCategory.objects.all()
     serializer_class = SPCategorySerializer
     permission_classes = [AllowAny]
+    cache_timeout = 60 * 60
+
+    def get_cache_tags(self):
+        return ['categories']
+
+    def get_validators(self):
+        return updated_at_validators(self, SPCategory.objects.all())
 
     @swagger_auto_schema(
         operation_description="Retrieve all categories of Service Providers.",
@@ -80,12 +149,40 @@ class SPWorkTimeViewSet(ModelViewSet):
             return SPWorkTimeWritableSerializer
         return SPWorkTimeSerializer
     
-class ServiceProviderViewSet(ModelViewSet):
+class ServiceProviderViewSet(ConditionalGetMixin, CachedResponseMixin, RowListMixin, ModelViewSet):
     """
     ViewSet برای مدیریت ServiceProvider
     """
 
     queryset = ServiceProvider.objects.all()
+    # مثل مسیرهای تودرتو (urls.py)؛ pk غیرعددی به images/bulk و ChildBulkWriter نمی‌رسد
+    lookup_value_regex = r'\d+'
+    row_serializer = ServiceProviderShortRowSerializer()
+    # is_open/next_opening به زمان وابسته‌اند؛ عمر cache کوتاه می‌ماند
+    cache_timeout = 60
+
+    def get_cache_tags(self):
+        if self.action == 'retrieve':
+            return [f"provider:{self.kwargs['pk']}", 'categories', 'experts']
+        return ['providers']
+
+    conditional_actions = ('retrieve',)
+
+    def get_validators(self):
+        row = ServiceProvider.objects.filter(pk=self.kwargs['pk']).values_list(
+            'version', 'updated_at', 'category__updated_at', 'weekly_hours').first()
+        if row is None:
+            return None
+        version, updated_at, category_updated_at, weekly_hours = row
+        # is_open/next_opening هم جزو پاسخ‌اند
+        token = f"{version}:{updated_at.isoformat()}:{category_updated_at}:{next_opening(weekly_hours)}"
+        return token, max(filter(None, [updated_at, category_updated_at]))
+
+    def is_response_cacheable(self, request):
+        # user_rate در جزئیات به کاربر وابسته است
+        if self.action == 'retrieve' and request.user.is_authenticated:
+            return False
+        return super().is_response_cacheable(request)
     @swagger_auto_schema(
         operation_description="Retrieve a list of Service Providers with optional filtering by category.",
         manual_parameters=[
@@ -95,6 +192,19 @@ class ServiceProviderViewSet(ModelViewSet):
                 description="Filter Service Providers by category ID.",
                 type=openapi.TYPE_INTEGER
             ),
+            openapi.Parameter(
+                'open_now',
+                openapi.IN_QUERY,
+                description="Only return Service Providers that are open right now.",
+                type=openapi.TYPE_BOOLEAN
+            ),
+            openapi.Parameter(
+                'open_at',
+                openapi.IN_QUERY,
+                description="Only return Service Providers that are open at the given ISO 8601 datetime.",
+                type=openapi.TYPE_STRING,
+                format=openapi.FORMAT_DATETIME
+            ),
         ],
         responses={
             200: "List of Service Providers.",
@@ -102,27 +212,188 @@ class ServiceProviderViewSet(ModelViewSet):
     )
     def get_queryset(self):
         """
-        بازگرداندن داده‌ها بر اساس پارامترهای موجود در بدنه درخواست
+        بازگرداندن داده‌ها بر اساس پارامترهای query string
         """
-        if self.request.method == 'POST':  
-            category_id = self.request.data.get('category_id', None)
-        else:  
-            category_id = self.request.data.get('category_id', None)
+        category_id = self.request.query_params.get('category_id', None)
 
+        queryset = super().get_queryset()
         if category_id:
-            return ServiceProvider.objects.filter(category_id=category_id)
-        return super().get_queryset()
+            queryset = queryset.filter(category_id=category_id)
+        if self.action == 'list':
+            _, minute = availability_filter(self.request)
+            if minute is not None:
+                queryset = queryset.open_at(minute)
+            filters = facet_filters(self.request)
+            if filters:
+                bits, _ = facet_index.query(filters, with_counts=False)
+                if bits.bit_count() <= settings.FACET_FILTER_MAX_IDS:
+                    queryset = queryset.filter(pk__in=facet_index.ids_from_bits(bits))
+                else:
+                    # لیست بزرگ id در IN از فیلترهای SQL کندتر است و از سقف پارامترهای SQLite می‌گذرد
+                    queryset = queryset.filter(*facet_conditions(filters))
+            return queryset.for_list()
+        if self.action == 'retrieve':
+            return queryset.for_detail(self.get_field_selection())
+        return queryset
+
+    def get_field_selection(self):
+        if self.action != 'retrieve':
+            return ALL_FIELDS
+        if not hasattr(self, '_field_selection'):
+            self._field_selection = field_selection(self.request, ServiceProviderSerializer)
+        return self._field_selection
+
+    @swagger_auto_schema(
+        operation_description="Retrieve a Service Provider. Without `fields`/`expand` every field is returned "
+                              "with relations nested. Otherwise only the listed fields are returned and relations "
+                              "not named in `expand` are returned as ids.",
+        manual_parameters=[
+            openapi.Parameter(
+                'fields',
+                openapi.IN_QUERY,
+                description="Comma-separated fields to return, e.g. `id,name,reviews.title` "
+                            "(a dotted name expands the relation and limits its fields).",
+                type=openapi.TYPE_STRING
+            ),
+            openapi.Parameter(
+                'expand',
+                openapi.IN_QUERY,
+                description="Comma-separated relations to return nested instead of as ids, "
+                            f"one of: {', '.join(ServiceProviderSerializer.Meta.expandable)}.",
+                type=openapi.TYPE_STRING
+            ),
+        ],
+        responses={
+            200: ServiceProviderSerializer,
+            400: "Unknown field or relation.",
+            404: "Service Provider not found.",
+        }
+    )
+    def retrieve(self, request, *args, **kwargs):
+        # خطای پارامترها قبل از ETag و cache
+        self.get_field_selection()
+        return super().retrieve(request, *args, **kwargs)
 
     def get_serializer_class(self):
         if self.action in ['list']:
             return ServiceProviderShortSerializer
+        if self.action == 'nearby':
+            return ServiceProviderNearbySerializer
         return ServiceProviderSerializer
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action in ['list', 'nearby']:
+            context['availability_at'] = availability_filter(self.request)[0]
+        if self.action == 'retrieve':
+            context['field_selection'] = self.get_field_selection()
+        return context
+
     def get_permissions(self):
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['list', 'retrieve', 'nearby', 'facets']:
             return [AllowAny()]
         return [IsAuthenticated()]
 
+    @swagger_auto_schema(
+        operation_description="Count Service Providers per facet value (category, city, expert, car_brand, tag, "
+                              "min_rating). Each dimension is counted with every other active filter applied.",
+        manual_parameters=[
+            openapi.Parameter(
+                dimension,
+                openapi.IN_QUERY,
+                description=f"Filter by {dimension}; repeat or comma-separate for OR.",
+                type=openapi.TYPE_STRING
+            )
+            for dimension in DIMENSIONS
+        ],
+        responses={
+            200: "Matching count and per-dimension facet counts.",
+            400: "Invalid filter value.",
+        }
+    )
+    @action(detail=False, methods=['get'], pagination_class=None)
+    def facets(self, request):
+        """
+        تعداد ServiceProviderها برای هر مقدار از هر facet با در نظر گرفتن بقیه‌ی فیلترها
+        """
+        bits, counts = facet_index.query(facet_filters(request))
+        return Response({
+            'count': bits.bit_count(),
+            'facets': {
+                dimension: [
+                    {'value': value, 'label': facet_index.label(dimension, value), 'count': count}
+                    for value, count in sorted(values.items(), key=lambda item: (-item[1], str(item[0])))
+                ]
+                for dimension, values in counts.items()
+            },
+        })
+
+    @swagger_auto_schema(
+        operation_description="Retrieve the nearest Service Providers to a point, sorted by distance (km).",
+        query_serializer=NearbyQuerySerializer,
+        responses={
+            200: ServiceProviderNearbySerializer(many=True),
+            400: "Invalid coordinates or radius.",
+        }
+    )
+    @action(detail=False, methods=['get'], pagination_class=None)
+    def nearby(self, request):
+        """
+        نزدیک‌ترین ServiceProviderها به مختصات داده شده
+        """
+        params = NearbyQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        query = params.validated_data
+
+        queryset = ServiceProvider.objects.all()
+        if query.get('category_id'):
+            queryset = queryset.filter(category_id=query['category_id'])
+        _, minute = availability_filter(request)
+        if minute is not None:
+            queryset = queryset.open_at(minute)
+        matches = nearest(queryset, query['lat'], query['lon'], query['radius'], query['limit'])
+
+        providers = ServiceProvider.objects.for_list().in_bulk([sp_id for sp_id, _ in matches])
+        results = []
+        for sp_id, distance in matches:
+            provider = providers[sp_id]
+            provider.distance = round(distance, 3)
+            results.append(provider)
+        serializer = self.get_serializer(results, many=True)
+        return Response(serializer.data)
+
+    @swagger_auto_schema(
+        methods=['put', 'patch'],
+        operation_description="Replace (PUT) or extend (PATCH) the images of a Service Provider in one transaction "
+                              "(multipart). Every `image` file is added and every `keep` id is left as is; PUT also "
+                              "deletes the images missing from `keep`.",
+        manual_parameters=[
+            openapi.Parameter(
+                'image',
+                openapi.IN_FORM,
+                description="New image; repeat for several.",
+                type=openapi.TYPE_FILE
+            ),
+            openapi.Parameter(
+                'keep',
+                openapi.IN_FORM,
+                description="Id of an existing image to keep; repeat for several.",
+                type=openapi.TYPE_INTEGER
+            ),
+        ],
+        responses={
+            200: "Per-item results (keep ids first, then new images) and the number of deleted images.",
+            400: "Per-item validation errors; nothing is written.",
+            404: "Service Provider not found.",
+        }
+    )
+    @action(detail=True, methods=['put', 'patch'], url_path='images/bulk', parser_classes=[MultiPartParser])
+    def images_bulk(self, request, pk=None):
+        items = [{'id': value} for value in request.data.getlist('keep')]
+        items += [{'image': file} for file in request.FILES.getlist('image')]
+        replace = request.method == 'PUT'
+        return Response(ImagesBulkWriter(pk, items, replace=replace).save())
+
 
     
 class SPWorkTimeViewSet(ModelViewSet):
@@ -163,22 +434,70 @@ class SPWorkTimeViewSet(ModelViewSet):
             return SPWorkTimeWritableSerializer
         return SPWorkTimeSerializer
 
+    @swagger_auto_schema(
+        methods=['put', 'patch'],
+        operation_description="Replace (PUT) or upsert (PATCH) the work times of a Service Provider in one "
+                              "transaction. Items with an id update that work time, items without one are created; "
+                              "PUT also deletes the work times missing from the list.",
+        request_body=SPWorkTimeBulkItemSerializer(many=True),
+        responses={
+            200: "Per-item results (created/updated/unchanged) and the number of deleted rows.",
+            400: "Per-item validation errors; nothing is written.",
+            404: "Service Provider not found.",
+        }
+    )
+    @action(detail=False, methods=['put', 'patch'])
+    def bulk(self, request, sp_id=None):
+        replace = request.method == 'PUT'
+        return Response(WorkTimeBulkWriter(sp_id, request.data, replace=replace).save())
+
 class SPReviewViewSet(ModelViewSet):
     """
     ViewSet برای مدیریت نظرات (Reviews)
+    لیست، فید صفحه‌بندی‌شده‌ی نظرهاست: اول نظرهای دارای امتیاز، بعد جدیدترها
     """
     serializer_class = SPReviewSerializer
+    pagination_class = ReviewFeedPagination
+
+    def get_queryset(self):
+        sp_id = self.kwargs.get('sp_id')
+        queryset = SPReview.objects.filter(SP_id=sp_id)
+        if self.action == 'list':
+            include_inactive = self.request.query_params.get('include_inactive', '').lower() in ('true', '1')
+            if not (include_inactive and self.request.user.is_staff):
+                queryset = queryset.filter(is_active=True)
+            return queryset.select_related('user__details')
+        return queryset
+
+    def get_serializer_class(self):
+        if self.action in ['list', 'retrieve']:
+            return SPReviewFeedSerializer
+        return SPReviewSerializer
 
     @swagger_auto_schema(
-        operation_description="Retrieve reviews for a specific Service Provider.",
+        operation_description="Retrieve the review feed of a Service Provider: reviews whose author also rated "
+                              "the Service Provider first, then newest first. Cursor paginated.",
+        manual_parameters=[
+            openapi.Parameter(
+                'include_inactive',
+                openapi.IN_QUERY,
+                description="Also return inactive reviews (staff only).",
+                type=openapi.TYPE_BOOLEAN
+            ),
+        ],
         responses={
-            200: "List of reviews for the specified Service Provider.",
+            200: SPReviewFeedSerializer(many=True),
         }
     )
-
-    def get_queryset(self):
-        sp_id = self.kwargs.get('sp_id')
-        return SPReview.objects.filter(SP_id=sp_id)
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(self.get_queryset())
+        # امتیاز نویسنده‌های این صفحه با یک کوئری
+        scores = dict(SPRate.objects.filter(
+            SP_id=self.kwargs['sp_id'], user_id__in={review.user_id for review in page}
+        ).values_list('user_id', 'score'))
+        serializer = self.get_serializer(page, many=True)
+        serializer.context['review_scores'] = scores
+        return self.get_paginated_response(serializer.data)
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user, SP_id=self.kwargs['sp_id'])
@@ -238,6 +557,23 @@ class SPTagViewSet(ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(SP_id=self.kwargs['sp_id'])
 
+    @swagger_auto_schema(
+        methods=['put', 'patch'],
+        operation_description="Replace (PUT) or upsert (PATCH) the tags of a Service Provider in one transaction. Tags are "
+                              "matched by key_name and value and unknown keys are created; PUT also deletes the tags "
+                              "missing from the list.",
+        request_body=SPTagBulkItemSerializer(many=True),
+        responses={
+            200: "Per-item results (created/updated/unchanged) and the number of deleted rows.",
+            400: "Per-item validation errors; nothing is written.",
+            404: "Service Provider not found.",
+        }
+    )
+    @action(detail=False, methods=['put', 'patch'])
+    def bulk(self, request, sp_id=None):
+        replace = request.method == 'PUT'
+        return Response(TagBulkWriter(sp_id, request.data, replace=replace).save())
+
 class SPImagesViewSet(ModelViewSet):
     """
     ViewSet برای مدیریت تصاویر ServiceProvider
@@ -292,13 +628,20 @@ class SPOwnerViewSet(ModelViewSet):
     def create(self, request, *args, **kwargs):
         return super().create(request, *args, **kwargs)
 
-class ExpertViewSet(ModelViewSet):
+class ExpertViewSet(ConditionalGetMixin, CachedResponseMixin, ModelViewSet):
     """
     ViewSet برای مدیریت تخصص‌ها
     """
     queryset = Expert.objects.all()
     serializer_class = ExpertSerializer
     permission_classes = [AllowAny]
+    cache_timeout = 60 * 60
+
+    def get_cache_tags(self):
+        return ['experts']
+
+    def get_validators(self):
+        return updated_at_validators(self, Expert.objects.all())
 
     @swagger_auto_schema(
         operation_description="Retrieve all experts.",
@@ -345,3 +688,99 @@ class SPExpertViewSet(ModelViewSet):
     )
     def perform_create(self, serializer):
         serializer.save(SP_id=self.kwargs['sp_id'])
+
+    @swagger_auto_schema(
+        methods=['put', 'patch'],
+        operation_description="Replace (PUT) or upsert (PATCH) the experts of a Service Provider in one transaction. Items "
+                              "are matched by expert id and only is_active is updated; PUT also deletes the experts "
+                              "missing from the list.",
+        request_body=SPExpertBulkItemSerializer(many=True),
+        responses={
+            200: "Per-item results (created/updated/unchanged) and the number of deleted rows.",
+            400: "Per-item validation errors; nothing is written.",
+            404: "Service Provider not found.",
+        }
+    )
+    @action(detail=False, methods=['put', 'patch'])
+    def bulk(self, request, sp_id=None):
+        replace = request.method == 'PUT'
+        return Response(ExpertBulkWriter(sp_id, request.data, replace=replace).save())
+
+
+class SearchView(APIView):
+    """
+    جستجوی متنی ServiceProviderها (نام، تگ، تخصص، خودرو و آدرس) با تحمل خطای تایپی
+    """
+    permission_classes = [AllowAny]
+
+    @swagger_auto_schema(
+        operation_description="Full-text, typo-tolerant search over Service Provider names, tags, experts, cars and addresses.",
+        query_serializer=SearchQuerySerializer,
+        responses={
+            200: ServiceProviderSearchSerializer(many=True),
+            400: "Missing or invalid query.",
+        }
+    )
+    def get(self, request):
+        params = SearchQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        hits = search_index.search(params.validated_data['q'], params.validated_data['limit'])
+
+        providers = ServiceProvider.objects.for_list().in_bulk([sp_id for sp_id, _ in hits])
+        results = []
+        for sp_id, score in hits:
+            if sp_id in providers:
+                providers[sp_id].score = round(score, 3)
+                results.append(providers[sp_id])
+        serializer = ServiceProviderSearchSerializer(results, many=True, context={'request': request})
+        return Response(serializer.data)
+
+
+class CacheStatsView(APIView):
+    """
+    آمار hit/miss کش پاسخ‌ها
+    """
+    permission_classes = [IsAdminUser]
+
+    @swagger_auto_schema(
+        operation_description="Response cache hit/miss counters (admin only).",
+        responses={200: "Hit and miss counters."}
+    )
+    def get(self, request):
+        return Response(cache_stats())
+
+
+class ExportContentNegotiation(BaseContentNegotiation):
+    """
+    پاسخ خروجی StreamingHttpResponse است؛ Accept کلاینت (مثلاً text/csv) فقط برای پاسخ‌های خطا به کار می‌آید
+    """
+
+    def select_parser(self, request, parsers):
+        return parsers[0] if parsers else None
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+class ExportView(APIView):
+    """
+    خروجی جریانی کامل providers، reviews یا rates به CSV/NDJSON (اختیاری gzip)
+    """
+    permission_classes = [IsAdminUser]
+    content_negotiation_class = ExportContentNegotiation
+
+    @swagger_auto_schema(
+        operation_description="Stream every Service Provider (with flattened address, category and rating "
+                              "aggregates), review or rate as CSV or NDJSON, ordered by id. Append .gz to the "
+                              "URL for a gzip-compressed file (admin only).",
+        responses={200: "The export file, streamed."}
+    )
+    def get(self, request, kind, fmt, compress=None):
+        compress = bool(compress)
+        response = StreamingHttpResponse(
+            export_chunks(kind, fmt, compress=compress),
+            content_type='application/gzip' if compress else f'{FORMATS[fmt]}; charset=utf-8',
+        )
+        response['Content-Disposition'] = f'attachment; filename="{export_filename(kind, fmt, compress)}"'
+        response['Cache-Control'] = 'no-store'
+        return response